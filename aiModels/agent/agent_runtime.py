@@ -0,0 +1,235 @@
+"""
+aiModels.agent.agent_runtime
+
+大脑智能体运行时（常驻）：
+- **复用**：全部请求共用一个 BrainAgent 单例（LLM 客户端、智能体注册表、路由器、工具注册表只构建一次）
+- **有界工作池**：固定 AGENT_WORKERS 个常驻工作线程执行 BrainAgent.answer，不再每个请求新建线程
+- **请求队列 + 背压**：工作线程全忙时请求进入 FIFO 队列；队列已满直接拒绝（视图返回 503），
+  不会无限堆积线程
+- **排队位置事件**：排队期间 SSE 流推送 {"type": "queue", "position": n}，位置变化时更新
+- **取消**：客户端断开时，尚未开始执行的请求从队列中移除
+
+说明：
+- BrainAgent.answer 的对话状态均为局部变量，单例可被多个工作线程同时使用
+- 工作线程不经过 Django 请求周期，每个请求执行前后调用 close_old_connections()，
+  回收超时 / 出错的数据库连接（否则超过 MySQL wait_timeout 后连接失效且不会被关闭）
+- `/aiModels/brain_stats` 查看工作池与队列指标
+"""
+
+from __future__ import annotations
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+# ========== 工作池 / 队列参数 ==========
+AGENT_WORKERS = 4            # 同时执行的智能体请求数
+AGENT_MAX_QUEUE = 16         # 最多排队的请求数，超过直接拒绝
+QUEUE_POLL_INTERVAL = 0.5    # 排队期间检查位置变化的间隔（秒）
+
+# 子智能体中文显示名
+AGENT_DISPLAY_NAMES = {
+    "searchDB_agent": "数据库",
+    "spider_agent": "网页爬虫",
+}
+
+
+def status_event(agent_name: str) -> Dict[str, Any]:
+    """子智能体调用状态事件（同步 / 异步流共用）"""
+    display = AGENT_DISPLAY_NAMES.get(agent_name, agent_name)
+    return {
+        "type": "status",
+        "agent": agent_name,
+        "message": f"正在调用：{display}智能体"
+    }
+
+
+class AgentBusyError(RuntimeError):
+    """工作线程全忙且排队已满。"""
+
+
+class AgentJob:
+    """一次智能体请求：工作线程通过 events 回传状态、结果或错误。"""
+
+    def __init__(self, question: str) -> None:
+        self.question = question
+        self.events: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.cancelled = False
+
+
+class AgentRuntime:
+    def __init__(self, agent_factory: Callable[[], Any],
+                 workers: int = AGENT_WORKERS, max_queue: int = AGENT_MAX_QUEUE) -> None:
+        self._agent_factory = agent_factory
+        self.workers = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self._pending: Deque[AgentJob] = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.max_queued = 0
+        self._wait_total = 0.0
+
+    def _ensure_workers(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"brain-agent-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, question: str) -> AgentJob:
+        """提交请求；工作线程全忙且队列已满时抛出 AgentBusyError。"""
+        job = AgentJob(question)
+        with self._cond:
+            self._ensure_workers()
+            # 空闲工作线程即将取走的请求不占排队名额
+            idle = max(0, self.workers - self.running)
+            if len(self._pending) >= self.max_queue + idle:
+                self.rejected += 1
+                raise AgentBusyError(f"智能体繁忙：排队请求已达上限 {self.max_queue}，请稍后再试")
+            self._pending.append(job)
+            self.max_queued = max(self.max_queued, len(self._pending))
+            self._cond.notify()
+        return job
+
+    def position(self, job: AgentJob) -> int:
+        """排队位置（从 1 开始）；已开始执行或已移除时返回 0。"""
+        with self._cond:
+            try:
+                return self._pending.index(job) + 1
+            except ValueError:
+                return 0
+
+    def cancel(self, job: AgentJob) -> bool:
+        """取消尚未开始执行的请求。"""
+        with self._cond:
+            job.cancelled = True
+            try:
+                self._pending.remove(job)
+            except ValueError:
+                return False
+            self.cancelled += 1
+            return True
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                job = self._pending.popleft()
+                self.running += 1
+                job.started_at = time.monotonic()
+                self._wait_total += job.started_at - job.submitted_at
+            # 与 Django 请求信号（request_started / request_finished）一致：执行前后回收过期连接
+            close_old_connections()
+            try:
+                self._run(job)
+            finally:
+                close_old_connections()
+                with self._cond:
+                    self.running -= 1
+
+    def _run(self, job: AgentJob) -> None:
+        def status_callback(agent_name: str):
+            job.events.put(status_event(agent_name))
+
+        try:
+            answer, called_agent = self._agent_factory().answer(job.question, status_callback=status_callback)
+            job.events.put({
+                "type": "result",
+                "success": True,
+                "answer": answer,
+                "called_agent": called_agent
+            })
+            with self._cond:
+                self.completed += 1
+        except Exception as e:
+            job.events.put({
+                "type": "error",
+                "success": False,
+                "error": f"{type(e).__name__}: {str(e)}"
+            })
+            with self._cond:
+                self.failed += 1
+
+    def stream(self, job: AgentJob) -> Iterator[str]:
+        """
+        生成器：推送排队位置、智能体调用状态与最终结果（SSE 格式）。
+        客户端断开（生成器被关闭）时取消仍在排队的请求。
+        """
+        last_position = None
+        try:
+            while True:
+                try:
+                    item = job.events.get(timeout=QUEUE_POLL_INTERVAL)
+                except queue.Empty:
+                    item = None
+
+                if item is None:
+                    position = self.position(job)
+                    if position and position != last_position:
+                        last_position = position
+                        item = {
+                            "type": "queue",
+                            "position": position,
+                            "message": f"排队中，前面还有 {position - 1} 个请求"
+                        }
+                    else:
+                        continue
+
+                yield f"data: {json.dumps(item, ensure_ascii=False)}\n\n"
+                if item["type"] in ("result", "error"):
+                    return
+        finally:
+            if job.started_at is None:
+                self.cancel(job)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            started = self.completed + self.failed + self.running
+            return {
+                "workers": self.workers,
+                "running": self.running,
+                "queued": len(self._pending),
+                "max_queue": self.max_queue,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "cancelled": self.cancelled,
+                "avg_queue_wait": round(self._wait_total / started, 4) if started else 0.0,
+            }
+
+
+# 创建全局实例
+_agent_runtime = None
+_agent_runtime_lock = threading.Lock()
+
+
+def get_agent_runtime() -> AgentRuntime:
+    """获取智能体运行时单例"""
+    global _agent_runtime
+    with _agent_runtime_lock:
+        if _agent_runtime is None:
+            from aiModels.agent.brain_agent import get_brain_agent
+            _agent_runtime = AgentRuntime(get_brain_agent)
+        return _agent_runtime
+
+
+@require_GET
+def agent_runtime_stats_view(request):
+    """GET /aiModels/brain_stats：查看智能体工作池与排队指标"""
+    return JsonResponse({"success": True, "runtime": get_agent_runtime().stats()})
@@ -3,11 +3,14 @@ aiModels.agent.brain_agent
 
 大脑智能体（决策路由中心）：
 - **LLM**：使用 Ollama `/api/chat`
-- **智能体路由**：分析用户输入，决定调用哪个子智能体
+- **智能体路由**：分析用户输入，决定调用哪个子智能体（关键词路由高置信时直接采用，否则由语义路由判断，仍不确定时交给 LLM）
 - **子智能体**：
   - searchDB_agent: 数据库智能体（MySQL操作）
   - spider_agent: 网页爬虫智能体（网络搜索）
 - **工具系统**：保留原有工具调用能力
+- **并行调用**：一步中可输出 {"agents": [...]} 同时调用多个子智能体，结果合并为一条观察
+- **结果缓存**：子智能体调用结果按 (智能体, 任务, 参数) 缓存（见 tool_cache.py）
+- **结果压缩**：回填给 LLM 的结果转为 CSV + 统计并按 token 预算截断（见 result_compactor.py）
 
 说明：
 - 本文件作为核心控制器，负责任务分发和结果整合
@@ -17,25 +20,51 @@ aiModels.agent.brain_agent
 from __future__ import annotations
 
 from dataclasses import dataclass
+import asyncio
 import json
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import requests
-from django.http import JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.apps import apps
+from django.db import close_old_connections
 from django.db.models import Model
 
 # 导入子智能体
 from aiModels.agent.searchDB_agent import get_search_db_agent
 from aiModels.agent.spider_agent import get_spider_agent
+# 常驻运行时（工作池 + 排队）
+from aiModels.agent.agent_runtime import AgentBusyError, get_agent_runtime, status_event
+from aiModels.agent.tool_cache import get_tool_cache
+# 结果压缩（CSV + 统计 + token 预算）
+from aiModels.agent.result_compactor import RESULT_TOKEN_BUDGET, compact_result, parallel_budget
+# 路由关键词自动机（Aho-Corasick）
+from aiModels.agent.keyword_matcher import Keyword, KeywordHits, KeywordMatcher, keyword_patterns
+# 语义路由（向量 kNN）
+from aiModels.agent.semantic_router import DIRECT_ANSWER, USE_SEMANTIC_ROUTER, SemanticRouter, get_semantic_router
+# 共享的 Ollama 客户端（连接池 + 并发限制）
+from aiModels.qaModel.llm_client import OLLAMA_BASE_URL, get_async_llm_client, get_llm_client
+from aiModels.qaModel.context_packer import estimate_tokens
 
 # ========== Ollama 配置 ==========
-OLLAMA_BASE_URL = "http://localhost:11435"
 MODEL_NAME = "deepseek-r1:1.5b"
 
+# ========== 并行调用子智能体 ==========
+MAX_PARALLEL_AGENTS = 4      # 单步最多并行调用的子智能体数（多余的忽略）
+FANOUT_WORKERS = 8           # 同步路径并行调用使用的共享线程池大小
+FANOUT_MIN_EVIDENCE = 2.0    # 关键词路由并行调用：两类智能体各自独立命中的关键词得分下限
+FANOUT_SCORE_RATIO = 0.6     # 关键词路由并行调用：较低得分 / 较高得分的下限（两者接近才并行）
+
+URL_PATTERN = re.compile(r"https?://[^\s，。；、）)\]》\"']+")
+
+# ========== 直接回答（语义路由判定无需调用子智能体） ==========
+SYSTEM_FOR_DIRECT = "你是柑橘产业数据平台的中文智能助手。请直接、简要地回答用户问题；涉及具体业务数据或最新资讯时，请提示用户换个说法查询。"
+
 # ========== 智能体 System Prompt ==========
 SYSTEM_FOR_AGENT = """你是一个中文智能体助手（大脑智能体）。你可以调用子智能体来完成任务。
 
@@ -52,15 +81,18 @@ SYSTEM_FOR_AGENT = """你是一个中文智能体助手（大脑智能体）。
 
 2. **网页爬虫智能体（spider_agent）**：用于网络搜索和网页抓取
    - 关键词：搜索、网页、网络、爬取、抓取、最新信息等
-   - 任务类型：search（默认使用百度搜索引擎）, fetch, extract
+   - 任务类型：search（默认同时查询百度和DuckDuckGo并合并去重；args 可加 "fetch_top": N 并行抓取前N个结果正文）, fetch, extract
 
 【调用格式】
-你每次只能输出 JSON，且只能二选一：
-1) 调用子智能体：
+你每次只能输出 JSON，且只能三选一：
+1) 调用一个子智能体：
    {"agent": "<智能体名>", "task": "<任务类型>", "args": {...}}
    智能体名：searchDB_agent 或 spider_agent
    对于数据库查询，优先使用 auto_query 任务，args 中传入 {"question": "用户原始问题"}
-2) 最终答复：
+2) 同时调用多个子智能体（彼此独立的子任务，会并行执行，结果一次性返回）：
+   {"agents": [{"agent": "<智能体名>", "task": "<任务类型>", "args": {...}}, ...]}
+   例如同时查询冷库温度和搜索柑橘价格新闻
+3) 最终答复：
    {"final": "<给用户的中文答复>"}
 
 【重要流程】
@@ -72,7 +104,7 @@ SYSTEM_FOR_AGENT = """你是一个中文智能体助手（大脑智能体）。
 
 【强约束】
 1) 数据必须以智能体返回结果为准，不要编造内容。
-2) 如果用户问题需要多个智能体协作，先调用一个，根据结果再决定是否调用另一个。
+2) 如果用户问题包含多个互不依赖的子任务，用 agents 列表一次性并行调用；若后一个调用依赖前一个的结果，先调用一个，根据结果再决定是否调用另一个。
 3) 如果用户问题缺少关键信息，先向用户提问澄清。
 4) 生成最终答案时，必须基于查询结果中的实际数据，可以总结、格式化，但不能编造。
 """
@@ -252,20 +284,12 @@ class OllamaChatClient:
         self.timeout = timeout
 
     def chat(self, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None) -> str:
-        url = f"{self.base_url}/api/chat"
-        payload: Dict[str, Any] = {
-            "model": self.model,
-            "messages": messages,
-            "stream": False,
-        }
-        if options:
-            payload["options"] = options
+        # 复用共享客户端：keep-alive 连接池、按模型排队限流、失败重试
+        return get_llm_client(self.base_url).chat(messages, model=self.model, options=options, timeout=self.timeout)
 
-        resp = requests.post(url, json=payload, timeout=self.timeout)
-        resp.raise_for_status()
-        data = resp.json()
-        # Ollama 返回结构：{"message": {"role": "...", "content": "..."}, ...}
-        return (data.get("message") or {}).get("content") or ""
+    async def achat(self, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None) -> str:
+        # 异步版本：httpx 连接池 + asyncio 闸门，等待期间不占用线程
+        return await get_async_llm_client(self.base_url).chat(messages, model=self.model, options=options, timeout=self.timeout)
 
 
 # ---------------------- 智能体注册表 ----------------------
@@ -296,6 +320,31 @@ class AgentRegistry:
             raise KeyError(f"未知智能体: {name}，可用智能体: {list(self._agents.keys())}")
         return self._agents[name]["instance"]
     
+    def execute(self, name: str, task: str, **kwargs) -> Any:
+        """执行智能体任务：相同调用在缓存有效期内直接返回上次结果"""
+        agent = self.get(name)
+        cache = get_tool_cache()
+        key = cache.make_key(name, task, kwargs)
+        result = cache.get(key)
+        if result is None:
+            result = agent.execute(task, **kwargs)
+            cache.put(key, result)
+        return result
+    
+    async def aexecute(self, name: str, task: str, **kwargs) -> Any:
+        """异步执行智能体任务：先查缓存；优先使用智能体的 aexecute，否则在线程池中执行同步 execute"""
+        agent = self.get(name)
+        cache = get_tool_cache()
+        key = cache.make_key(name, task, kwargs)
+        result = cache.get(key)
+        if result is None:
+            if hasattr(agent, "aexecute"):
+                result = await agent.aexecute(task, **kwargs)
+            else:
+                result = await sync_to_async(agent.execute, thread_sensitive=False)(task, **kwargs)
+            cache.put(key, result)
+        return result
+    
     def list(self) -> List[Dict[str, str]]:
         """列出所有注册的智能体"""
         return [
@@ -309,8 +358,22 @@ class AgentRegistry:
 class AgentRouter:
     """智能体路由分析器：分析用户输入，决定调用哪个智能体"""
     
+    # 特殊模式与任务推断用到的词组：followed_by(a, b) 等价于正则 (a...).*?(b...)
+    ROUTE_TERMS = {
+        "db_verb": ['查询', '查找', '获取'],
+        "db_noun": ['数据', '表', '模型', '基地', '设备'],
+        "spider_verb": ['搜索', '查找', '获取'],
+        "spider_noun": ['网页', '网站', '网络', '最新'],
+        "list_verb": ['列出', '所有', '有哪些'],
+        "describe_verb": ['描述', '字段', '结构'],
+        "schema_noun": ['模型', '表'],
+        "search_verb": ['搜索', '查找'],
+        "extract_verb": ['提取', '抓取', '获取'],
+        "content_noun": ['内容', '信息'],
+    }
+    
     def __init__(self) -> None:
-        # 数据库智能体关键词
+        # 数据库智能体关键词（元素可为 ("关键词", 权重)）
         self.db_keywords = [
             '查询', '数据', '数据库', '表', '模型', '基地', '设备', '产量',
             '柑橘', '冷库', '告警', '传感器', '温度', '湿度',
@@ -322,6 +385,22 @@ class AgentRouter:
             '网站', 'url', '链接', '内容', '提取',
             'search', 'fetch', 'crawl', 'scrape', 'web', 'internet'
         ]
+        self.reload_keywords()
+    
+    def reload_keywords(self, db_keywords: Optional[List[Keyword]] = None,
+                        spider_keywords: Optional[List[Keyword]] = None) -> None:
+        """
+        重新编译关键词自动机（热更新）：可传入新的关键词列表，
+        也可直接修改 db_keywords / spider_keywords 后调用。新自动机构建完成后整体替换。
+        """
+        if db_keywords is not None:
+            self.db_keywords = list(db_keywords)
+        if spider_keywords is not None:
+            self.spider_keywords = list(spider_keywords)
+        patterns = keyword_patterns(self.db_keywords, "db") + keyword_patterns(self.spider_keywords, "spider")
+        for label, words in self.ROUTE_TERMS.items():
+            patterns += keyword_patterns(words, label)
+        self._matcher = KeywordMatcher(patterns)
     
     def analyze(self, user_input: str) -> Dict[str, Any]:
         """
@@ -331,57 +410,82 @@ class AgentRouter:
             {
                 "agent": "searchDB_agent" | "spider_agent" | None,
                 "task": "任务类型",
-                "confidence": 0.0-1.0
+                "confidence": 0.0-1.0,
+                "agents": [{"agent", "task"}, ...]   # 两类智能体都有独立证据且得分接近时并行调用
             }
         """
-        user_lower = user_input.lower()
+        # 一次扫描得到全部关键词命中
+        hits = self._matcher.match(user_input)
+        has_url = bool(URL_PATTERN.search(user_input or ""))
         
         # 计算关键词匹配度
-        db_score = sum(1 for kw in self.db_keywords if kw.lower() in user_lower)
-        spider_score = sum(1 for kw in self.spider_keywords if kw.lower() in user_lower)
+        db_score = hits.score("db")
+        spider_score = hits.score("spider")
         
         # 特殊模式匹配
-        if re.search(r'(查询|查找|获取).*?(数据|表|模型|基地|设备)', user_input):
+        if hits.followed_by("db_verb", "db_noun"):
             db_score += 2
-        if re.search(r'(搜索|查找|获取).*?(网页|网站|网络|最新)', user_input):
+        if hits.followed_by("spider_verb", "spider_noun"):
             spider_score += 2
         
+        # 两类智能体各有独立的关键词证据（共用动词、重叠命中不算）且得分接近：问题同时需要两者，交给大脑并行调用
+        strong = []
+        if (hits.exclusive_score("db", "spider") >= FANOUT_MIN_EVIDENCE
+                and hits.exclusive_score("spider", "db") >= FANOUT_MIN_EVIDENCE
+                and min(db_score, spider_score) >= FANOUT_SCORE_RATIO * max(db_score, spider_score)):
+            strong = [
+                {"agent": "searchDB_agent", "task": self._infer_db_task(hits)},
+                {"agent": "spider_agent", "task": self._infer_spider_task(hits, has_url)},
+            ]
+        
         # 决定调用哪个智能体
         if db_score > spider_score and db_score > 0:
             return {
                 "agent": "searchDB_agent",
-                "task": self._infer_db_task(user_input),
-                "confidence": min(db_score / 3.0, 1.0)
+                "task": self._infer_db_task(hits),
+                "confidence": min(db_score / 3.0, 1.0),
+                "agents": strong
             }
         elif spider_score > db_score and spider_score > 0:
             return {
                 "agent": "spider_agent",
-                "task": self._infer_spider_task(user_input),
-                "confidence": min(spider_score / 3.0, 1.0)
+                "task": self._infer_spider_task(hits, has_url),
+                "confidence": min(spider_score / 3.0, 1.0),
+                "agents": strong
             }
         else:
-            # 无法确定，返回None让LLM决定
+            # 无法确定单个智能体，返回None让LLM决定（或由 agents 并行调用）
             return {
                 "agent": None,
                 "task": None,
-                "confidence": 0.0
+                "confidence": 0.0,
+                "agents": strong
             }
     
-    def _infer_db_task(self, user_input: str) -> str:
+    def infer_task(self, agent_name: str, user_input: str) -> Optional[str]:
+        """已确定智能体（如语义路由给出）时，推断其任务类型"""
+        hits = self._matcher.match(user_input)
+        if agent_name == "searchDB_agent":
+            return self._infer_db_task(hits)
+        if agent_name == "spider_agent":
+            return self._infer_spider_task(hits, bool(URL_PATTERN.search(user_input or "")))
+        return None
+    
+    def _infer_db_task(self, hits: KeywordHits) -> str:
         """推断数据库任务类型"""
-        if re.search(r'(列出|所有|有哪些).*?(模型|表)', user_input):
+        if hits.followed_by("list_verb", "schema_noun"):
             return "list_models"
-        elif re.search(r'(描述|字段|结构).*?(模型|表)', user_input):
+        elif hits.followed_by("describe_verb", "schema_noun"):
             return "describe_model"
         else:
             # 默认使用 auto_query，让智能体自动选择模型
             return "auto_query"
     
-    def _infer_spider_task(self, user_input: str) -> str:
-        """推断爬虫任务类型"""
-        if re.search(r'(搜索|查找)', user_input):
+    def _infer_spider_task(self, hits: KeywordHits, has_url: bool) -> str:
+        """推断爬虫任务类型（fetch / extract 需要 URL，问题中没有 URL 时一律 search）"""
+        if not has_url or hits.keywords("search_verb"):
             return "search"
-        elif re.search(r'(提取|抓取|获取).*?(内容|信息)', user_input):
+        elif hits.followed_by("extract_verb", "content_noun"):
             return "extract"
         else:
             return "fetch"
@@ -401,10 +505,13 @@ class BrainAgent:
 
     def __init__(self, llm: Optional[OllamaChatClient] = None, 
                  agent_registry: Optional[AgentRegistry] = None,
-                 router: Optional[AgentRouter] = None) -> None:
+                 router: Optional[AgentRouter] = None,
+                 semantic_router: Optional[SemanticRouter] = None) -> None:
         self.llm = llm or OllamaChatClient()
         self.agent_registry = agent_registry or AgentRegistry()
         self.router = router or AgentRouter()
+        # 语义路由（向量 kNN）：关键词路由不确定时使用，置信度不足时由 LLM 路由兜底
+        self.semantic_router = semantic_router or (get_semantic_router() if USE_SEMANTIC_ROUTER else None)
         # 保留工具系统（向后兼容）
         self.tool_registry = build_registry()
 
@@ -420,6 +527,151 @@ class BrainAgent:
         Returns:
             (最终答案字符串, 调用的智能体名称)
         """
+        steps = self._answer_steps(user_question, max_steps)
+        result, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            result, error = None, None
+            try:
+                if step[0] == "llm":
+                    result = self.llm.chat(step[1])
+                elif step[0] == "classify":
+                    result = self.semantic_router.classify(step[1])
+                elif step[0] == "agents":
+                    result = self._execute_parallel(step[1], status_callback)
+                else:
+                    _, agent_name, task, args = step
+                    # 通知调用状态
+                    if status_callback:
+                        status_callback(agent_name)
+                    result = self.agent_registry.execute(agent_name, task, **args)
+            except Exception as e:
+                error = e
+
+    async def aanswer(self, user_question: str, max_steps: int = 6, status_callback: Optional[Callable[[str], None]] = None) -> Tuple[str, Optional[str]]:
+        """
+        回答用户问题（异步版本，参数与返回值同 answer）。
+        LLM 调用走 httpx 异步客户端，子智能体走各自的 aexecute，等待期间不占用线程。
+        """
+        steps = self._answer_steps(user_question, max_steps)
+        result, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            result, error = None, None
+            try:
+                if step[0] == "llm":
+                    result = await self.llm.achat(step[1])
+                elif step[0] == "classify":
+                    # 向量编码（冷启动时还要加载模型）是同步计算，放到线程中执行
+                    result = await asyncio.to_thread(self.semantic_router.classify, step[1])
+                elif step[0] == "agents":
+                    result = await self._aexecute_parallel(step[1], status_callback)
+                else:
+                    _, agent_name, task, args = step
+                    if status_callback:
+                        status_callback(agent_name)
+                    result = await self.agent_registry.aexecute(agent_name, task, **args)
+            except Exception as e:
+                error = e
+
+    def _execute_parallel(self, calls: List[Tuple[str, str, Dict[str, Any]]],
+                          status_callback: Optional[Callable[[str], None]] = None) -> List[Any]:
+        """在共享线程池中并行执行多个子智能体调用，结果与 calls 顺序一致；单个调用失败不影响其他调用"""
+        if status_callback:
+            for agent_name, _, _ in calls:
+                status_callback(agent_name)
+
+        def run(agent_name: str, task: str, args: Dict[str, Any]) -> Any:
+            # 线程池线程不经过请求周期，执行前后回收过期数据库连接
+            close_old_connections()
+            try:
+                return self.agent_registry.execute(agent_name, task, **args)
+            except Exception as e:
+                return _agent_call_error(e)
+            finally:
+                close_old_connections()
+
+        futures = [_fanout_pool.submit(run, *call) for call in calls]
+        return [f.result() for f in futures]
+
+    async def _aexecute_parallel(self, calls: List[Tuple[str, str, Dict[str, Any]]],
+                                 status_callback: Optional[Callable[[str], None]] = None) -> List[Any]:
+        """并行执行多个子智能体调用（asyncio.gather），语义同 _execute_parallel"""
+        if status_callback:
+            for agent_name, _, _ in calls:
+                status_callback(agent_name)
+
+        async def run(agent_name: str, task: str, args: Dict[str, Any]) -> Any:
+            try:
+                return await self.agent_registry.aexecute(agent_name, task, **args)
+            except Exception as e:
+                return _agent_call_error(e)
+
+        return list(await asyncio.gather(*(run(*call) for call in calls)))
+
+    @staticmethod
+    def _fill_args(task: Optional[str], args: Dict[str, Any], user_question: str) -> Dict[str, Any]:
+        """合并参数：将用户问题也传入"""
+        if task == 'auto_query':
+            # auto_query 需要 question 参数
+            if "question" not in args:
+                args["question"] = user_question
+        elif task in ('fetch', 'extract'):
+            # fetch / extract 需要 url 参数，取问题中的第一个 URL
+            match = URL_PATTERN.search(user_question or "")
+            if "url" not in args and match:
+                args["url"] = match.group(0)
+        elif "query" not in args and "question" not in args:
+            args["query"] = user_question
+        return args
+
+    def _parallel_calls(self, items: Any, user_question: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """整理 agents 列表为 (智能体名, 任务, 参数)，忽略缺少 agent 的项，最多 MAX_PARALLEL_AGENTS 个"""
+        calls = []
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict) or not item.get("agent"):
+                continue
+            task = item.get("task")
+            args = item.get("args") if isinstance(item.get("args"), dict) else {}
+            calls.append((item["agent"], task, self._fill_args(task, dict(args), user_question)))
+        return calls[:MAX_PARALLEL_AGENTS]
+
+    @staticmethod
+    def _compact(agent_name: str, result: Any, budget: int = RESULT_TOKEN_BUDGET) -> str:
+        """压缩子智能体结果（行集转 CSV + 统计，按 token 预算截断）"""
+        text = compact_result(result, budget)
+        # 打印查询结果（调试用）
+        raw_tokens = estimate_tokens(json.dumps(result, ensure_ascii=False, indent=2, default=str))
+        print(f"[{agent_name}] 查询结果（约 {raw_tokens} → {estimate_tokens(text)} tokens）：")
+        print(text)
+        return text
+
+    @staticmethod
+    def _parallel_observation(calls: List[Tuple[str, str, Dict[str, Any]]], results: List[Any]) -> str:
+        """把并行调用的结果合并为一条观察"""
+        budget = parallel_budget(len(calls))
+        parts = []
+        for i, ((agent_name, task, _), result) in enumerate(zip(calls, results), 1):
+            parts.append(f"[{i}] {agent_name}（任务：{task}）：\n{BrainAgent._compact(agent_name, result, budget)}")
+        return f"已并行调用{len(calls)}个智能体，查询结果：\n" + "\n\n".join(parts)
+
+    def _answer_steps(self, user_question: str, max_steps: int):
+        """
+        回答流程（不含 I/O）：产出待执行的步骤，由 answer / aanswer 执行后把结果送回（失败时抛回异常）。
+        步骤：
+          ("llm", messages)                   → LLM 原文
+          ("agent", agent_name, task, args)   → 子智能体返回结果
+          ("agents", [(agent_name, task, args), ...]) → 并行调用，返回结果列表（顺序一致）
+          ("classify", question)              → 语义路由结果（SemanticRouter.classify，含向量编码，
+                                                异步路径放到线程中执行，不阻塞事件循环）
+        生成器返回值：(最终答案字符串, 调用的智能体名称)
+        """
         messages: List[Dict[str, str]] = [
             {"role": "system", "content": SYSTEM_FOR_AGENT},
             {"role": "user", "content": user_question},
@@ -427,33 +679,62 @@ class BrainAgent:
 
         # 先尝试路由分析（辅助决策）
         route_hint = self.router.analyze(user_question)
-        if route_hint["agent"] and route_hint["confidence"] > 0.5:
+        strong_routes = route_hint.get("agents") or []
+        direct_route = None   # (智能体, 任务)：不经 LLM 路由直接调用
+        if len(strong_routes) > 1:
+            # 同时高置信命中多个智能体：并行调用，合并结果后一次生成答案
+            try:
+                calls = [(r["agent"], r["task"], self._fill_args(r["task"], {}, user_question)) for r in strong_routes]
+                for agent_name, _, _ in calls:
+                    print(f"正在调用：{agent_name}智能体")
+                results = yield ("agents", calls)
+                messages.append({
+                    "role": "assistant",
+                    "content": self._parallel_observation(calls, results)
+                })
+                messages.append({
+                    "role": "user",
+                    "content": "请仔细阅读上面各智能体的查询结果，特别是 data.rows 中的实际数据。综合这些真实数据生成给用户的中文回答。如果某项查询结果为空，如实告知用户；如果某项查询失败，说明错误原因。"
+                })
+                final_response = yield ("llm", messages)
+                return (self._extract_final_answer(final_response), ",".join(c[0] for c in calls))
+            except Exception as e:
+                # 并行调用失败，回退到LLM路由
+                pass
+        else:
+            # 关键词路由高置信（明确命中数据库 / 网页关键词）时直接采用，语义路由（含“直接回答”）不能覆盖；
+            # 关键词路由不确定时由语义路由决定，仍不确定时交给 LLM 路由
+            semantic = None
+            if route_hint["agent"] and route_hint["confidence"] > 0.5:
+                direct_route = (route_hint["agent"], route_hint["task"])
+            elif self.semantic_router:
+                try:
+                    semantic = yield ("classify", user_question)
+                except Exception as e:
+                    print(f"[BrainAgent] 语义路由失败，改用 LLM 路由: {type(e).__name__}: {e}")
+            if semantic and semantic["label"] == DIRECT_ANSWER:
+                print(f"[BrainAgent] 语义路由：直接回答（置信度 {semantic['confidence']}）")
+                answer = yield ("llm", [
+                    {"role": "system", "content": SYSTEM_FOR_DIRECT},
+                    {"role": "user", "content": user_question},
+                ])
+                return (self._extract_final_answer(answer), None)
+            if semantic:
+                print(f"[BrainAgent] 语义路由：{semantic['label']}（置信度 {semantic['confidence']}）")
+                direct_route = (semantic["label"], self.router.infer_task(semantic["label"], user_question))
+
+        if direct_route:
             # 高置信度直接调用
             try:
-                agent_name = route_hint["agent"]
-                task = route_hint["task"]
+                agent_name, task = direct_route
                 print(f"正在调用：{agent_name}智能体")
                 
-                # 通知调用状态
-                if status_callback:
-                    status_callback(agent_name)
-                
-                agent_instance = self.agent_registry.get(agent_name)
-                
                 # 根据任务类型传递参数
-                if task == 'auto_query':
-                    result = agent_instance.execute(task, question=user_question)
-                elif task in ['query', 'query_model']:
-                    result = agent_instance.execute(task, query=user_question)
-                else:
-                    result = agent_instance.execute(task, query=user_question)
-                
-                # 打印查询结果（调试用）
-                print(f"[{agent_name}] 查询结果：")
-                print(json.dumps(result, ensure_ascii=False, indent=2))
+                args = self._fill_args(task, {}, user_question)
+                result = yield ("agent", agent_name, task, args)
                 
-                # 将结果格式化后返回给LLM生成最终答案
-                result_str = json.dumps(result, ensure_ascii=False, indent=2)
+                # 将结果压缩后返回给LLM生成最终答案
+                result_str = self._compact(agent_name, result)
                 messages.append({
                     "role": "assistant",
                     "content": f"已调用{agent_name}（任务：{task}），查询结果：\n{result_str}"
@@ -463,7 +744,7 @@ class BrainAgent:
                     "content": "请仔细阅读上面的查询结果，特别是 data.rows 中的实际数据。基于这些真实数据生成给用户的中文回答。如果查询结果为空，如实告知用户；如果查询失败，说明错误原因。"
                 })
                 
-                final_response = self.llm.chat(messages)
+                final_response = yield ("llm", messages)
                 return (self._extract_final_answer(final_response), agent_name)
             except Exception as e:
                 # 如果直接调用失败，回退到LLM路由
@@ -472,7 +753,7 @@ class BrainAgent:
         # LLM路由模式
         called_agent = None
         for step in range(max_steps):
-            raw = self.llm.chat(messages)
+            raw = yield ("llm", messages)
             raw_str = (raw or "").strip()
 
             # 尝试解析 JSON
@@ -487,6 +768,23 @@ class BrainAgent:
             if "final" in parsed:
                 return (str(parsed["final"]), called_agent)
 
+            # 并行调用多个子智能体
+            calls = self._parallel_calls(parsed.get("agents"), user_question)
+            if calls:
+                for agent_name, _, _ in calls:
+                    print(f"正在调用：{agent_name}智能体")
+                called_agent = ",".join(c[0] for c in calls)
+                results = yield ("agents", calls)
+                messages.append({
+                    "role": "assistant",
+                    "content": self._parallel_observation(calls, results)
+                })
+                messages.append({
+                    "role": "user",
+                    "content": "请仔细阅读上面各智能体的查询结果，特别是 data.rows 中的实际数据。综合这些真实数据生成给用户的中文回答。如果某项查询结果为空，如实告知用户；如果某项查询失败，说明错误原因。如果信息不足，可以继续调用其他智能体。"
+                })
+                continue
+
             # 调用子智能体
             agent_name = parsed.get("agent")
             task = parsed.get("task")
@@ -495,7 +793,7 @@ class BrainAgent:
             if not agent_name:
                 messages.append({
                     "role": "assistant",
-                    "content": "缺少 agent 字段。请仅输出 JSON，格式：{\"agent\": \"智能体名\", \"task\": \"任务类型\", \"args\": {...}}"
+                    "content": "缺少 agent 字段。请仅输出 JSON，格式：{\"agent\": \"智能体名\", \"task\": \"任务类型\", \"args\": {...}} 或 {\"agents\": [...]}"
                 })
                 continue
 
@@ -504,28 +802,13 @@ class BrainAgent:
                 print(f"正在调用：{agent_name}智能体")
                 called_agent = agent_name  # 记录调用的智能体
                 
-                # 通知调用状态
-                if status_callback:
-                    status_callback(agent_name)
-                
-                agent_instance = self.agent_registry.get(agent_name)
-                
                 # 合并参数：将用户问题也传入
-                if task == 'auto_query':
-                    # auto_query 需要 question 参数
-                    if "question" not in args:
-                        args["question"] = user_question
-                elif "query" not in args and "question" not in args:
-                    args["query"] = user_question
-                
-                result = agent_instance.execute(task, **args)
+                self._fill_args(task, args, user_question)
                 
-                # 打印查询结果（调试用）
-                print(f"[{agent_name}] 查询结果：")
-                print(json.dumps(result, ensure_ascii=False, indent=2))
+                result = yield ("agent", agent_name, task, args)
                 
-                # 将结果加入对话历史
-                result_str = json.dumps(result, ensure_ascii=False, indent=2)
+                # 将压缩后的结果加入对话历史
+                result_str = self._compact(agent_name, result)
                 messages.append({
                     "role": "assistant",
                     "content": f"已调用{agent_name}（任务：{task}），查询结果：\n{result_str}"
@@ -580,6 +863,17 @@ class DBToolAgent:
         return answer
 
 
+def _agent_call_error(e: Exception) -> Dict[str, Any]:
+    """并行调用中单个子智能体失败时的结果（不中断其他调用）"""
+    if isinstance(e, KeyError):
+        return {"success": False, "error": f"智能体不存在: {str(e)}"}
+    return {"success": False, "error": f"智能体执行失败: {type(e).__name__}: {str(e)}"}
+
+
+# 同步路径并行调用子智能体的共享线程池（线程按需创建，数量有上限）
+_fanout_pool = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="agent-fanout")
+
+
 def _safe_parse_first_json(text: str) -> Optional[Dict[str, Any]]:
     """
     从文本中提取并解析第一个 JSON 对象。
@@ -619,89 +913,23 @@ def _safe_parse_first_json(text: str) -> Optional[Dict[str, Any]]:
     return None
 
 
-# ---------------------- Django API（对外问答入口） ----------------------
+# ---------------------- 大脑智能体单例 ----------------------
+
+# 创建全局实例
+_brain_agent = None
+_brain_agent_lock = threading.Lock()
 
-def _agent_answer_stream(question: str):
-    """
-    生成器函数：流式返回智能体处理过程
-    使用队列和线程来实现实时状态推送
-    """
-    import queue
-    import threading
-    
-    status_queue = queue.Queue()
-    answer_result = [None, None]  # [answer, called_agent]
-    error_result = [None]
-    
-    def status_callback(agent_name: str):
-        """状态回调：当调用智能体时推送状态"""
-        # 将智能体名称转换为中文显示
-        agent_display_name = agent_name
-        if agent_name == 'searchDB_agent':
-            agent_display_name = '数据库'
-        elif agent_name == 'spider_agent':
-            agent_display_name = '网页爬虫'
-        
-        # 将状态放入队列
-        status_queue.put({
-            "type": "status",
-            "agent": agent_name,
-            "message": f"正在调用：{agent_display_name}智能体"
-        })
-    
-    def run_agent():
-        """在后台线程中运行智能体"""
-        try:
-            agent = BrainAgent()
-            answer, called_agent = agent.answer(question, status_callback=status_callback)
-            answer_result[0] = answer
-            answer_result[1] = called_agent
-            status_queue.put("DONE")  # 标记完成
-        except Exception as e:
-            error_result[0] = f"{type(e).__name__}: {str(e)}"
-            status_queue.put("DONE")
-    
-    # 启动后台线程
-    thread = threading.Thread(target=run_agent)
-    thread.daemon = True
-    thread.start()
-    
-    # 流式推送状态
-    while True:
-        try:
-            item = status_queue.get(timeout=0.1)
-            if item == "DONE":
-                break
-            
-            # 推送状态更新
-            status_data = json.dumps(item, ensure_ascii=False)
-            yield f"data: {status_data}\n\n"
-        except queue.Empty:
-            # 检查线程是否还在运行
-            if not thread.is_alive():
-                break
-            continue
-    
-    # 等待线程完成
-    thread.join(timeout=30)
-    
-    # 推送最终结果
-    if error_result[0]:
-        error_data = json.dumps({
-            "type": "error",
-            "success": False,
-            "error": error_result[0]
-        }, ensure_ascii=False)
-        yield f"data: {error_data}\n\n"
-    else:
-        result_data = json.dumps({
-            "type": "result",
-            "success": True,
-            "answer": answer_result[0],
-            "called_agent": answer_result[1]
-        }, ensure_ascii=False)
-        yield f"data: {result_data}\n\n"
 
+def get_brain_agent() -> BrainAgent:
+    """获取大脑智能体单例（LLM 客户端、注册表、路由器只构建一次）"""
+    global _brain_agent
+    with _brain_agent_lock:
+        if _brain_agent is None:
+            _brain_agent = BrainAgent()
+        return _brain_agent
+
+
+# ---------------------- Django API（对外问答入口） ----------------------
 
 @csrf_exempt
 @require_POST
@@ -722,11 +950,87 @@ def agent_answer_view(request):
     if not question:
         return JsonResponse({"success": False, "error": "缺少参数 question"}, status=400)
 
-    # 使用流式响应
+    # 提交到常驻工作池；工作线程全忙且排队已满时直接拒绝（背压）
+    runtime = get_agent_runtime()
+    try:
+        job = runtime.submit(question)
+    except AgentBusyError as e:
+        return JsonResponse({"success": False, "error": str(e), "runtime": runtime.stats()}, status=503)
+
+    # 使用流式响应：排队位置 → 智能体调用状态 → 最终结果
     response = StreamingHttpResponse(
-        _agent_answer_stream(question),
+        runtime.stream(job),
         content_type='text/event-stream'
     )
     response['Cache-Control'] = 'no-cache'
     response['X-Accel-Buffering'] = 'no'
-    return response
\ No newline at end of file
+    return response
+
+
+async def _agent_answer_astream(question: str):
+    """
+    异步生成器：流式返回智能体处理过程（事件格式同 /aiModels/brain）。
+    状态事件经 asyncio.Queue 推送，无需线程与轮询；客户端断开时取消仍在进行的回答。
+    """
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def run_agent():
+        try:
+            answer, called_agent = await get_brain_agent().aanswer(
+                question, status_callback=lambda name: events.put_nowait(status_event(name))
+            )
+            events.put_nowait({
+                "type": "result",
+                "success": True,
+                "answer": answer,
+                "called_agent": called_agent
+            })
+        except Exception as e:
+            events.put_nowait({
+                "type": "error",
+                "success": False,
+                "error": f"{type(e).__name__}: {str(e)}"
+            })
+
+    task = asyncio.ensure_future(run_agent())
+    try:
+        while True:
+            item = await events.get()
+            yield f"data: {json.dumps(item, ensure_ascii=False)}\n\n"
+            if item["type"] in ("result", "error"):
+                break
+    finally:
+        task.cancel()
+
+
+async def agent_answer_async_view(request):
+    """
+    POST /aiModels/brain_async
+    Body: {"question": "..."}
+    Return: StreamingHttpResponse (SSE格式，事件同 /aiModels/brain)
+    
+    异步版本：需以 ASGI 方式部署（config.asgi），每个会话是一个协程而非一个线程，
+    LLM 与爬虫请求走 httpx 异步客户端，数据库查询经 sync_to_async 执行。
+    注意：Django 4.2 的 require_POST / csrf_exempt 不支持协程视图，这里手动检查请求方法并标记 csrf_exempt。
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    try:
+        payload = json.loads(request.body or "{}")
+    except Exception:
+        payload = {}
+
+    question = (payload.get("question") or "").strip()
+    if not question:
+        return JsonResponse({"success": False, "error": "缺少参数 question"}, status=400)
+
+    response = StreamingHttpResponse(
+        _agent_answer_astream(question),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+agent_answer_async_view.csrf_exempt = True
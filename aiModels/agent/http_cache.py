@@ -0,0 +1,327 @@
+"""
+aiModels.agent.http_cache
+
+爬虫智能体的网页响应缓存（SQLite，持久化到磁盘）：
+- **按 URL 缓存**：保存响应正文、Content-Type、编码、ETag、Last-Modified
+- **新鲜期内直接返回**：按 Cache-Control: max-age（没有则用 HTTP_CACHE_FRESH_SECONDS）计算过期时间，
+  未过期不发请求
+- **条件请求复验**：过期后带 If-None-Match / If-Modified-Since 请求，304 时沿用缓存正文，只刷新过期时间
+- **解析结果缓存**：同一页面的正文提取 / 选择器提取结果一并保存，正文变化（哈希不同）时自动清除
+- **淘汰**：总大小超过 HTTP_CACHE_MAX_BYTES 或条目数超过 HTTP_CACHE_MAX_ENTRIES 时，按最近访问时间（LRU）淘汰
+- **失败兜底**：网络失败时若有过期缓存，返回过期内容并标记 stale
+
+说明：
+- Cache-Control: no-store 的响应、超过 HTTP_CACHE_MAX_BODY 的正文、非 200 响应不缓存
+- 每个线程使用独立连接（WAL 模式）；异步路径通过 asyncio.to_thread 调用，读写不占用事件循环线程
+- `/aiModels/http_cache_stats` 查看命中 / 复验 / 下载次数与占用空间
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+# ========== 缓存参数 ==========
+HTTP_CACHE_PATH = Path(__file__).parent / "http_cache.sqlite3"
+USE_HTTP_CACHE = True
+HTTP_CACHE_FRESH_SECONDS = 600          # 响应未给出 max-age 时的新鲜期（秒）
+HTTP_CACHE_MAX_FRESH_SECONDS = 86400    # max-age 上限
+HTTP_CACHE_MAX_BYTES = 200 * 1024 * 1024
+HTTP_CACHE_MAX_ENTRIES = 5000
+HTTP_CACHE_MAX_BODY = 5 * 1024 * 1024   # 单个正文超过该大小不缓存
+HTTP_CACHE_EVICT_RATIO = 0.9            # 淘汰到上限的该比例，避免每次写入都触发淘汰
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url           TEXT PRIMARY KEY,
+    status        INTEGER NOT NULL,
+    content_type  TEXT NOT NULL DEFAULT '',
+    encoding      TEXT NOT NULL DEFAULT '',
+    body          BLOB NOT NULL,
+    body_hash     TEXT NOT NULL,
+    etag          TEXT,
+    last_modified TEXT,
+    fetched_at    REAL NOT NULL,
+    expires_at    REAL NOT NULL,
+    accessed_at   REAL NOT NULL,
+    size          INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at);
+CREATE TABLE IF NOT EXISTS extractions (
+    url    TEXT NOT NULL,
+    kind   TEXT NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (url, kind)
+);
+"""
+
+_MAX_AGE = re.compile(r"max-age\s*=\s*(\d+)", re.I)
+
+
+def _header(headers: Mapping[str, str], name: str) -> Optional[str]:
+    value = headers.get(name)
+    return value.strip() if value else None
+
+
+def _freshness(headers: Mapping[str, str]) -> Optional[float]:
+    """响应的新鲜期（秒）；no-store 返回 None（不缓存），no-cache 返回 0（每次复验）"""
+    cc = (_header(headers, "Cache-Control") or "").lower()
+    if "no-store" in cc:
+        return None
+    if "no-cache" in cc:
+        return 0.0
+    m = _MAX_AGE.search(cc)
+    if m:
+        return float(min(int(m.group(1)), HTTP_CACHE_MAX_FRESH_SECONDS))
+    return float(HTTP_CACHE_FRESH_SECONDS)
+
+
+class HttpCache:
+    """网页响应的 SQLite 缓存。lookup → (新鲜则直接用 | 条件请求) → store / revalidated。"""
+
+    def __init__(self, db_path: Path = HTTP_CACHE_PATH, max_bytes: int = HTTP_CACHE_MAX_BYTES,
+                 max_entries: int = HTTP_CACHE_MAX_ENTRIES) -> None:
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._lock = threading.Lock()
+        self.hits = 0           # 新鲜期内直接返回
+        self.revalidated = 0    # 304，沿用缓存正文
+        self.downloaded = 0     # 下载了新正文
+        self.stale = 0          # 网络失败，返回过期缓存
+        self.extraction_hits = 0
+        self.evicted = 0
+
+    # ---------- 连接与初始化 ----------
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+        return conn
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    # ---------- 响应 ----------
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """取缓存条目（并更新访问时间）；没有返回 None"""
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        return dict(row)
+
+    def mark_hit(self) -> None:
+        self._count("hits")
+
+    def mark_stale(self) -> None:
+        self._count("stale")
+
+    @staticmethod
+    def is_fresh(entry: Dict[str, Any]) -> bool:
+        return entry["expires_at"] > time.time()
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """复验用的条件请求头"""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    @staticmethod
+    def text(entry: Dict[str, Any]) -> str:
+        return bytes(entry["body"]).decode(entry.get("encoding") or "utf-8", errors="replace")
+
+    def store(self, url: str, status: int, headers: Mapping[str, str], body: bytes,
+              encoding: Optional[str]) -> Dict[str, Any]:
+        """
+        保存新下载的响应；返回条目（不可缓存的响应也返回条目，只是不写库）。
+        不可缓存的响应替换了已缓存的页面时，删除旧页面及其解析结果（旧内容已不代表该 URL）。
+        """
+        self._count("downloaded")
+        now = time.time()
+        fresh = _freshness(headers)
+        entry = {
+            "url": url,
+            "status": status,
+            "content_type": headers.get("Content-Type", ""),
+            "encoding": encoding or "utf-8",
+            "body": body,
+            "body_hash": hashlib.sha1(body).hexdigest(),
+            "etag": _header(headers, "ETag"),
+            "last_modified": _header(headers, "Last-Modified"),
+            "fetched_at": now,
+            "expires_at": now + (fresh or 0.0),
+            "accessed_at": now,
+            "size": len(body),
+        }
+        if fresh is None or status != 200 or len(body) > HTTP_CACHE_MAX_BODY:
+            self.delete(url)
+            return entry
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            old = conn.execute("SELECT body_hash FROM responses WHERE url = ?", (url,)).fetchone()
+            if old is not None and old["body_hash"] != entry["body_hash"]:
+                conn.execute("DELETE FROM extractions WHERE url = ?", (url,))
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (url, status, content_type, encoding, body, body_hash, etag, "
+                "last_modified, fetched_at, expires_at, accessed_at, size) "
+                "VALUES (:url, :status, :content_type, :encoding, :body, :body_hash, :etag, "
+                ":last_modified, :fetched_at, :expires_at, :accessed_at, :size)",
+                entry,
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._evict(conn)
+        return entry
+
+    def delete(self, url: str) -> None:
+        """删除某个 URL 的缓存页面与解析结果"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            conn.execute("DELETE FROM extractions WHERE url = ?", (url,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def mark_revalidated(self, entry: Dict[str, Any], headers: Mapping[str, str]) -> Dict[str, Any]:
+        """304：沿用缓存正文，刷新过期时间（服务器返回了新的校验值时一并更新）"""
+        self._count("revalidated")
+        now = time.time()
+        fresh = _freshness(headers)
+        entry = dict(entry)
+        entry["etag"] = _header(headers, "ETag") or entry.get("etag")
+        entry["last_modified"] = _header(headers, "Last-Modified") or entry.get("last_modified")
+        entry["fetched_at"] = now
+        entry["expires_at"] = now + (fresh or 0.0)
+        self._conn().execute(
+            "UPDATE responses SET etag = ?, last_modified = ?, fetched_at = ?, expires_at = ? WHERE url = ?",
+            (entry["etag"], entry["last_modified"], now, entry["expires_at"], entry["url"]),
+        )
+        return entry
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total, count = conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM responses").fetchone()
+        if total <= self.max_bytes and count <= self.max_entries:
+            return
+        target_bytes = int(self.max_bytes * HTTP_CACHE_EVICT_RATIO)
+        target_count = int(self.max_entries * HTTP_CACHE_EVICT_RATIO)
+        victims = []
+        for row in conn.execute("SELECT url, size FROM responses ORDER BY accessed_at"):
+            if total <= target_bytes and count <= target_count:
+                break
+            victims.append((row["url"],))
+            total -= row["size"]
+            count -= 1
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("DELETE FROM responses WHERE url = ?", victims)
+            conn.executemany("DELETE FROM extractions WHERE url = ?", victims)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self.evicted += len(victims)
+
+    # ---------- 解析结果 ----------
+
+    def get_extraction(self, url: str, kind: str) -> Optional[Dict[str, Any]]:
+        """取页面的解析结果；kind 区分解析方式（如 page:1、extract:<选择器>）"""
+        row = self._conn().execute(
+            "SELECT result FROM extractions WHERE url = ? AND kind = ?", (url, kind)).fetchone()
+        if row is None:
+            return None
+        self._count("extraction_hits")
+        return json.loads(row["result"])
+
+    def put_extraction(self, url: str, kind: str, result: Dict[str, Any]) -> None:
+        """保存解析结果（只对已缓存的页面保存，页面被淘汰时一并删除）"""
+        self._conn().execute(
+            "INSERT OR REPLACE INTO extractions (url, kind, result) "
+            "SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM responses WHERE url = ?)",
+            (url, kind, json.dumps(result, ensure_ascii=False), url),
+        )
+
+    # ---------- 统计 ----------
+
+    def clear(self) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM responses")
+        conn.execute("DELETE FROM extractions")
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        total, count = conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM responses").fetchone()
+        extractions = conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+        with self._lock:
+            requests_total = self.hits + self.revalidated + self.downloaded + self.stale
+            return {
+                "entries": count,
+                "extractions": extractions,
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "downloaded": self.downloaded,
+                "stale": self.stale,
+                "extraction_hits": self.extraction_hits,
+                "evicted": self.evicted,
+                "no_bandwidth_rate": round((self.hits + self.stale) / requests_total, 4) if requests_total else 0.0,
+            }
+
+
+# 创建全局实例
+_http_cache = None
+_http_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> HttpCache:
+    """获取网页响应缓存单例"""
+    global _http_cache
+    with _http_cache_lock:
+        if _http_cache is None:
+            _http_cache = HttpCache()
+        return _http_cache
+
+
+@require_GET
+def http_cache_stats_view(request):
+    """GET /aiModels/http_cache_stats：查看网页响应缓存的命中、复验与占用空间"""
+    return JsonResponse({"success": True, "http_cache": get_http_cache().stats()})
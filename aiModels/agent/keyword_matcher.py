@@ -0,0 +1,131 @@
+"""
+aiModels.agent.keyword_matcher
+
+关键词多模式匹配（Aho-Corasick 自动机）：
+- 路由关键词、模型意图规则一次性编译为自动机，问题只需线性扫描一遍即可得到全部命中
+- 同一关键词可属于多个规则（标签），命中时各标签分别计分
+- 关键词可带权重：`"温度"` 权重为 1，`("温度", 2.0)` 权重为 2；同一关键词在一个标签下只计一次
+- 不区分大小写（关键词与文本统一转小写）
+
+说明：
+- 自动机构建后只读，可被多线程共享；规则变更时构建新的自动机并整体替换引用（热更新）
+- `followed_by(a, b)` 判断 a 组关键词之后是否出现 b 组关键词，等价于正则 `(a1|a2).*?(b1|b2)`
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, Hashable, Iterable, Iterator, List, Tuple, Union
+
+Keyword = Union[str, Tuple[str, float]]
+
+
+def keyword_patterns(keywords: Iterable[Keyword], label: Hashable) -> List[Tuple[str, Hashable, float]]:
+    """关键词列表（元素为 "kw" 或 ("kw", 权重)）→ (关键词, 标签, 权重) 列表"""
+    out = []
+    for kw in keywords:
+        if isinstance(kw, (tuple, list)):
+            out.append((str(kw[0]), label, float(kw[1])))
+        else:
+            out.append((str(kw), label, 1.0))
+    return out
+
+
+class KeywordHits:
+    """一次匹配的结果：标签 → 命中的关键词及位置"""
+
+    def __init__(self) -> None:
+        # 标签 → {关键词: [(start, end), ...]}（关键词按首次出现顺序）
+        self._hits: Dict[Hashable, Dict[str, List[Tuple[int, int]]]] = {}
+        self._weights: Dict[Tuple[Hashable, str], float] = {}
+
+    def _add(self, label: Hashable, keyword: str, weight: float, start: int, end: int) -> None:
+        self._hits.setdefault(label, {}).setdefault(keyword, []).append((start, end))
+        self._weights[(label, keyword)] = weight
+
+    def labels(self) -> List[Hashable]:
+        return list(self._hits)
+
+    def keywords(self, label: Hashable) -> List[str]:
+        return list(self._hits.get(label, {}))
+
+    def score(self, label: Hashable) -> float:
+        """标签得分：命中的不同关键词的权重之和"""
+        return sum(self._weights[(label, kw)] for kw in self._hits.get(label, {}))
+
+    def exclusive_score(self, label: Hashable, other: Hashable) -> float:
+        """标签得分，但只计与 other 组命中位置不重叠的关键词（用于判断两组是否各有独立证据）"""
+        taken = [span for spans in self._hits.get(other, {}).values() for span in spans]
+        return sum(
+            self._weights[(label, kw)] for kw, spans in self._hits.get(label, {}).items()
+            if any(all(end <= s or start >= e for s, e in taken) for start, end in spans)
+        )
+
+    def followed_by(self, first: Hashable, then: Hashable) -> bool:
+        """first 组某个关键词结束之后，是否出现 then 组的关键词"""
+        a, b = self._hits.get(first), self._hits.get(then)
+        if not a or not b:
+            return False
+        earliest_end = min(end for spans in a.values() for _, end in spans)
+        return any(start >= earliest_end for spans in b.values() for start, _ in spans)
+
+
+class KeywordMatcher:
+    def __init__(self, patterns: Iterable[Tuple[str, Hashable, float]]) -> None:
+        """patterns：(关键词, 标签, 权重)；空关键词忽略"""
+        self.patterns: List[Tuple[str, Hashable, float]] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for kw, label, weight in patterns:
+            if not kw:
+                continue
+            self.patterns.append((kw, label, weight))
+            self._insert(kw.lower(), len(self.patterns) - 1)
+        self._lengths = [len(kw) for kw, _, _ in self.patterns]
+        self._build_fail()
+
+    def _insert(self, kw: str, pid: int) -> None:
+        state = 0
+        for ch in kw:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append(pid)
+
+    def _build_fail(self) -> None:
+        # 按层（BFS）计算失败指针，并展开为完整转移表：扫描时每个字符只查一次字典
+        self._delta: List[Dict[str, int]] = [dict(self._goto[0])] + [{} for _ in self._goto[1:]]
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            self._delta[state] = {**self._delta[self._fail[state]], **self._goto[state]} if state else self._delta[0]
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                self._fail[nxt] = self._delta[self._fail[state]].get(ch, 0) if state else 0
+                # 失败链上的输出合并进来，匹配时无需再沿失败链收集
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """逐个产出 (start, end, 模式序号)，end 为开区间"""
+        delta, out, lengths = self._delta, self._out, self._lengths
+        state = 0
+        for i, ch in enumerate((text or "").lower()):
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                for pid in out[state]:
+                    yield i + 1 - lengths[pid], i + 1, pid
+
+    def match(self, text: str) -> KeywordHits:
+        """线性扫描一遍，返回全部标签的命中"""
+        hits = KeywordHits()
+        patterns = self.patterns
+        for start, end, pid in self.iter_matches(text):
+            kw, label, weight = patterns[pid]
+            hits._add(label, kw, weight, start, end)
+        return hits
@@ -0,0 +1,482 @@
+"""
+aiModels.agent.query_planner
+
+自然语言 → 聚合查询计划（供 searchDB_agent.auto_query 使用）：
+- **槽位填充**（关键词 / 正则，不调用 LLM）：
+  - 聚合：总计/合计/总产量 → sum，平均 → avg，最高 → max，最低 → min，多少条/数量 → count
+  - 分组：按月/每月 → month，按年/历年 → year，按天/每日 → day，各地区/各品种/各设备等 → 维度字段
+  - 排名：哪个/哪些 X 最高/最低/最多 → 按 X 分组、按聚合值排序取前几组（聚合用模型的 default_agg）
+  - 时间范围：2024年、2024年5月、2024-01-01 到 2024-03-31、最近7天、近3个月、今天、上个月、去年 ……
+  - 过滤：省份（湖北/广西…）、基地编号（HB001）、设备编号、告警是否处理 / 级别、设备在线状态
+  - 指标：产量、温度、湿度、CO2 等（按模型配置）
+- **编译**：整个计划编译为一条 ORM 查询（aggregate 或 values().annotate()），由数据库完成计算，
+  只返回一个数值或每组一行
+- 未识别出聚合或分组时不生成聚合查询，但识别出的过滤与时间范围仍可用于普通明细查询
+- 问题中提到了模型无法过滤的条件（如读数表没有省份字段却问“湖北”）时不生成聚合查询，
+  避免把全局结果当作该条件下的结果；未应用的条件记录在 unapplied 中
+
+说明：
+- 每个模型可用的指标、维度、时间字段在 MODEL_SCHEMAS 中配置；未配置的模型不做规划
+- 时间按当前时区（settings.TIME_ZONE）解释，区间为左闭右开
+"""
+
+from __future__ import annotations
+
+import calendar
+import datetime
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.apps import apps
+from django.db.models import Avg, Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncYear
+from django.utils import timezone
+
+# ========== 规划参数 ==========
+GROUP_LIMIT = 100   # 分组查询最多返回的组数
+RANK_TOP_N = 5      # “哪些 X 最高”返回的组数（“哪个”返回 1 组）
+
+# 模型配置：
+#   time_field / time_type：时间字段及类型（datetime / date / year：整数年份）
+#   metrics：指标关键词 → 字段（按关键词长度优先匹配）；default_metric：未提到指标时使用
+#   default_agg：只出现分组、未出现聚合词时使用的聚合
+#   dims：维度关键词 → 分组字段（“各地区”“按品种”）
+#   province_field / base_field / device_field：省份、基地编号、设备编号的过滤字段
+#   flags：(正则, 过滤条件)
+MODEL_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "screen.Citrus_production_history_area": {
+        "time_field": "date", "time_type": "date",
+        "metrics": {"产量": "production_volume"}, "default_metric": "production_volume",
+        "default_agg": "sum",
+        "dims": {"地区": "area", "省份": "area", "省": "area"},
+        "province_field": "area__contains",
+    },
+    "screen.Citrus_variety_production_history_area": {
+        "time_field": "date", "time_type": "date",
+        "metrics": {"产量": "production_volume"}, "default_metric": "production_volume",
+        "default_agg": "sum",
+        "dims": {"地区": "area", "省份": "area", "省": "area", "品种": "variety"},
+        "province_field": "area__contains",
+    },
+    "screen.Citrus_production_history": {
+        "time_field": "year", "time_type": "year",
+        "metrics": {"产量": "production_volume"}, "default_metric": "production_volume",
+        "default_agg": "sum",
+        "dims": {},
+    },
+    "screen.Citrus": {
+        "metrics": {"产量": "value"}, "default_metric": "value",
+        "default_agg": "sum",
+        "dims": {"地区": "area", "省份": "area", "省": "area"},
+        "province_field": "area__contains",
+    },
+    "storageSystem.DeviceReading": {
+        "time_field": "reported_at", "time_type": "datetime",
+        "metrics": {
+            "温度": "temperature", "湿度": "humidity",
+            "二氧化碳": "co2_ppm", "co2": "co2_ppm",
+            "一氧化碳": "co_ppm", "co": "co_ppm",
+            "氢气": "h2_ppm", "h2": "h2_ppm",
+            "乙醇": "c2h5oh", "c2h5oh": "c2h5oh",
+            "乙烯": "c2h4", "c2h4": "c2h4",
+            "氧气": "o2", "o2": "o2",
+            "voc": "voc",
+        },
+        "default_metric": "temperature",
+        "default_agg": "avg",
+        "dims": {"设备": "device_name"},
+        "device_field": "device_name",
+    },
+    "storageSystem.Alarm": {
+        "time_field": "occurred_at", "time_type": "datetime",
+        "metrics": {}, "default_agg": "count",
+        "dims": {"级别": "level", "设备": "device__name", "基地": "device__base_id"},
+        "base_field": "device__base_id",
+        "device_field": "device__code",
+        "flags": [
+            (r"未处理|未解决|活动|当前", {"is_active": True}),
+            (r"已处理|已解决", {"is_active": False}),
+            (r"严重", {"level": "critical"}),
+        ],
+    },
+    "storageSystem.Device": {
+        "time_field": "last_seen", "time_type": "datetime",
+        "metrics": {}, "default_agg": "count",
+        "dims": {"状态": "status", "基地": "base_id"},
+        "province_field": "base__province_name__contains",
+        "base_field": "base_id",
+        "device_field": "code",
+        "flags": [
+            (r"在线", {"status": "online"}),
+            (r"离线", {"status": "offline"}),
+        ],
+    },
+    "storageSystem.Base": {
+        "metrics": {}, "default_agg": "count",
+        "dims": {"省份": "province_name", "省": "province_name", "城市": "city_name"},
+        "province_field": "province_name__contains",
+        "base_field": "base_id",
+    },
+}
+MODEL_SCHEMAS["screen.Base"] = MODEL_SCHEMAS["storageSystem.Base"]
+
+# 原生表 → 对应模型（原生表命中且需要聚合时改用模型）
+TABLE_MODELS = {"sensor_readings1": "storageSystem.DeviceReading"}
+
+AGGREGATES = {"sum": Sum, "avg": Avg, "max": Max, "min": Min, "count": Count}
+
+# 聚合词：按顺序匹配，先到先得（“平均产量”优先于“总”）
+_AGG_PATTERNS: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("avg", re.compile(r"平均|均值|average|avg", re.I)),
+    ("max", re.compile(r"最高|最大|峰值|max", re.I)),
+    ("min", re.compile(r"最低|最小|min", re.I)),
+    ("count", re.compile(r"多少[条次个台家座]|几[条次个台家座]|条数|数量|次数|总数|计数|count", re.I)),
+    ("sum", re.compile(r"总计|总和|总量|总产量|总共|合计|累计|一共|共计|sum", re.I)),
+]
+
+# 排名：“哪个/哪些 + 维度”与排序方向
+_RANK_QUANTIFIERS = r"一个|一些|个|些|家|台|座|种|类"
+_RANK_SUBJECT = rf"哪(?:{_RANK_QUANTIFIERS})?\s*"
+_RANK_SUBJECT_RE = re.compile(rf"哪(?:{_RANK_QUANTIFIERS})")
+_RANK_ORDERS: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("desc", re.compile(r"最高|最大|最多|最好|第一|排名靠前", re.I)),
+    ("asc", re.compile(r"最低|最小|最少|最差|排名靠后", re.I)),
+]
+
+_TIME_GROUPS: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("month", re.compile(r"按月|每月|各月|逐月|月度|每个月|分月")),
+    ("year", re.compile(r"按年|每年|各年|逐年|历年|每一年|分年")),
+    ("day", re.compile(r"按天|按日|每天|每日|逐日|分日")),
+]
+_TRUNC = {"month": TruncMonth, "year": TruncYear, "day": TruncDay}
+
+PROVINCES = (
+    "北京", "天津", "河北", "山西", "内蒙古", "辽宁", "吉林", "黑龙江", "上海", "江苏", "浙江", "安徽",
+    "福建", "江西", "山东", "河南", "湖北", "湖南", "广东", "广西", "海南", "重庆", "四川", "贵州",
+    "云南", "西藏", "陕西", "甘肃", "青海", "宁夏", "新疆", "台湾", "香港", "澳门",
+)
+_PROVINCE_RE = re.compile("|".join(sorted(PROVINCES, key=len, reverse=True)))
+_BASE_ID_RE = re.compile(r"(?<![A-Za-z0-9])([A-Za-z]{2}\d{3})(?![0-9])")
+_DEVICE_RE = re.compile(r"设备\s*(?:编号|号)?\s*[:：]?\s*([A-Za-z][\w\-]*\d[\w\-]*)")
+
+_CN_DIGITS = {"零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_NUM = r"(\d+|[零一二两三四五六七八九十]+)"
+_RANGE_RE = re.compile(
+    r"(\d{4})[-/年.](\d{1,2})[-/月.](\d{1,2})日?\s*(?:到|至|~|—|-)\s*(\d{4})[-/年.](\d{1,2})[-/月.](\d{1,2})日?")
+_RECENT_RE = re.compile(rf"(?:最近|近|过去)\s*{_NUM}\s*(?:个)?\s*(小时|天|日|周|星期|月|年)")
+_YEAR_RANGE_RE = re.compile(r"(\d{4})\s*年?\s*(?:到|至|~|—|-)\s*(\d{4})\s*年")
+_MONTH_RE = re.compile(r"(\d{4})\s*年\s*(\d{1,2})\s*月")
+_YEAR_RE = re.compile(r"(\d{4})\s*年")
+_RELATIVE = ("今天", "昨天", "前天", "本周", "这周", "上周", "本月", "这个月", "上个月", "上月", "今年", "去年", "前年")
+
+
+def _cn_int(text: str) -> int:
+    """阿拉伯数字或简单中文数字（≤ 99）转整数。"""
+    if text.isdigit():
+        return int(text)
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        return (_CN_DIGITS.get(tens, 1) if tens else 1) * 10 + (_CN_DIGITS.get(ones, 0) if ones else 0)
+    return _CN_DIGITS.get(text, 0)
+
+
+def _add_months(d: datetime.datetime, months: int) -> datetime.datetime:
+    m = d.month - 1 + months
+    return d.replace(year=d.year + m // 12, month=m % 12 + 1, day=1)
+
+
+def _shift_months(d: datetime.datetime, months: int) -> datetime.datetime:
+    """前后移动若干个月，保留日期；目标月没有这一天时取月末（3月31日 → 2月28/29日，闰日 → 2月28日）"""
+    start = _add_months(d, months)
+    return start.replace(day=min(d.day, calendar.monthrange(start.year, start.month)[1]))
+
+
+def parse_time_range(question: str, now: Optional[datetime.datetime] = None
+                     ) -> Optional[Tuple[datetime.datetime, datetime.datetime, str]]:
+    """
+    解析问题中的时间范围：返回 (开始, 结束, 原文)，左闭右开，均为当前时区的 aware datetime；未识别返回 None。
+    """
+    now = timezone.localtime(now or timezone.now())
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    tz = now.tzinfo
+
+    def day(y, m, d):
+        return datetime.datetime(int(y), int(m), int(d), tzinfo=tz)
+
+    m = _RANGE_RE.search(question)
+    if m:
+        g = m.groups()
+        return day(*g[:3]), day(*g[3:]) + datetime.timedelta(days=1), m.group(0)
+
+    m = _RECENT_RE.search(question)
+    if m:
+        n, unit = max(1, _cn_int(m.group(1))), m.group(2)
+        if unit == "小时":
+            return now - datetime.timedelta(hours=n), now, m.group(0)
+        if unit in ("天", "日"):
+            return today - datetime.timedelta(days=n - 1), now, m.group(0)
+        if unit in ("周", "星期"):
+            return today - datetime.timedelta(weeks=n), now, m.group(0)
+        if unit == "月":
+            return _shift_months(today, -n), now, m.group(0)
+        return _shift_months(today, -12 * n), now, m.group(0)
+
+    for word in _RELATIVE:
+        if word not in question:
+            continue
+        if word == "今天":
+            return today, today + datetime.timedelta(days=1), word
+        if word in ("昨天", "前天"):
+            start = today - datetime.timedelta(days=1 if word == "昨天" else 2)
+            return start, start + datetime.timedelta(days=1), word
+        if word in ("本周", "这周", "上周"):
+            start = today - datetime.timedelta(days=today.weekday() + (7 if word == "上周" else 0))
+            return start, start + datetime.timedelta(weeks=1), word
+        if word in ("本月", "这个月"):
+            start = today.replace(day=1)
+            return start, _add_months(start, 1), word
+        if word in ("上个月", "上月"):
+            start = _add_months(today, -1)
+            return start, today.replace(day=1), word
+        offset = {"今年": 0, "去年": 1, "前年": 2}[word]
+        start = today.replace(year=today.year - offset, month=1, day=1)
+        return start, start.replace(year=start.year + 1), word
+
+    m = _YEAR_RANGE_RE.search(question)
+    if m:
+        return day(m.group(1), 1, 1), day(int(m.group(2)) + 1, 1, 1), m.group(0)
+    m = _MONTH_RE.search(question)
+    if m and 1 <= int(m.group(2)) <= 12:
+        start = day(m.group(1), m.group(2), 1)
+        return start, _add_months(start, 1), m.group(0)
+    m = _YEAR_RE.search(question)
+    if m:
+        return day(m.group(1), 1, 1), day(int(m.group(1)) + 1, 1, 1), m.group(0)
+    return None
+
+
+@dataclass
+class QueryPlan:
+    model: str
+    agg: Optional[str] = None                 # sum / avg / max / min / count
+    metric: Optional[str] = None              # 指标字段（count 时为空）
+    group_by: Optional[str] = None            # month / year / day 或维度字段
+    filters: Dict[str, Any] = field(default_factory=dict)
+    time_range: Optional[Tuple[datetime.datetime, datetime.datetime]] = None
+    order: Optional[str] = None               # 按维度分组时的排序：desc / asc（排名问题）
+    top: Optional[int] = None                 # 排名问题返回的组数
+    unapplied: Dict[str, str] = field(default_factory=dict)  # 问题中提到但该模型无法过滤的条件
+    slots: Dict[str, str] = field(default_factory=dict)   # 槽位 → 命中的原文（用于说明）
+
+    @property
+    def is_aggregate(self) -> bool:
+        # 有无法应用的过滤条件时，聚合结果会被误当作该条件下的结果，不做聚合
+        return bool(self.agg) and not self.unapplied
+
+    @property
+    def schema(self) -> Dict[str, Any]:
+        return MODEL_SCHEMAS[self.model]
+
+    @property
+    def value_key(self) -> str:
+        return f"{self.agg}_{self.metric}" if self.metric else "count"
+
+    def orm_filters(self) -> Dict[str, Any]:
+        """过滤条件 + 时间范围 → ORM filter kwargs"""
+        out = dict(self.filters)
+        if self.time_range and self.schema.get("time_field"):
+            tf, tt = self.schema["time_field"], self.schema.get("time_type")
+            start, end = self.time_range
+            if tt == "year":
+                out[f"{tf}__gte"] = start.year
+                out[f"{tf}__lt"] = end.year if (end.month, end.day, end.hour) == (1, 1, 0) else end.year + 1
+            elif tt == "date":
+                out[f"{tf}__gte"] = start.date()
+                out[f"{tf}__lt"] = end.date() if end.time() == datetime.time.min else end.date() + datetime.timedelta(days=1)
+            else:
+                out[f"{tf}__gte"] = start
+                out[f"{tf}__lt"] = end
+        return out
+
+    def describe(self) -> Dict[str, Any]:
+        d: Dict[str, Any] = {"model": self.model}
+        if self.agg:
+            d["aggregate"] = self.agg
+        if self.metric:
+            d["metric"] = self.metric
+        if self.group_by:
+            d["group_by"] = self.group_by
+        if self.order:
+            d["order"] = self.order
+        if self.top:
+            d["top"] = self.top
+        if self.time_range:
+            d["time_range"] = [t.isoformat(sep=" ", timespec="seconds") for t in self.time_range]
+        if self.filters:
+            d["filters"] = self.filters
+        if self.unapplied:
+            d["unapplied_filters"] = self.unapplied
+        if self.slots:
+            d["matched"] = self.slots
+        return d
+
+
+def _match_keyword(question: str, mapping: Dict[str, str]) -> Optional[Tuple[str, str]]:
+    """按关键词长度优先匹配；英文关键词要求前后不是字母数字（“co”不匹配 count / code / co2）"""
+    q = question.lower()
+    for kw in sorted(mapping, key=len, reverse=True):
+        k = kw.lower()
+        if k.isascii():
+            if re.search(rf"(?<![a-z0-9_]){re.escape(k)}(?![a-z0-9_])", q):
+                return kw, mapping[kw]
+        elif k in q:
+            return kw, mapping[kw]
+    return None
+
+
+def _match_rank(question: str, schema: Dict[str, Any]
+                ) -> Optional[Tuple[str, str, int, str, str]]:
+    """“哪个/哪些 + 维度 … 最高/最低” → (分组字段, 排序, 组数, 维度原文, 排序原文)"""
+    order = next(((o, m.group(0)) for o, p in _RANK_ORDERS for m in [p.search(question)] if m), None)
+    if order is None:
+        return None
+    for kw in sorted(schema.get("dims", {}), key=len, reverse=True):
+        m = re.search(rf"{_RANK_SUBJECT}{re.escape(kw)}", question)
+        if m:
+            top = RANK_TOP_N if "些" in m.group(0) else 1
+            return schema["dims"][kw], order[0], top, m.group(0), order[1]
+    return None
+
+
+def plan_query(question: str, model: Optional[str] = None, table: Optional[str] = None,
+               now: Optional[datetime.datetime] = None) -> Optional[QueryPlan]:
+    """
+    对已选定的模型（或原生表）做槽位填充。模型未配置时返回 None。
+    """
+    model = model or TABLE_MODELS.get(table or "")
+    if not question or model not in MODEL_SCHEMAS:
+        return None
+    schema = MODEL_SCHEMAS[model]
+    plan = QueryPlan(model=model)
+
+    # 分组：时间粒度优先，其次维度
+    for name, pattern in _TIME_GROUPS:
+        m = pattern.search(question)
+        if m and schema.get("time_field"):
+            # 整数年份字段只能按年分组
+            if schema.get("time_type") == "year" and name != "year":
+                continue
+            plan.group_by, plan.slots["group_by"] = name, m.group(0)
+            break
+    if plan.group_by is None:
+        for kw in sorted(schema.get("dims", {}), key=len, reverse=True):
+            m = re.search(rf"(?:各|按|每个|每|分)\s*{re.escape(kw)}", question)
+            if m:
+                plan.group_by, plan.slots["group_by"] = schema["dims"][kw], m.group(0)
+                break
+
+    # 排名：“哪个品种产量最高” → 按品种分组，按聚合值排序取第一组
+    rank = _match_rank(question, schema) if plan.group_by is None else None
+    if rank:
+        plan.group_by, plan.order, plan.top = rank[0], rank[1], rank[2]
+        plan.slots["group_by"], plan.slots["order"] = rank[3], rank[4]
+
+    # 指标与聚合
+    metric = _match_keyword(question, schema.get("metrics", {}))
+    if metric:
+        plan.slots["metric"] = metric[0]
+    if rank:
+        # 排名词（最高 / 最多）说明的是排序方向，每组的值用模型默认聚合（产量求和、读数取平均……）
+        plan.agg = schema.get("default_agg", "count")
+    elif re.search(_RANK_SUBJECT_RE, question) and any(p.search(question) for _, p in _RANK_ORDERS):
+        # 问的是“哪个 X 最高”，但该模型不能按 X 分组：整体 max/min 会丢掉 X，不做聚合（返回明细）
+        plan.slots["rank"] = "无法按所问维度分组"
+    else:
+        for agg, pattern in _AGG_PATTERNS:
+            m = pattern.search(question)
+            if m:
+                plan.agg, plan.slots["aggregate"] = agg, m.group(0)
+                break
+    explicit = plan.agg is not None
+    if plan.agg is None and plan.group_by:
+        plan.agg = schema.get("default_agg", "count")
+    if plan.agg and plan.agg != "count":
+        plan.metric = metric[1] if metric else schema.get("default_metric")
+        if plan.metric is None:
+            # 模型没有可计算的指标：问“平均 / 最高”时不能改成计数，不做聚合
+            plan.agg = None if explicit and not rank else "count"
+
+    # 时间范围
+    tr = parse_time_range(question, now)
+    if tr and schema.get("time_field"):
+        plan.time_range, plan.slots["time_range"] = tr[:2], tr[2]
+
+    # 过滤：识别出的条件模型无法过滤时记入 unapplied
+    for slot, field_key, pattern, value in (
+        ("province", "province_field", _PROVINCE_RE, lambda m: m.group(0)),
+        ("base", "base_field", _BASE_ID_RE, lambda m: m.group(1).upper()),
+        ("device", "device_field", _DEVICE_RE, lambda m: m.group(1)),
+    ):
+        m = pattern.search(question)
+        if not m:
+            continue
+        if schema.get(field_key):
+            plan.filters[schema[field_key]] = value(m)
+        else:
+            plan.unapplied[slot] = value(m)
+    for pattern, flt in schema.get("flags", []):
+        if re.search(pattern, question):
+            plan.filters.update(flt)
+    return plan
+
+
+def _plain(v: Any) -> Any:
+    if isinstance(v, (float, Decimal)):
+        return round(float(v), 4)
+    return v
+
+
+_PERIOD_FORMATS = {"year": "%Y", "month": "%Y-%m", "day": "%Y-%m-%d"}
+
+
+def _period(v: Any, group_by: str) -> Any:
+    if isinstance(v, datetime.datetime) and timezone.is_aware(v):
+        v = timezone.localtime(v)
+    if isinstance(v, datetime.date):
+        return v.strftime(_PERIOD_FORMATS[group_by])
+    return v
+
+
+def execute_plan(plan: QueryPlan, limit: int = GROUP_LIMIT) -> Dict[str, Any]:
+    """
+    把计划编译为一条 ORM 聚合查询并执行，返回 {model, plan, count, rows}。
+    - 无分组：aggregate() → 一行
+    - 按时间分组：Trunc + values().annotate()，取最近 limit 个周期，按时间升序返回
+    - 按维度分组：values(维度).annotate()，按聚合值降序取前 limit 组（排名问题按 order 排序取前 top 组）
+    """
+    M = apps.get_model(plan.model)
+    schema = plan.schema
+    qs = M.objects.filter(**plan.orm_filters())
+    key = plan.value_key
+    exprs = {key: AGGREGATES[plan.agg](plan.metric or "pk")}
+    if plan.metric:
+        exprs["n"] = Count(plan.metric)   # 参与计算的非空记录数
+    limit = max(1, min(int(limit or GROUP_LIMIT), GROUP_LIMIT))
+
+    if plan.group_by in _TRUNC:
+        tf = schema["time_field"]
+        period = F(tf) if schema.get("time_type") == "year" else _TRUNC[plan.group_by](tf)
+        rows = list(qs.annotate(period=period).values("period").annotate(**exprs).order_by("-period")[:limit])
+        rows.reverse()
+        rows = [{plan.group_by: _period(r.pop("period"), plan.group_by), **r} for r in rows]
+    elif plan.group_by:
+        # 空值（组内指标全为空）排在最后，避免“最低”排名取到空值组
+        ordering = F(key).asc(nulls_last=True) if plan.order == "asc" else F(key).desc(nulls_last=True)
+        rows = list(qs.values(plan.group_by).annotate(**exprs).order_by(ordering)[:min(limit, plan.top or limit)])
+    else:
+        rows = [qs.aggregate(**exprs)]
+
+    rows = [{k: _plain(v) for k, v in r.items()} for r in rows]
+    return {"model": plan.model, "plan": plan.describe(), "count": len(rows), "rows": rows}
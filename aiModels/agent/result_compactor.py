@@ -0,0 +1,214 @@
+"""
+aiModels.agent.result_compactor
+
+子智能体结果压缩（回填给 LLM 之前）：
+- **行集 → CSV**：data.rows / data.results 等字典列表转为表头 + CSV 行，不再逐行重复字段名
+- **常量列提出**：所有行取值相同的列只写一次，不进入 CSV
+- **Python 端统计**：数值列 count/min/max/mean、时间列 min/max、文本列取值种数与高频值，
+  基于全部行计算，行被截断时 LLM 仍能看到整体情况
+- **token 预算**：统计优先装入，其余预算按顺序装入数据行，超出部分注明省略行数；
+  长文本（网页正文等）按预算截断
+
+说明：
+- token 数用 context_packer.estimate_tokens 估算，不加载分词器
+- 失败结果只保留错误信息
+"""
+
+from __future__ import annotations
+
+import csv
+import datetime
+import io
+import json
+from collections import Counter
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiModels.qaModel.context_packer import estimate_tokens
+
+# ========== 压缩参数 ==========
+RESULT_TOKEN_BUDGET = 1500      # 单个子智能体结果的 token 预算
+PARALLEL_TOKEN_BUDGET = 2400    # 并行调用时全部结果合计的 token 预算
+MIN_RESULT_BUDGET = 400         # 并行调用时每个结果至少分到的预算
+MAX_CELL_CHARS = 120            # CSV 单元格最长字符数
+STATS_MIN_ROWS = 5              # 行数超过该值才输出统计
+TOP_VALUES = 3                  # 文本列列出的高频值个数
+MAX_DISTINCT_FOR_TOP = 50       # 取值种数超过该值的文本列不列高频值（多为名称、描述等）
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float, Decimal)) and not isinstance(v, bool)
+
+
+def _fmt(v: Any, max_chars: int = MAX_CELL_CHARS) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, float):
+        return f"{v:.6g}"
+    if isinstance(v, datetime.datetime):
+        return v.isoformat(sep=" ", timespec="seconds")
+    if isinstance(v, (datetime.date, datetime.time)):
+        return v.isoformat()
+    if isinstance(v, (dict, list)):
+        s = json.dumps(v, ensure_ascii=False, default=str)
+    else:
+        s = str(v)
+    s = " ".join(s.split())
+    return s if len(s) <= max_chars else s[:max_chars - 1] + "…"
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """按 token 预算截断文本（按比例缩短，末尾注明截断）。"""
+    text = text or ""
+    if estimate_tokens(text) <= budget:
+        return text
+    if budget <= 0:
+        return ""
+    cut = len(text)
+    while cut > 0 and estimate_tokens(text[:cut]) > budget:
+        cut = int(cut * budget / estimate_tokens(text[:cut]) * 0.95)
+    return text[:cut] + f"…（已截断，原文 {len(text)} 字）"
+
+
+def _column_stats(name: str, values: List[Any]) -> Optional[str]:
+    present = [v for v in values if v is not None and v != ""]
+    if not present:
+        return None
+    if all(_is_number(v) for v in present):
+        nums = [float(v) for v in present]
+        return (f"- {name}: n={len(nums)} min={_fmt(min(present))} max={_fmt(max(present))} "
+                f"mean={_fmt(sum(nums) / len(nums))}")
+    if all(isinstance(v, datetime.datetime) for v in present) or \
+            all(isinstance(v, datetime.date) and not isinstance(v, datetime.datetime) for v in present):
+        return f"- {name}: n={len(present)} 最早={_fmt(min(present))} 最晚={_fmt(max(present))}"
+    counter = Counter(_fmt(v) for v in present)
+    line = f"- {name}: n={len(present)} {len(counter)} 种取值"
+    if len(counter) <= MAX_DISTINCT_FOR_TOP and counter.most_common(1)[0][1] > 1:
+        top = "，".join(f"{k}×{c}" for k, c in counter.most_common(TOP_VALUES))
+        line += f"，最多：{top}"
+    return line
+
+
+def compact_rows(rows: List[Dict[str, Any]], budget: int, label: str = "rows") -> str:
+    """
+    字典列表 → 统计 + CSV。统计与常量列始终保留，数据行按预算装入。
+    """
+    if not rows:
+        return f"{label}：空（0 行）"
+    columns: List[str] = []
+    for row in rows:
+        for k in row:
+            if k not in columns:
+                columns.append(k)
+    col_values = {c: [row.get(c) for row in rows] for c in columns}
+
+    constant = [c for c in columns if len(rows) > 1 and len({_fmt(v) for v in col_values[c]}) == 1]
+    varying = [c for c in columns if c not in constant]
+
+    lines = [f"{label}：共 {len(rows)} 行，{len(columns)} 列"]
+    if constant:
+        lines.append("所有行相同：" + "，".join(f"{c}={_fmt(col_values[c][0])}" for c in constant))
+    if len(rows) > STATS_MIN_ROWS:
+        stats = [s for s in (_column_stats(c, col_values[c]) for c in varying) if s]
+        if stats:
+            lines.append(f"统计（基于全部 {len(rows)} 行）：")
+            lines.extend(stats)
+    if not varying:
+        return "\n".join(lines)
+
+    head = "\n".join(lines)
+    used = estimate_tokens(head)
+
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(varying)
+    header = buf.getvalue()
+    used += estimate_tokens(header) + 20   # 20：行数说明
+
+    body: List[str] = []
+    for row in rows:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow([_fmt(row.get(c)) for c in varying])
+        line = buf.getvalue()
+        cost = estimate_tokens(line)
+        if body and used + cost > budget:
+            break
+        body.append(line)
+        used += cost
+
+    shown = f"显示 {len(body)}/{len(rows)} 行" if len(body) < len(rows) else f"全部 {len(rows)} 行"
+    out = f"{head}\n{label}（CSV，{shown}）：\n{header}{''.join(body)}"
+    if len(body) < len(rows):
+        out += f"（其余 {len(rows) - len(body)} 行已省略，统计已包含全部行）"
+    return out.rstrip("\n")
+
+
+def _split_data(data: Dict[str, Any]) -> Tuple[List[str], List[Tuple[str, Any]]]:
+    """data 字段分为标量行与需要单独压缩的集合字段（列表 / 嵌套字典 / 长文本）。"""
+    scalars, blocks = [], []
+    for k, v in data.items():
+        if v is None:
+            continue
+        if isinstance(v, (list, dict)) or (isinstance(v, str) and len(v) > MAX_CELL_CHARS):
+            blocks.append((k, v))
+        else:
+            scalars.append(f"{k}: {_fmt(v)}")
+    return scalars, blocks
+
+
+def _compact_block(key: str, value: Any, budget: int) -> str:
+    if isinstance(value, list):
+        if not value:
+            return f"{key}：空（0 行）"
+        if all(isinstance(v, dict) for v in value):
+            return compact_rows(value, budget, label=key)
+        if key == "columns":
+            return f"{key}: {','.join(_fmt(v) for v in value)}"
+        items = "\n".join(f"- {_fmt(v, 300)}" for v in value)
+        return truncate_to_tokens(f"{key}（{len(value)} 项）：\n{items}", budget)
+    if isinstance(value, dict):
+        scalars, blocks = _split_data(value)
+        parts = [f"{key}：" + ("；".join(scalars) if scalars else "")]
+        for k, v in blocks:
+            parts.append(_compact_block(f"{key}.{k}", v, max(1, budget // max(1, len(blocks)))))
+        return truncate_to_tokens("\n".join(parts), budget)
+    return truncate_to_tokens(f"{key}：\n{value}", budget)
+
+
+def compact_result(result: Any, budget: int = RESULT_TOKEN_BUDGET) -> str:
+    """
+    子智能体结果 → 紧凑文本（供 LLM 阅读）。
+    结构：状态行 → data 中的标量字段 → 行集 / 列表 / 长文本（按权重分配剩余预算，行集优先）。
+    """
+    if not isinstance(result, dict):
+        return truncate_to_tokens(_fmt(result, 10 ** 6), budget)
+    if not result.get("success", True):
+        extra = {k: v for k, v in result.items() if k not in ("success", "error")}
+        line = f"状态：失败\nerror: {result.get('error', '未知错误')}"
+        if extra:
+            line += "\n" + "；".join(f"{k}: {_fmt(v, 200)}" for k, v in extra.items())
+        return truncate_to_tokens(line, budget)
+
+    data = result.get("data")
+    others = {k: v for k, v in result.items() if k not in ("success", "data")}
+    if not isinstance(data, dict):
+        data = {"data": data} if data is not None else {}
+    data = {**others, **data}
+
+    scalars, blocks = _split_data(data)
+    head = "状态：成功" + ("\n" + "\n".join(scalars) if scalars else "")
+    if not blocks:
+        return head
+    # 行集优先分到更多预算
+    rest = max(1, budget - estimate_tokens(head))
+    weights = [3 if isinstance(v, list) and v and isinstance(v[0], dict) else 1 for _, v in blocks]
+    parts = [head]
+    for (k, v), w in zip(blocks, weights):
+        parts.append(_compact_block(k, v, max(1, rest * w // sum(weights))))
+    return "\n".join(parts)
+
+
+def parallel_budget(n_calls: int) -> int:
+    """并行调用时每个结果的预算"""
+    return max(MIN_RESULT_BUDGET, PARALLEL_TOKEN_BUDGET // max(1, n_calls))
@@ -6,17 +6,23 @@ aiModels.agent.searchDB_agent
 - 执行SQL查询、插入、更新
 - 处理数据库连接异常
 - 返回结构化查询结果
+- 异步入口 aexecute（sync_to_async），供异步大脑智能体使用
+- auto_query 先做槽位填充（query_planner），求和/平均/计数/分组等问题编译为单条 ORM 聚合查询
 """
 
 from __future__ import annotations
 
 import json
 from typing import Any, Dict, List, Optional, Tuple
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.db import connection
 from django.apps import apps
 from django.db.models import Model
 
+from aiModels.agent.keyword_matcher import KeywordMatcher, keyword_patterns
+from aiModels.agent.query_planner import QueryPlan, execute_plan, plan_query
+
 
 class SearchDBAgent:
     """
@@ -88,6 +94,27 @@ class SearchDBAgent:
                 "time_column": getattr(settings, "SENSOR_TIME_COL", "collected_at"),
             },
         ]
+        # 规则关键词编译为自动机（规则变更后调用 reload_rules）
+        self.reload_rules()
+
+    def reload_rules(self, model_intent_rules: Optional[List[Dict[str, Any]]] = None,
+                     raw_table_rules: Optional[List[Dict[str, Any]]] = None) -> None:
+        """
+        重新编译意图规则自动机（热更新）：可传入新规则，也可直接修改
+        model_intent_rules / raw_table_rules 后调用。关键词元素可为 ("关键词", 权重)。
+        """
+        if model_intent_rules is not None:
+            self.model_intent_rules = list(model_intent_rules)
+        if raw_table_rules is not None:
+            self.raw_table_rules = list(raw_table_rules)
+        # 规则按匹配优先级排列：先原生表再Django模型
+        rules = [(("raw", i), rule) for i, rule in enumerate(self.raw_table_rules)] + \
+                [(("model", i), rule) for i, rule in enumerate(self.model_intent_rules)]
+        patterns = []
+        for label, rule in rules:
+            patterns += keyword_patterns(rule.get("keywords", []), label)
+        # 自动机与规则快照一起替换，并发查询不会看到不一致的状态
+        self._rule_matcher = (KeywordMatcher(patterns), rules)
 
     def execute(self, task: str, **kwargs) -> Dict[str, Any]:
         """
@@ -138,6 +165,13 @@ class SearchDBAgent:
                 'task': task
             }
 
+    async def aexecute(self, task: str, **kwargs) -> Dict[str, Any]:
+        """
+        异步执行数据库任务（参数与返回值同 execute）。
+        ORM 与原生 SQL 均为同步调用，经 sync_to_async 在 Django 的数据库线程中执行，不阻塞事件循环。
+        """
+        return await sync_to_async(self.execute)(task, **kwargs)
+
     def _list_models(self) -> Dict[str, Any]:
         """列出可用的数据模型"""
         models_list = []
@@ -392,7 +426,6 @@ class SearchDBAgent:
             (model_name 或 None, table_name 或 None, 解释信息字典)
         """
         q = (question or "").strip()
-        q_lower = q.lower()
         if not q:
             return None, None, {
                 "reason": "问题为空，无法判断模型",
@@ -403,48 +436,29 @@ class SearchDBAgent:
         best_table: Optional[str] = None
         best_score = 0
         matched_info: Dict[str, Any] = {}
-        is_raw_table = False
-
-        # 先检查原生表
-        for rule in self.raw_table_rules:
-            table = rule["table"]
-            keywords: List[str] = rule.get("keywords", [])
-            score = 0
-            matched: List[str] = []
-            for kw in keywords:
-                if kw.lower() in q_lower:
-                    score += 1
-                    matched.append(kw)
-            if score > best_score and matched:
-                best_score = score
-                best_table = table
-                best_model = None
-                is_raw_table = True
+
+        # 一次扫描得到全部规则的命中；先原生表再Django模型，得分更高才替换（同分取先出现的规则）
+        matcher, rules = self._rule_matcher
+        hits = matcher.match(q)
+        for label, rule in rules:
+            matched = hits.keywords(label)
+            score = hits.score(label)
+            if not matched or score <= best_score:
+                continue
+            best_score = score
+            if label[0] == "raw":
+                best_table, best_model = rule["table"], None
                 matched_info = {
-                    "table": table,
+                    "table": rule["table"],
                     "description": rule.get("description", ""),
                     "matched_keywords": matched,
                     "score": score,
                     "time_column": rule.get("time_column", "collected_at"),
                 }
-
-        # 再检查Django模型
-        for rule in self.model_intent_rules:
-            model = rule["model"]
-            keywords: List[str] = rule.get("keywords", [])
-            score = 0
-            matched: List[str] = []
-            for kw in keywords:
-                if kw.lower() in q_lower:
-                    score += 1
-                    matched.append(kw)
-            if score > best_score and matched:
-                best_score = score
-                best_model = model
-                best_table = None
-                is_raw_table = False
+            else:
+                best_model, best_table = rule["model"], None
                 matched_info = {
-                    "model": model,
+                    "model": rule["model"],
                     "description": rule.get("description", ""),
                     "matched_keywords": matched,
                     "score": score,
@@ -487,8 +501,14 @@ class SearchDBAgent:
                 },
             }
 
+        # 槽位填充：聚合 / 分组 / 时间范围 / 过滤条件
+        plan = plan_query(question or "", model_name, table_name)
+        query_res = self._query_plan(plan, limit) if plan and plan.is_aggregate else None
+        if query_res is not None:
+            # 聚合查询由数据库完成，原生表命中时改用对应模型
+            model_name, table_name = plan.model, None
         # 如果是原生表，使用原生SQL查询
-        if table_name:
+        elif table_name:
             print(f"[SearchDBAgent] 匹配到原生表：{table_name}，意图：{info.get('description')}")
             query_res = self._query_raw_table(
                 table_name=table_name,
@@ -497,14 +517,25 @@ class SearchDBAgent:
             )
         else:
             print(f"[SearchDBAgent] 匹配到模型：{model_name}，意图：{info.get('description')}")
-            # 使用Django ORM查询
+            # 使用Django ORM查询；识别出过滤条件或时间范围时带上条件，按时间倒序
+            filters = plan.orm_filters() if plan else {}
+            order_by = [f"-{plan.schema['time_field']}"] if plan and plan.time_range else None
             query_res = self._query_model(
                 model_name=model_name,
-                filters=None,
+                filters=filters or None,
                 values=values,
                 limit=limit,
-                order_by=None,
+                order_by=order_by,
             )
+            if not query_res.get("success", False) and (filters or order_by):
+                print(f"[SearchDBAgent] 带条件查询失败，改为不带条件查询：{query_res.get('error')}")
+                query_res = self._query_model(
+                    model_name=model_name,
+                    filters=None,
+                    values=values,
+                    limit=limit,
+                    order_by=None,
+                )
 
         # 打印查询结果
         if query_res.get("success", False):
@@ -512,7 +543,7 @@ class SearchDBAgent:
             count = data.get("count", 0)
             print(f"[SearchDBAgent] 查询成功，返回 {count} 条记录")
             if count > 0:
-                print(f"[SearchDBAgent] 前3条数据示例：{json.dumps(data.get('rows', [])[:3], ensure_ascii=False)}")
+                print(f"[SearchDBAgent] 前3条数据示例：{json.dumps(data.get('rows', [])[:3], ensure_ascii=False, default=str)}")
         else:
             print(f"[SearchDBAgent] 查询失败：{query_res.get('error')}")
 
@@ -537,9 +568,27 @@ class SearchDBAgent:
             result["data"]["model"] = data.get("model", model_name)
         if table_name:
             result["data"]["table"] = table_name
+        if "plan" in data:
+            result["data"]["aggregate"] = True
+            result["data"]["plan"] = data["plan"]
+        elif plan and plan.unapplied:
+            # 问题中的条件该模型无法过滤：明确告知结果未按这些条件筛选
+            result["data"]["unapplied_filters"] = plan.unapplied
+            result["data"]["note"] = "以下条件无法在该数据上筛选，结果未按其过滤：" + "，".join(plan.unapplied.values())
             
         return result
 
+    def _query_plan(self, plan: QueryPlan, limit: int) -> Optional[Dict[str, Any]]:
+        """执行聚合查询计划（单条 ORM 聚合查询）；失败返回 None，由调用方改为明细查询"""
+        print(f"[SearchDBAgent] 聚合查询计划：{json.dumps(plan.describe(), ensure_ascii=False)}")
+        try:
+            data = execute_plan(plan, limit)
+        except Exception as e:
+            print(f"[SearchDBAgent] 聚合查询失败，改为明细查询：{type(e).__name__}: {str(e)}")
+            return None
+        data["limit"] = limit
+        return {"success": True, "data": data}
+
     def _query_raw_table(
         self,
         table_name: str,
@@ -0,0 +1,220 @@
+"""
+aiModels.agent.semantic_router
+
+语义路由（向量 kNN 分类）：
+- 每个去向（searchDB_agent / spider_agent / 直接回答）配置若干示例问题，用 RAG 的向量模型编码后
+  放入一个很小的 FAISS 内积索引
+- 新问题编码后取最相近的 SEMANTIC_TOP_K 个示例，按相似度加权投票；
+  最高相似度与得票占比都超过阈值才采用，否则返回 None，由 LLM 路由兜底
+- 只在关键词路由不确定时使用：关键词路由高置信命中的问题不做语义分类
+- 查询向量复用 RAG.encode_query 的 LRU 缓存；示例索引在后台线程首次构建，构建完成前直接返回 None
+
+说明：
+- 示例问题变更后调用 reload() 重建（构建完成后整体替换索引）
+- `/aiModels/semantic_router_stats` 查看命中分布、兜底次数与分类耗时
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+# ========== 路由参数 ==========
+USE_SEMANTIC_ROUTER = True
+SEMANTIC_TOP_K = 5              # 参与投票的近邻示例数
+MIN_ROUTE_SIMILARITY = 0.55     # 最近示例的余弦相似度下限
+MIN_ROUTE_CONFIDENCE = 0.6      # 得票占比下限
+
+DIRECT_ANSWER = "direct"        # 不调用子智能体，直接回答
+
+# 去向 → 示例问题
+ROUTE_EXAMPLES: Dict[str, List[str]] = {
+    "searchDB_agent": [
+        "湖北基地最近7天冷库的平均温度是多少",
+        "查询所有基地的位置信息",
+        "今年各地区柑橘产量是多少",
+        "历年柑橘总产量变化情况",
+        "冷库里现在有哪些设备在线",
+        "最近有没有未处理的告警",
+        "按月统计广西的柑橘产量",
+        "设备C001最近上报的湿度数据",
+        "哪个品种的柑橘产量最高",
+        "2023年全国柑橘年产量",
+        "有多少台传感器处于离线状态",
+        "查看二氧化碳浓度超标的记录",
+        "列出数据库里所有的表",
+        "基地HB001的设备列表",
+    ],
+    "spider_agent": [
+        "搜索一下最新的柑橘价格行情",
+        "网上有哪些关于柑橘黄龙病的新闻",
+        "帮我查一下今年柑橘出口政策的最新消息",
+        "抓取这个网页的内容 https://example.com",
+        "最近冷链物流行业有什么新动态",
+        "搜索赣南脐橙的市场报道",
+        "网上关于柑橘保鲜技术的最新文章",
+        "提取这个链接里的正文",
+        "查一下今天的天气预报",
+        "搜索农业农村部最近发布的通知",
+        "现在砂糖橘的批发价是多少",
+        "百度一下柑橘电商销售的数据报告",
+    ],
+    DIRECT_ANSWER: [
+        "你好",
+        "你是谁",
+        "你能做什么",
+        "谢谢你的帮助",
+        "柑橘适合在什么气候条件下种植",
+        "冷库保鲜的原理是什么",
+        "解释一下什么是物联网",
+        "帮我写一段柑橘产品的宣传文案",
+        "把这句话翻译成英文：柑橘很甜",
+        "温度和湿度对水果储存有什么影响",
+        "什么是冷链物流",
+        "给我讲个笑话",
+    ],
+}
+
+
+class SemanticRouter:
+    def __init__(self, examples: Optional[Dict[str, List[str]]] = None, top_k: int = SEMANTIC_TOP_K,
+                 min_similarity: float = MIN_ROUTE_SIMILARITY,
+                 min_confidence: float = MIN_ROUTE_CONFIDENCE) -> None:
+        self.examples = dict(examples or ROUTE_EXAMPLES)
+        self.top_k = top_k
+        self.min_similarity = min_similarity
+        self.min_confidence = min_confidence
+        self._index = None            # (faiss 索引, 各示例的去向)
+        self._building = False
+        self._lock = threading.Lock()
+        self.routed: Dict[str, int] = {}
+        self.fallbacks = 0
+        self.not_ready = 0
+        self._classify_total = 0.0
+        self._classified = 0
+
+    # ---------- 索引 ----------
+
+    def _build(self, examples: Dict[str, List[str]]) -> None:
+        import faiss
+        from aiModels.qaModel import RAG
+
+        try:
+            labels = [label for label, texts in examples.items() for _ in texts]
+            texts = [t for texts in examples.values() for t in texts]
+            vectors = RAG.get_embedder().encode(texts, convert_to_numpy=True, normalize_embeddings=True,
+                                                show_progress_bar=False)
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            index = faiss.IndexFlatIP(vectors.shape[1])
+            index.add(vectors)
+            self._index = (index, labels)
+            print(f"[SemanticRouter] 示例索引构建完成：{len(texts)} 条示例，{len(examples)} 个去向")
+        except Exception as e:
+            print(f"[SemanticRouter] 示例索引构建失败，改用关键词路由: {type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self._building = False
+
+    def _start_build(self, examples: Dict[str, List[str]]) -> None:
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._build, args=(examples,), name="semantic-router-build", daemon=True).start()
+
+    def reload(self, examples: Optional[Dict[str, List[str]]] = None, wait: bool = False) -> None:
+        """重建示例索引（热更新）；旧索引在新索引构建完成前继续使用。wait=True 时同步构建。"""
+        if examples is not None:
+            self.examples = dict(examples)
+        if wait:
+            self._build(self.examples)
+        else:
+            self._start_build(self.examples)
+
+    @property
+    def ready(self) -> bool:
+        return self._index is not None
+
+    # ---------- 分类 ----------
+
+    def classify(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        返回 {"label", "confidence", "similarity", "neighbors"}；
+        索引未就绪或置信度不足时返回 None（由调用方兜底）。
+        """
+        snapshot = self._index
+        if snapshot is None:
+            self.not_ready += 1
+            if not self._building:
+                self._start_build(self.examples)
+            return None
+
+        from aiModels.qaModel import RAG
+
+        t0 = time.perf_counter()
+        index, labels = snapshot
+        sims, ids = index.search(RAG.encode_query(question), min(self.top_k, index.ntotal))
+        votes: Dict[str, float] = {}
+        neighbors = []
+        for sim, i in zip(sims[0].tolist(), ids[0].tolist()):
+            if i < 0:
+                continue
+            neighbors.append({"label": labels[i], "similarity": round(sim, 4)})
+            votes[labels[i]] = votes.get(labels[i], 0.0) + max(sim, 0.0)
+        elapsed = time.perf_counter() - t0
+
+        total = sum(votes.values())
+        best = max(votes, key=votes.get) if votes else None
+        confidence = votes[best] / total if best and total > 0 else 0.0
+        similarity = neighbors[0]["similarity"] if neighbors else 0.0
+
+        with self._lock:
+            self._classify_total += elapsed
+            self._classified += 1
+            if best is None or similarity < self.min_similarity or confidence < self.min_confidence:
+                self.fallbacks += 1
+                return None
+            self.routed[best] = self.routed.get(best, 0) + 1
+        return {
+            "label": best,
+            "confidence": round(confidence, 4),
+            "similarity": similarity,
+            "neighbors": neighbors,
+            "elapsed_ms": round(elapsed * 1000, 3),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "examples": sum(len(v) for v in self.examples.values()),
+                "routed": dict(self.routed),
+                "fallbacks": self.fallbacks,
+                "not_ready": self.not_ready,
+                "avg_classify_ms": round(self._classify_total / self._classified * 1000, 3) if self._classified else 0.0,
+            }
+
+
+# 创建全局实例
+_semantic_router = None
+_semantic_router_lock = threading.Lock()
+
+
+def get_semantic_router() -> SemanticRouter:
+    """获取语义路由单例（示例索引在首次分类时后台构建）"""
+    global _semantic_router
+    with _semantic_router_lock:
+        if _semantic_router is None:
+            _semantic_router = SemanticRouter()
+        return _semantic_router
+
+
+@require_GET
+def semantic_router_stats_view(request):
+    """GET /aiModels/semantic_router_stats：查看语义路由命中分布与兜底次数"""
+    return JsonResponse({"success": True, "semantic_router": get_semantic_router().stats()})
@@ -6,17 +6,87 @@ aiModels.agent.spider_agent
 - 解析网页内容或使用API
 - 提取关键信息并格式化
 - 支持多种搜索引擎
+- 提供异步入口 aexecute（httpx.AsyncClient），供异步大脑智能体使用；解析逻辑与同步版本共用
+- 同步请求共用一个 requests.Session（连接池复用 TCP/TLS 连接）
+- engine='all'：同时查询百度与 DuckDuckGo，按 URL 合并去重（RRF 排序），超过全局时限的引擎结果丢弃
+- fetch_top=N：并行抓取前 N 个结果页面正文附在结果中；同一主机限制并发数，整批共享一个时限
+- fetch / extract 的页面经 http_cache 持久化缓存：新鲜期内不发请求，过期后条件请求复验，解析结果一并缓存
 """
 
 from __future__ import annotations
 
+import asyncio
 import json
 import re
-from typing import Any, Dict, List, Optional
-from urllib.parse import quote, urljoin, urlparse
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, quote, urljoin, urlparse
 
+import httpx
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+from aiModels.agent.http_cache import USE_HTTP_CACHE, HttpCache, get_http_cache
+
+# ========== 搜索 / 抓取参数 ==========
+SEARCH_ENGINES = {
+    'baidu': 'https://www.baidu.com/s?wd={query}',
+    'duckduckgo': 'https://html.duckduckgo.com/html/?q={query}',
+}
+ENGINE_LABELS = {'baidu': '百度', 'duckduckgo': 'DuckDuckGo'}
+DEFAULT_SEARCH_ENGINE = 'all'   # all：同时查询全部搜索引擎，合并去重
+SEARCH_DEADLINE = 6.0           # 多引擎搜索的全局时限（秒），超时的引擎结果丢弃
+FETCH_DEADLINE = 8.0            # 并行抓取结果页面的全局时限（秒）
+PAGE_TEXT_CHARS = 1500          # 随搜索结果附带的页面正文长度
+PER_HOST_LIMIT = 2              # 同一主机的最大并发请求数
+POOL_MAXSIZE = 16               # requests 连接池每个主机保留的连接数
+SPIDER_WORKERS = 8              # 同步并发请求使用的共享线程池大小
+RRF_K = 60                      # 合并多引擎结果的 RRF 常数
+
+# 同步路径并发请求使用的共享线程池
+_http_pool = ThreadPoolExecutor(max_workers=SPIDER_WORKERS, thread_name_prefix="spider-http")
+
+
+def _normalize_url(url: str) -> str:
+    """去重用的 URL 归一化：忽略协议、www.、末尾斜杠、片段与 utm_* 参数"""
+    p = urlparse((url or '').strip())
+    host = p.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    query = '&'.join(kv for kv in p.query.split('&') if kv and not kv.lower().startswith('utm_'))
+    return host + p.path.rstrip('/') + (f'?{query}' if query else '')
+
+
+def _ddg_target(href: str) -> str:
+    """DuckDuckGo 跳转链接（//duckduckgo.com/l/?uddg=...）还原为真实地址"""
+    p = urlparse(href)
+    if p.path.startswith('/l/'):
+        target = parse_qs(p.query).get('uddg')
+        if target:
+            return target[0]
+    if href.startswith('//'):
+        return 'https:' + href
+    return href
+
+
+async def _gather_until(coros: List[Any], deadline: float,
+                        on_timeout: Callable[[int], Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """并发执行协程，deadline（time.monotonic）时仍未完成的取消，并以 on_timeout(序号) 代替结果"""
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    if tasks:
+        await asyncio.wait(tasks, timeout=max(0.0, deadline - time.monotonic()))
+    results = []
+    for i, task in enumerate(tasks):
+        if task.done() and not task.cancelled():
+            results.append(task.result())
+        else:
+            task.cancel()
+            results.append(on_timeout(i))
+    return results
 
 
 class SpiderAgent:
@@ -24,12 +94,27 @@ class SpiderAgent:
     网页爬虫智能体：支持网页抓取和搜索引擎API
     """
 
-    def __init__(self, timeout: int = 10):
+    def __init__(self, timeout: int = 10, http_cache: Optional[HttpCache] = None):
         """初始化爬虫智能体"""
         self.timeout = timeout
+        # 页面响应缓存（fetch / extract 使用）
+        self.http_cache = http_cache if http_cache is not None else (get_http_cache() if USE_HTTP_CACHE else None)
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        self.engines = dict(SEARCH_ENGINES)
+        # 同步请求共用的会话（连接池）
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=POOL_MAXSIZE, pool_maxsize=POOL_MAXSIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # 每个主机的并发名额
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_lock = threading.Lock()
+        # 异步客户端与主机并发名额按事件循环缓存（aexecute 使用）
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self._async_host_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
 
     def execute(self, task: str, **kwargs) -> Dict[str, Any]:
         """
@@ -62,41 +147,169 @@ class SpiderAgent:
                 'task': task
             }
 
-    def _web_search(self, query: str, engine: str = 'baidu', max_results: int = 5) -> Dict[str, Any]:
+    def _web_search(self, query: str, engine: str = DEFAULT_SEARCH_ENGINE, max_results: int = 5,
+                    fetch_top: int = 0) -> Dict[str, Any]:
         """
         网络搜索
         
         Args:
             query: 搜索关键词
-            engine: 搜索引擎（默认baidu，也支持duckduckgo）
+            engine: 搜索引擎（默认all：同时查询百度和DuckDuckGo并合并去重；也可指定baidu或duckduckgo）
             max_results: 最大结果数
+            fetch_top: 并行抓取前N个结果页面的正文（默认0不抓取）
         """
         try:
-            if engine == 'baidu':
-                return self._baidu_search(query, max_results)
-            elif engine == 'duckduckgo':
-                return self._duckduckgo_search(query, max_results)
+            if engine == 'all':
+                result = self._multi_search(query, max_results)
+            elif engine in self.engines:
+                result = self._engine_search(engine, query, max_results)
             else:
                 return {
                     'success': False,
-                    'error': f'不支持的搜索引擎: {engine}，支持: baidu, duckduckgo'
+                    'error': f'不支持的搜索引擎: {engine}，支持: all, {", ".join(self.engines)}'
                 }
+            if fetch_top and result.get('success'):
+                self._attach_pages(result['data']['results'][:int(fetch_top)])
+            return result
         except Exception as e:
             return {
                 'success': False,
                 'error': f'搜索失败: {type(e).__name__}: {str(e)}'
             }
 
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc.lower()
+        with self._host_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(PER_HOST_LIMIT)
+            return slot
+
+    def _get(self, url: str, deadline: Optional[float] = None,
+             headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """经连接池发起 GET；同一主机限制并发数，deadline（time.monotonic）用于收紧超时"""
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                raise requests.exceptions.Timeout(f'超过时限: {url}')
+        slot = self._host_slot(url)
+        if not slot.acquire(timeout=timeout):
+            raise requests.exceptions.Timeout(f'等待主机并发名额超时: {url}')
+        try:
+            if deadline is not None:
+                timeout = max(0.1, min(timeout, deadline - time.monotonic()))
+            response = self.session.get(url, timeout=timeout, headers=headers)
+            response.raise_for_status()
+            return response
+        finally:
+            slot.release()
+
+    def _engine_search(self, engine: str, query: str, max_results: int = 5,
+                       deadline: Optional[float] = None) -> Dict[str, Any]:
+        """查询单个搜索引擎并解析结果页"""
+        parsers = {'baidu': self._parse_baidu, 'duckduckgo': self._parse_duckduckgo}
+        try:
+            response = self._get(self.engines[engine].format(query=quote(query)), deadline)
+            response.encoding = 'utf-8'  # 确保正确编码
+            return parsers[engine](query, response.text, max_results)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'{ENGINE_LABELS.get(engine, engine)}搜索失败: {type(e).__name__}: {str(e)}'
+            }
+
+    def _multi_search(self, query: str, max_results: int = 5) -> Dict[str, Any]:
+        """同时查询全部搜索引擎，超过 SEARCH_DEADLINE 仍未返回的引擎结果丢弃"""
+        started = time.monotonic()
+        deadline = started + SEARCH_DEADLINE
+        futures = {name: _http_pool.submit(self._engine_search, name, query, max_results, deadline)
+                   for name in self.engines}
+        done, _ = wait(futures.values(), timeout=max(0.0, deadline - time.monotonic()))
+        per_engine = {}
+        for name, future in futures.items():
+            if future in done:
+                per_engine[name] = future.result()
+            else:
+                future.cancel()
+                per_engine[name] = {'success': False, 'error': f'超过搜索时限 {SEARCH_DEADLINE}s'}
+        return self._merge_results(query, per_engine, max_results, time.monotonic() - started)
+
+    @staticmethod
+    def _merge_results(query: str, per_engine: Dict[str, Dict[str, Any]], max_results: int,
+                       elapsed: float) -> Dict[str, Any]:
+        """按 URL 合并多个引擎的结果：同一 URL 只保留一条，按 RRF（Σ 1/(K+名次)）排序"""
+        merged: Dict[str, Dict[str, Any]] = {}
+        scores: Dict[str, float] = {}
+        engines_info = {}
+        for name, res in per_engine.items():
+            if not res.get('success'):
+                engines_info[name] = {'error': res.get('error', '')}
+                continue
+            items = res['data'].get('results', [])
+            engines_info[name] = {'count': len(items)}
+            for rank, item in enumerate(items):
+                key = _normalize_url(item.get('url', '')) or f'{name}#{rank}'
+                if key not in merged:
+                    merged[key] = {**item, 'engines': []}
+                elif not merged[key].get('snippet') and item.get('snippet'):
+                    merged[key]['snippet'] = item['snippet']
+                merged[key]['engines'].append(name)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+
+        if not any('count' in info for info in engines_info.values()):
+            return {
+                'success': False,
+                'error': '全部搜索引擎失败：' + '；'.join(info['error'] for info in engines_info.values())
+            }
+        results = [merged[k] for k in sorted(merged, key=lambda k: -scores[k])][:max_results]
+        return {
+            'success': True,
+            'data': {
+                'query': query,
+                'engine': 'all',
+                'engines': engines_info,
+                'count': len(results),
+                'results': results,
+                'elapsed_ms': round(elapsed * 1000, 1)
+            }
+        }
+
+    def _fetch_many(self, urls: List[str], extract_text: bool = True,
+                    deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+        """并行抓取多个页面（同一主机限制并发数），整批共享 deadline；结果与 urls 顺序一致"""
+        deadline = deadline or time.monotonic() + FETCH_DEADLINE
+        futures = [_http_pool.submit(self._fetch_page, url, extract_text, deadline) for url in urls]
+        done, _ = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        results = []
+        for url, future in zip(urls, futures):
+            if future in done:
+                results.append(future.result())
+            else:
+                future.cancel()
+                results.append({'success': False, 'error': f'超过抓取时限 {FETCH_DEADLINE}s: {url}'})
+        return results
+
+    @staticmethod
+    def _page_summary(page: Dict[str, Any]) -> Dict[str, Any]:
+        if not page.get('success'):
+            return {'error': page.get('error', '')}
+        return {'title': page['data'].get('title', ''), 'text': (page['data'].get('text') or '')[:PAGE_TEXT_CHARS]}
+
+    def _attach_pages(self, results: List[Dict[str, Any]]) -> None:
+        """并行抓取搜索结果页面，正文摘要写入各结果的 page 字段"""
+        targets = [r for r in results if str(r.get('url', '')).startswith(('http://', 'https://'))]
+        for r, page in zip(targets, self._fetch_many([r['url'] for r in targets])):
+            r['page'] = self._page_summary(page)
+
     def _duckduckgo_search(self, query: str, max_results: int = 5) -> Dict[str, Any]:
         """使用DuckDuckGo搜索（无需API密钥）"""
+        return self._engine_search('duckduckgo', query, max_results)
+
+    def _parse_duckduckgo(self, query: str, html: str, max_results: int) -> Dict[str, Any]:
+        """解析DuckDuckGo HTML搜索结果页"""
         try:
-            # DuckDuckGo HTML搜索
-            search_url = f"https://html.duckduckgo.com/html/?q={quote(query)}"
-            
-            response = requests.get(search_url, headers=self.headers, timeout=self.timeout)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = BeautifulSoup(html, 'html.parser')
             results = []
             
             # 解析搜索结果
@@ -108,7 +321,7 @@ class SpiderAgent:
                 
                 if title_elem:
                     title = title_elem.get_text(strip=True)
-                    url = title_elem.get('href', '')
+                    url = _ddg_target(title_elem.get('href', ''))
                     snippet = snippet_elem.get_text(strip=True) if snippet_elem else ''
                     
                     results.append({
@@ -134,14 +347,12 @@ class SpiderAgent:
 
     def _baidu_search(self, query: str, max_results: int = 5) -> Dict[str, Any]:
         """使用百度搜索"""
+        return self._engine_search('baidu', query, max_results)
+
+    def _parse_baidu(self, query: str, html: str, max_results: int) -> Dict[str, Any]:
+        """解析百度搜索结果页"""
         try:
-            search_url = f"https://www.baidu.com/s?wd={quote(query)}"
-            
-            response = requests.get(search_url, headers=self.headers, timeout=self.timeout)
-            response.raise_for_status()
-            response.encoding = 'utf-8'  # 确保正确编码
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = BeautifulSoup(html, 'html.parser')
             results = []
             
             # 百度搜索结果的主要容器选择器（多种尝试）
@@ -246,19 +457,81 @@ class SpiderAgent:
             url: 网页URL
             extract_text: 是否提取纯文本
         """
+        return self._fetch_page(url, extract_text)
+
+    def _cached_get(self, url: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        带缓存的页面请求，返回 {status, content_type, text, cache}：
+        新鲜期内直接用缓存；过期则条件请求复验（304 沿用缓存正文）；网络失败时有缓存则返回过期内容
+        """
+        cache = self.http_cache
+        if cache is None:
+            response = self._get(url, deadline)
+            return {'status': response.status_code, 'content_type': response.headers.get('Content-Type', ''),
+                    'text': response.text, 'cache': None}
+        entry = cache.lookup(url)
+        if entry and cache.is_fresh(entry):
+            cache.mark_hit()
+            return self._cached_page(entry, 'hit')
+        try:
+            response = self._get(url, deadline, headers=cache.conditional_headers(entry))
+        except requests.exceptions.RequestException:
+            if entry is None:
+                raise
+            cache.mark_stale()
+            return self._cached_page(entry, 'stale')
+        if response.status_code == 304 and entry:
+            return self._cached_page(cache.mark_revalidated(entry, response.headers), 'revalidated')
+        entry = cache.store(url, response.status_code, response.headers, response.content,
+                            response.encoding or response.apparent_encoding)
+        return self._cached_page(entry, 'downloaded')
+
+    def _cached_page(self, entry: Dict[str, Any], state: str) -> Dict[str, Any]:
+        return {'status': entry['status'], 'content_type': entry['content_type'],
+                'text': self.http_cache.text(entry), 'cache': state}
+
+    def _parse_cached(self, url: str, kind: str, page: Dict[str, Any],
+                      parse: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """解析结果缓存：页面正文取自缓存（hit / revalidated / stale）时直接返回上次的解析结果；新下载的正文总是重新解析"""
+        cache = self.http_cache
+        if page['cache'] in ('hit', 'revalidated', 'stale'):
+            cached = cache.get_extraction(url, kind)
+            if cached is not None:
+                return cached
+        result = parse()
+        if page['cache'] is not None and result.get('success'):
+            cache.put_extraction(url, kind, result)
+        return result
+
+    def _fetch_page(self, url: str, extract_text: bool = True, deadline: Optional[float] = None) -> Dict[str, Any]:
+        try:
+            page = self._cached_get(url, deadline)
+            return self._parse_cached(url, f'page:{int(bool(extract_text))}', page, lambda: self._parse_page(
+                url, page['status'], page['content_type'], page['text'], extract_text))
+        except requests.exceptions.Timeout:
+            return {
+                'success': False,
+                'error': f'请求超时: {url}'
+            }
+        except requests.exceptions.RequestException as e:
+            return {
+                'success': False,
+                'error': f'请求失败: {type(e).__name__}: {str(e)}'
+            }
+
+    def _parse_page(self, url: str, status_code: int, content_type: str,
+                    html: str, extract_text: bool) -> Dict[str, Any]:
+        """整理网页内容（可选提取纯文本与标题）"""
         try:
-            response = requests.get(url, headers=self.headers, timeout=self.timeout)
-            response.raise_for_status()
-            
             result = {
                 'url': url,
-                'status_code': response.status_code,
-                'content_type': response.headers.get('Content-Type', ''),
-                'html': response.text if not extract_text else None
+                'status_code': status_code,
+                'content_type': content_type,
+                'html': html if not extract_text else None
             }
             
             if extract_text:
-                soup = BeautifulSoup(response.text, 'html.parser')
+                soup = BeautifulSoup(html, 'html.parser')
                 # 移除script和style标签
                 for script in soup(["script", "style"]):
                     script.decompose()
@@ -274,16 +547,6 @@ class SpiderAgent:
                 'success': True,
                 'data': result
             }
-        except requests.exceptions.Timeout:
-            return {
-                'success': False,
-                'error': f'请求超时: {url}'
-            }
-        except requests.exceptions.RequestException as e:
-            return {
-                'success': False,
-                'error': f'请求失败: {type(e).__name__}: {str(e)}'
-            }
         except Exception as e:
             return {
                 'success': False,
@@ -299,10 +562,23 @@ class SpiderAgent:
             selectors: CSS选择器字典，例如 {'title': 'h1', 'content': '.article-content'}
         """
         try:
-            response = requests.get(url, headers=self.headers, timeout=self.timeout)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
+            page = self._cached_get(url)
+            return self._parse_cached(url, self._extract_kind(selectors), page,
+                                      lambda: self._parse_extracted(url, page['text'], selectors))
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'内容提取失败: {type(e).__name__}: {str(e)}'
+            }
+
+    @staticmethod
+    def _extract_kind(selectors: Optional[Dict[str, str]]) -> str:
+        return 'extract:' + json.dumps(selectors or {}, ensure_ascii=False, sort_keys=True)
+
+    def _parse_extracted(self, url: str, html: str, selectors: Optional[Dict[str, str]]) -> Dict[str, Any]:
+        """按CSS选择器（或默认规则）提取网页内容"""
+        try:
+            soup = BeautifulSoup(html, 'html.parser')
             extracted = {}
             
             if selectors:
@@ -334,6 +610,180 @@ class SpiderAgent:
             }
 
 
+    # ---------------------- 异步版本（httpx.AsyncClient） ----------------------
+
+    def _aclient(self) -> httpx.AsyncClient:
+        """当前事件循环共享的异步HTTP客户端（连接池不能跨事件循环使用）"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = httpx.AsyncClient(
+                headers=self.headers, timeout=self.timeout, follow_redirects=True
+            )
+        return client
+
+    async def aexecute(self, task: str, **kwargs) -> Dict[str, Any]:
+        """异步执行爬虫任务（参数与返回值同 execute），等待网络时不占用线程"""
+        try:
+            if task == 'search':
+                return await self._aweb_search(**kwargs)
+            elif task == 'fetch':
+                return await self._afetch_url(**kwargs)
+            elif task == 'extract':
+                return await self._aextract_content(**kwargs)
+            else:
+                return {
+                    'success': False,
+                    'error': f'未知任务类型: {task}',
+                    'available_tasks': ['search', 'fetch', 'extract']
+                }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'{type(e).__name__}: {str(e)}',
+                'task': task
+            }
+
+    async def _aweb_search(self, query: str, engine: str = DEFAULT_SEARCH_ENGINE, max_results: int = 5,
+                           fetch_top: int = 0) -> Dict[str, Any]:
+        if engine == 'all':
+            result = await self._amulti_search(query, max_results)
+        elif engine in self.engines:
+            result = await self._aengine_search(engine, query, max_results)
+        else:
+            return {
+                'success': False,
+                'error': f'不支持的搜索引擎: {engine}，支持: all, {", ".join(self.engines)}'
+            }
+        if fetch_top and result.get('success'):
+            await self._aattach_pages(result['data']['results'][:int(fetch_top)])
+        return result
+
+    def _ahost_slot(self, url: str) -> asyncio.Semaphore:
+        slots = self._async_host_slots.setdefault(asyncio.get_running_loop(), {})
+        host = urlparse(url).netloc.lower()
+        if host not in slots:
+            slots[host] = asyncio.Semaphore(PER_HOST_LIMIT)
+        return slots[host]
+
+    async def _aget(self, url: str, deadline: Optional[float] = None,
+                    headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                raise httpx.TimeoutException(f'超过时限: {url}')
+
+        async def _request() -> httpx.Response:
+            async with self._ahost_slot(url):
+                return await self._aclient().get(url, timeout=timeout, headers=headers)
+
+        try:
+            # 等待主机并发名额的时间也计入超时
+            response = await asyncio.wait_for(_request(), timeout)
+        except asyncio.TimeoutError:
+            raise httpx.TimeoutException(f'请求超时: {url}')
+        if response.status_code != 304:  # httpx 对 3xx 也会抛异常，304 留给缓存复验处理
+            response.raise_for_status()
+        return response
+
+    async def _aengine_search(self, engine: str, query: str, max_results: int = 5,
+                              deadline: Optional[float] = None) -> Dict[str, Any]:
+        parsers = {'baidu': self._parse_baidu, 'duckduckgo': self._parse_duckduckgo}
+        try:
+            response = await self._aget(self.engines[engine].format(query=quote(query)), deadline)
+            response.encoding = 'utf-8'  # 确保正确编码
+            return parsers[engine](query, response.text, max_results)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'{ENGINE_LABELS.get(engine, engine)}搜索失败: {type(e).__name__}: {str(e)}'
+            }
+
+    async def _amulti_search(self, query: str, max_results: int = 5) -> Dict[str, Any]:
+        started = time.monotonic()
+        deadline = started + SEARCH_DEADLINE
+        results = await _gather_until(
+            [self._aengine_search(name, query, max_results, deadline) for name in self.engines],
+            deadline, lambda i: {'success': False, 'error': f'超过搜索时限 {SEARCH_DEADLINE}s'})
+        return self._merge_results(query, dict(zip(self.engines, results)), max_results, time.monotonic() - started)
+
+    async def _afetch_many(self, urls: List[str], extract_text: bool = True) -> List[Dict[str, Any]]:
+        deadline = time.monotonic() + FETCH_DEADLINE
+        return await _gather_until(
+            [self._afetch_page(url, extract_text, deadline) for url in urls],
+            deadline, lambda i: {'success': False, 'error': f'超过抓取时限 {FETCH_DEADLINE}s: {urls[i]}'})
+
+    async def _aattach_pages(self, results: List[Dict[str, Any]]) -> None:
+        targets = [r for r in results if str(r.get('url', '')).startswith(('http://', 'https://'))]
+        for r, page in zip(targets, await self._afetch_many([r['url'] for r in targets])):
+            r['page'] = self._page_summary(page)
+
+    async def _aduckduckgo_search(self, query: str, max_results: int = 5) -> Dict[str, Any]:
+        return await self._aengine_search('duckduckgo', query, max_results)
+
+    async def _abaidu_search(self, query: str, max_results: int = 5) -> Dict[str, Any]:
+        return await self._aengine_search('baidu', query, max_results)
+
+    async def _afetch_url(self, url: str, extract_text: bool = True) -> Dict[str, Any]:
+        return await self._afetch_page(url, extract_text)
+
+    async def _acached_get(self, url: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """_cached_get 的异步版本；SQLite 读写（lookup 更新访问时间、store 加写锁并可能淘汰）放到线程中执行，不阻塞事件循环"""
+        cache = self.http_cache
+        if cache is None:
+            response = await self._aget(url, deadline)
+            return {'status': response.status_code, 'content_type': response.headers.get('Content-Type', ''),
+                    'text': response.text, 'cache': None}
+        entry = await asyncio.to_thread(cache.lookup, url)
+        if entry and cache.is_fresh(entry):
+            cache.mark_hit()
+            return self._cached_page(entry, 'hit')
+        try:
+            response = await self._aget(url, deadline, headers=cache.conditional_headers(entry))
+        except httpx.HTTPError:
+            if entry is None:
+                raise
+            cache.mark_stale()
+            return self._cached_page(entry, 'stale')
+        if response.status_code == 304 and entry:
+            entry = await asyncio.to_thread(cache.mark_revalidated, entry, response.headers)
+            return self._cached_page(entry, 'revalidated')
+        entry = await asyncio.to_thread(cache.store, url, response.status_code, response.headers,
+                                        response.content, response.encoding)
+        return self._cached_page(entry, 'downloaded')
+
+    async def _afetch_page(self, url: str, extract_text: bool = True,
+                           deadline: Optional[float] = None) -> Dict[str, Any]:
+        try:
+            page = await self._acached_get(url, deadline)
+            # 解析结果缓存的读写与页面解析同样放到线程中
+            return await asyncio.to_thread(
+                self._parse_cached, url, f'page:{int(bool(extract_text))}', page, lambda: self._parse_page(
+                    url, page['status'], page['content_type'], page['text'], extract_text))
+        except httpx.TimeoutException:
+            return {
+                'success': False,
+                'error': f'请求超时: {url}'
+            }
+        except httpx.HTTPError as e:
+            return {
+                'success': False,
+                'error': f'请求失败: {type(e).__name__}: {str(e)}'
+            }
+
+    async def _aextract_content(self, url: str, selectors: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        try:
+            page = await self._acached_get(url)
+            return await asyncio.to_thread(self._parse_cached, url, self._extract_kind(selectors), page,
+                                           lambda: self._parse_extracted(url, page['text'], selectors))
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'内容提取失败: {type(e).__name__}: {str(e)}'
+            }
+
+
 # 创建全局实例
 _spider_agent = None
 
@@ -0,0 +1,204 @@
+"""
+aiModels.agent.tool_cache
+
+子智能体调用结果缓存：
+- **键**：(智能体, 任务, 归一化参数)——参数按键排序、字符串合并空白、忽略 None 值
+- **按任务 TTL**：实时传感/告警数据很短，一般数据库查询中等，网页搜索较长；失败结果不缓存
+- **写入失效**：Base / Device 保存或删除时（post_save / post_delete），清除依赖该表的缓存结果
+- **LRU**：条目数超过上限时淘汰最久未使用的结果
+- **指标**：命中/未命中/过期/失效次数，按 (智能体, 任务) 分别统计，`/aiModels/tool_cache_stats` 查看
+
+说明：
+- 依赖表取自查询结果中的 data.model / data.table；raw_sql 无法判断依赖，任一受监听的表写入时都会失效
+- 不经 Django ORM 的写入（如采集程序直接写表）不会触发信号，只能依靠 TTL 过期
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, Optional, Tuple
+
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+# ========== 缓存参数 ==========
+TOOL_CACHE_MAX_ENTRIES = 512
+
+# (智能体, 任务) → TTL 秒；任务为 "*" 表示该智能体的其他任务，未配置或为 0 表示不缓存
+TOOL_CACHE_TTL: Dict[Tuple[str, str], float] = {
+    ("searchDB_agent", "list_models"): 3600,
+    ("searchDB_agent", "describe_model"): 3600,
+    ("searchDB_agent", "*"): 300,
+    ("spider_agent", "search"): 1800,
+    ("spider_agent", "fetch"): 600,
+    ("spider_agent", "extract"): 600,
+}
+
+# 实时数据表：结果只缓存 SENSOR_TTL 秒
+SENSOR_TABLES = {"sensor_readings1", "alarm"}
+SENSOR_TTL = 30
+
+# 写入时使缓存失效的模型
+WATCHED_MODELS = ("storageSystem.Base", "screen.Base", "storageSystem.Device")
+
+_ANY_TABLE = "*"
+_WS_RE = re.compile(r"\s+")
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return _WS_RE.sub(" ", value.strip())
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def _result_tables(agent: str, task: str, result: Dict[str, Any]) -> FrozenSet[str]:
+    """查询结果依赖的数据表（用于写入失效与判断是否为实时数据）。"""
+    if agent != "searchDB_agent":
+        return frozenset()
+    if task == "raw_sql":
+        return frozenset([_ANY_TABLE])
+    data = result.get("data") if isinstance(result.get("data"), dict) else {}
+    tables = set()
+    if data.get("table"):
+        tables.add(str(data["table"]))
+    if data.get("model") and "." in str(data["model"]):
+        try:
+            tables.add(apps.get_model(*str(data["model"]).split(".", 1))._meta.db_table)
+        except (LookupError, ValueError):
+            pass
+    return frozenset(tables)
+
+
+class ToolResultCache:
+    def __init__(self, max_entries: int = TOOL_CACHE_MAX_ENTRIES) -> None:
+        self.max_entries = max(1, int(max_entries))
+        # key → (结果, 过期时间, 依赖表)
+        self._data: "OrderedDict[Hashable, Tuple[Any, float, FrozenSet[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self.invalidations = 0
+
+    @staticmethod
+    def ttl_for(agent: str, task: str, tables: FrozenSet[str] = frozenset()) -> float:
+        if tables & SENSOR_TABLES:
+            return SENSOR_TTL
+        ttl = TOOL_CACHE_TTL.get((agent, task))
+        if ttl is None:
+            ttl = TOOL_CACHE_TTL.get((agent, "*"), 0)
+        return ttl
+
+    @staticmethod
+    def make_key(agent: str, task: str, args: Dict[str, Any]) -> Tuple[str, str, str]:
+        return agent, task, json.dumps(_normalize(args or {}), sort_keys=True, ensure_ascii=False, default=str)
+
+    def _count(self, key: Tuple[str, str, str], field: str) -> None:
+        name = f"{key[0]}.{key[1]}"
+        c = self._counters.setdefault(name, {"hits": 0, "misses": 0, "expired": 0})
+        c[field] += 1
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._count(key, "misses")
+                return None
+            result, expires_at, _ = item
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                self._count(key, "expired")
+                self._count(key, "misses")
+                return None
+            self._data.move_to_end(key)
+            self._count(key, "hits")
+        return copy.deepcopy(result)
+
+    def put(self, key: Tuple[str, str, str], result: Any) -> None:
+        """缓存成功结果；TTL 为 0 或结果失败时不缓存。"""
+        if not isinstance(result, dict) or not result.get("success"):
+            return
+        agent, task, _ = key
+        tables = _result_tables(agent, task, result)
+        ttl = self.ttl_for(agent, task, tables)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (copy.deepcopy(result), time.monotonic() + ttl, tables)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate_table(self, table: str) -> int:
+        """清除依赖该表（以及依赖未知表）的缓存结果，返回清除条数。"""
+        with self._lock:
+            stale = [k for k, (_, _, tables) in self._data.items() if table in tables or _ANY_TABLE in tables]
+            for k in stale:
+                del self._data[k]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = sum(c["hits"] for c in self._counters.values())
+            misses = sum(c["misses"] for c in self._counters.values())
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                "invalidations": self.invalidations,
+                "by_task": {name: dict(c) for name, c in self._counters.items()},
+            }
+
+
+def _on_model_write(sender, **kwargs):
+    """Base / Device 写入：清除依赖该表的缓存结果"""
+    removed = get_tool_cache().invalidate_table(sender._meta.db_table)
+    if removed:
+        print(f"[ToolCache] {sender._meta.label} 已变更，清除 {removed} 条缓存结果")
+
+
+def _connect_signals() -> None:
+    for label in WATCHED_MODELS:
+        try:
+            model = apps.get_model(label)
+        except LookupError:
+            continue
+        post_save.connect(_on_model_write, sender=model, dispatch_uid=f"tool_cache_save_{label}")
+        post_delete.connect(_on_model_write, sender=model, dispatch_uid=f"tool_cache_delete_{label}")
+
+
+# 创建全局实例
+_tool_cache = None
+_tool_cache_lock = threading.Lock()
+
+
+def get_tool_cache() -> ToolResultCache:
+    """获取子智能体结果缓存单例（首次获取时注册写入失效信号）"""
+    global _tool_cache
+    with _tool_cache_lock:
+        if _tool_cache is None:
+            _tool_cache = ToolResultCache()
+            _connect_signals()
+        return _tool_cache
+
+
+@require_GET
+def tool_cache_stats_view(request):
+    """GET /aiModels/tool_cache_stats：查看子智能体结果缓存的命中率与失效统计"""
+    return JsonResponse({"success": True, "tool_cache": get_tool_cache().stats()})
@@ -11,38 +11,8 @@ from IPython.display import display, IFrame, HTML
 from ltp import LTP
 ltp = LTP()
 
-# ===================== 领域词表（可按需扩充） =====================
-CROPS = [
-    "水稻", "小麦", "冬小麦", "春小麦", "玉米", "大豆", "高粱", "马铃薯", "土豆",
-    "花生", "油菜", "棉花", "番茄", "西红柿", "辣椒", "葡萄", "苹果", "梨", "香蕉",
-    "柑橘", "茶树",
-]
-# 作物别名归一
-CROP_ALIASES = {
-    "冬小麦": "小麦",
-    "春小麦": "小麦",
-    "西红柿": "番茄",
-    "稻谷":  "水稻",
-    "夏玉米": "玉米",
-    "春玉米": "玉米",
-}
-# 病害/虫害清单（与现有逻辑兼容，均当作“致病要素”处理）
-DISEASES = [
-    # —— 水稻 ——
-    "稻瘟病","稻曲病","白叶枯病","纹枯病","黑粉病","根腐病","炭疽病","霜霉病",
-    # —— 小麦 ——
-    "条锈病","小麦条锈病","小麦白粉病","赤霉病","根腐病","纹枯病","黑粉病","叶锈病",
-    # —— 玉米（病害） ——
-    "大斑病","小斑病","灰斑病","玉米灰斑病","南方锈病","玉米南方锈病","普通锈病","锈病",
-    "细菌性条斑病","弯孢叶斑病","茎腐病","穗腐病","丝黑穗病","矮花叶病","粗缩病","炭疽病","根腐病",
-    # —— 玉米（虫害，仍归入本表以兼容现有关系名） ——
-    "玉米螟","草地贪夜蛾","粘虫","棉铃虫","甜菜夜蛾","地老虎","蝼蛄","蓟马","蚜虫",
-    # —— 柑橘（病害+虫害） ——
-    "柑橘溃疡病","黄龙病","疮痂病","黑斑病","炭疽病","褐腐病","绿霉病","蓝霉病","煤污病","衰退病",
-    "柑橘木虱","亚洲柑橘木虱","柑橘红蜘蛛","柑橘潜叶蛾","柑橘大实蝇","柑橘蚜虫","介壳虫","粉蚧","褐软蜡蚧",
-    # —— 通用/保留 —— 
-    "叶斑病","晚疫病","霜霉病","白叶枯病","纹枯病","黑粉病","根腐病","炭疽病","赤霉病",
-]
+# ===================== 领域词表（见 vocab.py，RAG 分词器共用） =====================
+from .vocab import CROPS, CROP_ALIASES, DISEASES
 
 # ===================== 地点启发式（上下文参考，不参与关系） =====================
 # 地点启发式（帮助识别“黄淮海等主要冬小麦产区、部分地区”等；不参与关系，仅做上下文参考）
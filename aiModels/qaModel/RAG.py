@@ -3,37 +3,52 @@
 # =========================
 import json
 import re
+import threading
+import time
 import numpy as np
-import requests
+from dataclasses import dataclass, field
 from pathlib import Path
 from math import ceil
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
 # 检索相关
-from sentence_transformers import SentenceTransformer
 import faiss
-from rank_bm25 import BM25Okapi
 
 # Django相关
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
-
-# ========== Ollama 配置==========
-OLLAMA_BASE_URL = "http://localhost:11435"
+from django.views.decorators.http import require_GET, require_POST
+
+from .context_packer import pack_context
+from .embedders import backend_of, create_embedder
+from .fusion import BM25Index, TokenSetIndex, fuse, top_positive
+from .index_builder import BackgroundIndexBuilder
+from .knowledge_store import get_knowledge_store
+from .llm_client import get_llm_client
+from .ollama_stream import ThinkStripper, sse_event
+from .parallel_encode import encode_to_faiss
+from .rag_cache import AnswerCache, EmbeddingCache
+from .reranker import get_reranker
+from .tokenizers import TokenStreamCache, get_tokenizer
+
+# ========== Ollama 配置（连接地址见 llm_client）==========
 MODEL_NAME = "deepseek-r1:1.5b"
 
 # ========== 向量模型（中文/多语）==========
 # 可替换：BAAI/bge-m3 或 moka-ai/m3e-base 等中文更强的模型
 EMB_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+EMB_BACKEND = "torch"       # 编码后端：torch / torch_int8 / onnx_int8（见 embedders）
+EMB_NUM_THREADS = 0         # 推理线程数，0 表示使用库默认值
 
 # ========== 数据文件路径 ==========
-# 使用 __file__ 获取当前脚本目录，确保路径正确
+# 知识库已迁移至 SQLite 存储（见 knowledge_store），该 JSON 仅作为首次导入来源
 DATA_PATH = Path(__file__).parent / "agriculture_dat.json"  # JSON: [{instruction,input,output}, ...]
 
 # ========== RAG 参数 ==========
 TOP_K = 5              # 每次注入上下文的文档数（融合后取前 K）
 ALPHA = 0.6            # 融合权重：1=纯向量，0=纯BM25
-MAX_CTX_CHARS = 4000   # 拼接到 prompt 的上下文字符上限
+MAX_CTX_TOKENS = 1200  # 拼接到 prompt 的上下文 token 预算（按整条文档装入）
 
 # ========== 门控阈值（命中质量判断）==========
 MIN_DOCS = 1                # 至少命中多少条
@@ -47,34 +62,95 @@ VEC_QUOTA_FRACTION = 0.5    # 向量通道配额比例（余下给 BM25）
 MIN_JACCARD = 0.07          # 查询与文档 instruction 的 Jaccard 下限
 MIN_COMMON_TOKENS = 2       # 查询与文档 instruction 至少共有多少词
 
+# ========== 交叉编码器重排（可选，见 reranker）==========
+USE_RERANK = False          # 开启后：融合取前 RERANK_CANDIDATES 条 → 交叉编码器重排 → 注入前 RERANK_TOP_K 条
+RERANK_CANDIDATES = 20      # 送入重排的融合候选数
+RERANK_TOP_K = 3            # 重排后注入上下文的文档数（少而精，缩短提示与生成时间）
+RERANK_BUDGET_MS = 300      # 单次查询重排的硬性时间预算，超时回退为融合顺序
+MIN_RERANK_SCORE = 0.5      # 重排相关概率阈值：低于该值的文档不注入，门控也以此为准
+
+# ========== 分词（BM25 / 重叠过滤）==========
+TOKENIZER = "ngram"         # regex（原整句切分）/ ngram（中文 2-gram + 领域词）/ dict（领域词典 + jieba）
+
+# ========== 索引构建 ==========
+ENCODE_BATCH_SIZE = 256     # 语料分批编码，每批上报一次进度
+PARALLEL_ENCODE_MIN_DOCS = 20000   # 文档数达到该值时改用多进程并行编码（见 parallel_encode）
+ENCODE_WORKERS = 0                 # 并行编码进程数，0 表示 CPU 核数
+
+# ========== 缓存（重复问题跳过编码/生成）==========
+EMB_CACHE_MAX_BYTES = 32 * 1024 * 1024     # 查询向量 LRU 缓存内存上限
+ANSWER_CACHE_MAX_BYTES = 16 * 1024 * 1024  # 答案缓存内存上限
+ANSWER_CACHE_TTL = 3600                    # 答案缓存有效期（秒）
+
 # ========== 纯LLM模式的system指令（当证据不足时启用）==========
 SYSTEM_FOR_PLAIN = "你是一名中文助手，回答要准确、简要，在不了解事实时请明确说明。"
+PLAIN_FALLBACK_NOTICE = "提示：未在知识库中匹配到相关问题，以下为模型直接回答。\n\n"
 
 # ========== 全局变量 ==========
-docs = None
-embedder = None
-index = None
-bm25 = None
-rag_initialized = False
-
-# 导入聊天历史记录
-from .deepseek_r1_api import chat_history
+@dataclass
+class RagIndex:
+    """一次构建出的完整检索索引；查询时整体读取，重建后整体替换。"""
+    docs: List[dict]
+    embedder: Any
+    index: Any
+    bm25: BM25Index
+    built_at: float
+    ins_tokens: TokenSetIndex     # 各文档 instruction 的词集合（构建时预计算，供重叠过滤）
+    doc_tokens: List[Tuple[str, ...]] = field(default_factory=list)   # 各文档全文的词流（BM25 输入）
+    tokenizer: str = TOKENIZER    # 构建时使用的分词器，查询须使用同一个
+
+_active_index: Optional[RagIndex] = None   # 当前对外服务的索引
+_embedder = None                           # 向量模型（重建索引时复用，不重复加载）
+_embedder_lock = threading.Lock()
+
+# 文档词流缓存：重建索引时未变化的文档不重新分词
+_text_token_cache = TokenStreamCache()
+_ins_token_cache = TokenStreamCache()
+
+emb_cache = EmbeddingCache(EMB_CACHE_MAX_BYTES)
+answer_cache = AnswerCache(ANSWER_CACHE_MAX_BYTES, ANSWER_CACHE_TTL)
+
+# 导入聊天历史记录（按会话隔离，与 DeepSeek 问答共用）
+from .chat_store import session_id_for
+from .deepseek_r1_api import chat_store, ensure_system_message
+
+def get_active_index() -> Optional[RagIndex]:
+    return _active_index
+
+def is_rag_ready() -> bool:
+    return _active_index is not None
+
+def _swap_index(new_index: RagIndex):
+    """原子替换当前索引（单次引用赋值），并作废基于旧知识库的答案缓存。"""
+    global _active_index
+    _active_index = new_index
+    answer_cache.clear()
+    print(f"[INFO] RAG索引已切换，条目数：{len(new_index.docs)}")
 
 # 新增：重置RAG状态的辅助函数
 def reset_rag_state():
-    global docs, embedder, index, bm25, rag_initialized
-    docs = None
-    embedder = None
-    index = None
-    bm25 = None
-    rag_initialized = False
+    global _active_index, _embedder
+    _active_index = None
+    _embedder = None
+    # 向量模型与知识库都将重建，两级缓存一并失效
+    emb_cache.clear()
+    answer_cache.clear()
+
+def invalidate_answer_cache():
+    """知识库内容变更后调用：已缓存的答案可能基于旧条目，全部作废。"""
+    answer_cache.clear()
 
 # =========================
 # 工具函数：分词/重叠度
 # =========================
-def tokenize(s: str):
-    # 简单中英混合分词
-    return [t for t in re.findall(r"[\w\u4e00-\u9fa5]+", (s or "").lower()) if t.strip()]
+def tokenize(s: str, tokenizer: str = TOKENIZER):
+    # 中英混合分词（分词方式见 tokenizers，由 TOKENIZER 配置）
+    return get_tokenizer(tokenizer).tokenize(s)
+
+@lru_cache(maxsize=4096)
+def tokenize_query(query: str, tokenizer: str = TOKENIZER) -> Tuple[str, ...]:
+    """查询分词（带缓存，重复问题不重复分词）"""
+    return tuple(tokenize(query, tokenizer))
 
 def jaccard(a_tokens, b_tokens):
     A, B = set(a_tokens), set(b_tokens)
@@ -83,185 +159,237 @@ def jaccard(a_tokens, b_tokens):
     return len(A & B) / len(A | B)
 
 # =========================
-# 1) 读取 JSON 并构建文档库
+# 1) 读取知识库并构建文档库
 # =========================
-def load_docs(json_path: Path):
-    with open(json_path, "r", encoding="utf-8") as f:
-        raw = json.load(f)
-    docs = []
-    for i, ex in enumerate(raw):
-        # 优先使用原 JSON 中的 id 字段（若存在），否则回退为枚举索引 i
-        json_id = ex.get("id", i)
-        try:
-            # 若可转换为整数则转为 int，保持引用展示一致性
-            json_id = int(json_id)
-        except Exception:
-            # 若无法转换则保留原始值（可能为字符串）
-            pass
-        ins = (ex.get("instruction") or "").strip()
-        inp = (ex.get("input") or "").strip()
-        out = (ex.get("output") or "").strip()
-        text = f"问题：{ins}\n补充：{inp}\n答案：{out}".strip()
-        docs.append({
-            "id": json_id,
-            "instruction": ins,
-            "input": inp,
-            "output": out,
-            "text": text
-        })
-    return docs
+def _make_doc(ex: Dict[str, Any], i: int) -> Dict[str, Any]:
+    # 优先使用原数据中的 id 字段（若存在），否则回退为枚举索引 i
+    json_id = ex.get("id", i)
+    try:
+        # 若可转换为整数则转为 int，保持引用展示一致性
+        json_id = int(json_id)
+    except Exception:
+        # 若无法转换则保留原始值（可能为字符串）
+        pass
+    ins = (ex.get("instruction") or "").strip()
+    inp = (ex.get("input") or "").strip()
+    out = (ex.get("output") or "").strip()
+    text = f"问题：{ins}\n补充：{inp}\n答案：{out}".strip()
+    return {
+        "id": json_id,
+        "instruction": ins,
+        "input": inp,
+        "output": out,
+        "text": text
+    }
+
+def load_docs(json_path: Optional[Path] = None):
+    """
+    读取知识库文档。
+    默认从知识库存储（SQLite）流式读取；传入 json_path 时读取指定 JSON 文件。
+    """
+    if json_path is not None:
+        with open(json_path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        return [_make_doc(ex, i) for i, ex in enumerate(raw)]
+    return [_make_doc(ex, i) for i, ex in enumerate(get_knowledge_store().iter_items())]
 
 # =========================
 # 2) 建立向量索引 + BM25 索引
 # =========================
-def build_indexes():
-    global docs, embedder, index, bm25, rag_initialized
-    
-    if rag_initialized:
-        return True
-        
-    try:
-        # 加载文档
-        docs = load_docs(DATA_PATH)
-        assert len(docs) > 0, "知识库为空，请检查 agriculture_dat.json。"
-        print(f"[INFO] 已载入知识库条目：{len(docs)}")
-
-        # 建立向量索引
-        embedder = SentenceTransformer(EMB_MODEL_NAME)
-        corpus_texts = [d["text"] for d in docs]
-        corpus_instructions = [d["instruction"] for d in docs]
-
-        # 语义向量（对全文 text）
-        emb_matrix = embedder.encode(
-            corpus_texts,
-            convert_to_numpy=True,
-            normalize_embeddings=True,
-            show_progress_bar=False
+def get_embedder():
+    """加载（或复用）向量模型"""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            _embedder = create_embedder(EMB_MODEL_NAME, EMB_BACKEND, EMB_NUM_THREADS)
+        return _embedder
+
+def build_index_snapshot(progress: Optional[BackgroundIndexBuilder] = None) -> RagIndex:
+    """
+    构建一份完整索引（不修改当前服务中的索引）。
+    progress：可选的后台构建器，用于上报阶段与编码进度。
+    """
+    def report(stage, done=None, total=None):
+        if progress is not None:
+            progress.report(stage, done, total)
+
+    # 加载文档
+    report("loading")
+    docs = load_docs()
+    assert len(docs) > 0, "知识库为空，请先在知识库管理中添加条目或检查 agriculture_dat.json。"
+    print(f"[INFO] 已载入知识库条目：{len(docs)}")
+
+    # 建立向量索引
+    report("loading_model", 0, len(docs))
+    embedder = get_embedder()
+    corpus_texts = [d["text"] for d in docs]
+
+    # 语义向量（对全文 text），分批编码以便上报进度
+    report("encoding", 0, len(docs))
+    if len(docs) >= PARALLEL_ENCODE_MIN_DOCS and ENCODE_WORKERS != 1:
+        # 大规模语料：多进程分片编码，分片向量经内存映射文件合并入索引
+        index = encode_to_faiss(
+            corpus_texts, EMB_MODEL_NAME, EMB_BACKEND,
+            workers=ENCODE_WORKERS,
+            progress=lambda done, total: report("encoding", done, total)
         )
+    else:
+        index = None
+        for start in range(0, len(corpus_texts), ENCODE_BATCH_SIZE):
+            batch = corpus_texts[start:start + ENCODE_BATCH_SIZE]
+            emb_batch = embedder.encode(
+                batch,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+            if index is None:
+                index = faiss.IndexFlatIP(emb_batch.shape[1])   # 内积（向量已单位化 ≈ 余弦）
+            index.add(emb_batch)
+            report("encoding", start + len(batch), len(docs))
+
+    # 关键词索引（对全文 text）；词流按文档缓存，未变化的文档不重新分词
+    report("bm25")
+    tokenizer = get_tokenizer(TOKENIZER)
+    doc_tokens = _text_token_cache.tokenize_corpus(corpus_texts, tokenizer)
+    bm25 = BM25Index(doc_tokens)
+
+    # instruction 词集合（重叠过滤用，避免每次查询重新分词）
+    ins_tokens = TokenSetIndex(_ins_token_cache.tokenize_corpus([d["instruction"] for d in docs], tokenizer))
+
+    print("[INFO] 向量与BM25索引就绪。")
+    return RagIndex(docs=docs, embedder=embedder, index=index, bm25=bm25, built_at=time.time(),
+                    ins_tokens=ins_tokens, doc_tokens=doc_tokens, tokenizer=TOKENIZER)
 
-        dim = emb_matrix.shape[1]
-        index = faiss.IndexFlatIP(dim)   # 内积（向量已单位化 ≈ 余弦）
-        index.add(emb_matrix)
-
-        # 关键词索引（对全文 text）
-        bm25 = BM25Okapi([tokenize(t) for t in corpus_texts])
+def build_indexes():
+    """同步构建（命令行/脚本使用）；Web 接口请走后台构建 rag_builder。"""
+    if is_rag_ready():
+        return True
 
-        print("[INFO] 向量与BM25索引就绪。")
-        rag_initialized = True
+    try:
+        _swap_index(build_index_snapshot())
         return True
-        
     except Exception as e:
         print(f"[ERROR] RAG初始化失败: {e}")
         return False
 
+# 后台构建器：HTTP 请求只负责触发，进度通过 /aiModels/rag_status 查询
+rag_builder = BackgroundIndexBuilder(build_index_snapshot, _swap_index)
+
 # =========================
-# 3) 稳健归一化 + 混合检索
+# 3) 混合检索（融合与过滤见 fusion）
 # =========================
-def minmax_norm(d: dict):
+def encode_query(query: str):
+    """查询向量化（带 LRU 缓存），返回形状 (1, dim) 的单位向量。"""
+    q_emb = emb_cache.get(query)
+    if q_emb is None:
+        q_emb = get_embedder().encode([query], convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+        emb_cache.put(query, q_emb)
+    return q_emb
+
+def hybrid_search(query: str, top_k: int = TOP_K, alpha: float = ALPHA, timings: Optional[dict] = None):
     """
-    稳健归一化：
-    - hi==lo==0  → 全部 0（该通道无有效区分度）
-    - hi==lo!=0  → 全部 1（都同等强）
-    - 其他       → 标准 min-max
+    混合检索。timings：可选 dict，传入时记录各阶段耗时（秒）：encode / faiss / bm25 / fusion。
     """
-    if not d:
-        return d
-    vals = np.array(list(d.values()), dtype=float)
-    lo, hi = float(vals.min()), float(vals.max())
-    if abs(hi - lo) < 1e-12:
-        if abs(hi) < 1e-12:
-            return {k: 0.0 for k in d}
-        else:
-            return {k: 1.0 for k in d}
-    return {k: (v - lo) / (hi - lo) for k, v in d.items()}
+    # 整个查询只读取一次当前索引，后台重建切换不会影响进行中的查询
+    snap = _active_index
+    if snap is None:
+        return []
+    docs, index, bm25 = snap.docs, snap.index, snap.bm25
+    clock = time.perf_counter if timings is not None else None
+    t0 = clock() if clock else 0.0
+    qtok = tokenize_query(query, snap.tokenizer)
+    # 多取一点候选，便于后续过滤
+    take = max(top_k, 10)
 
-def hybrid_search(query: str, top_k: int = TOP_K, alpha: float = ALPHA):
     # ===== 向量检索 =====
-    q_emb = embedder.encode([query], convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
-    # 多取一点候选，便于后续过滤
-    vec_take = max(top_k, 10)
-    D, I = index.search(q_emb, vec_take)
-    # 过滤相似度<=0（单位化向量时 <=0 表示反相关或无关）
-    vec_pairs = [(int(i), float(s)) for i, s in zip(I[0], D[0]) if int(i) >= 0 and float(s) > 0.0]
-    # 去重保留更高分
-    vec_scores = {}
-    for i, s in vec_pairs:
-        if (i not in vec_scores) or (s > vec_scores[i]):
-            vec_scores[i] = s
-
-    # ===== BM25 检索 =====
-    bm_scores_list = bm25.get_scores(tokenize(query))
-    bm_idx_sorted = np.argsort(bm_scores_list)[::-1]
-    bm_scores = {}
-    for i in bm_idx_sorted:
-        score = float(bm_scores_list[i])
-        if score <= 0.0:
-            break  # 后面更低，直接停止
-        bm_scores[int(i)] = score
-        if len(bm_scores) >= max(top_k, 10):
-            break
+    q_emb = encode_query(query)
+    if clock:
+        t1 = clock()
+        timings["encode"] = t1 - t0
+    D, I = index.search(q_emb, take)
+    # 过滤相似度<=0（单位化向量时 <=0 表示反相关或无关）；FAISS 结果已按分数降序且 id 不重复
+    keep = (I[0] >= 0) & (D[0] > 0.0)
+    vec_ids, vec_scores = I[0][keep].astype(np.int64), D[0][keep].astype(np.float64)
+    if clock:
+        t2 = clock()
+        timings["faiss"] = t2 - t1
+
+    # ===== BM25 检索：只对含查询词的文档打分，取前 take 个正分 =====
+    hit_ids, hit_scores = bm25.sparse_scores(qtok)
+    bm_ids, bm_scores = top_positive(hit_scores, take, hit_ids)
+    if clock:
+        t3 = clock()
+        timings["bm25"] = t3 - t2
 
     # 两通道都为空 → 无有效候选
-    if not vec_scores and not bm_scores:
+    if vec_ids.size == 0 and bm_ids.size == 0:
+        if clock:
+            timings["fusion"] = 0.0
         return []
 
-    # ===== 通道配额（可选）=====
+    # ===== 通道配额（可选）：各通道已降序，直接截取前配额 =====
     if USE_CHANNEL_QUOTA:
         vec_quota = ceil(top_k * VEC_QUOTA_FRACTION)
         bm_quota = top_k - vec_quota
-        # 分别截取各通道前配额
-        vec_scores = dict(sorted(vec_scores.items(), key=lambda x: x[1], reverse=True)[:vec_quota])
-        bm_scores  = dict(sorted(bm_scores.items(),  key=lambda x: x[1], reverse=True)[:bm_quota])
-
-    # ===== 归一化 =====
-    vec_n = minmax_norm(vec_scores)
-    bm_n  = minmax_norm(bm_scores)
+        vec_ids, vec_scores = vec_ids[:vec_quota], vec_scores[:vec_quota]
+        bm_ids, bm_scores = bm_ids[:bm_quota], bm_scores[:bm_quota]
 
-    # ===== 融合：final = alpha*vec + (1-alpha)*bm =====
-    all_ids = set(vec_n) | set(bm_n)
-    merged = []
-    for i in all_ids:
-        s = alpha * vec_n.get(i, 0.0) + (1 - alpha) * bm_n.get(i, 0.0)
-        merged.append((i, s))
-
-    # 排序
-    merged.sort(key=lambda x: x[1], reverse=True)
+    # ===== 归一化 + 融合：final = alpha*vec + (1-alpha)*bm =====
+    ids, fused = fuse(vec_ids, vec_scores, bm_ids, bm_scores, alpha)
 
     # ===== 词重叠/Jaccard 过滤（可选）=====
-    if USE_OVERLAP_FILTER:
-        qtok = tokenize(query)
-        def overlap_ok(doc_ins: str, min_jacc=MIN_JACCARD, min_common=MIN_COMMON_TOKENS):
-            ins_tok = tokenize(doc_ins)
-            common = len(set(qtok) & set(ins_tok))
-            if common < min_common:
-                return False
-            return jaccard(qtok, ins_tok) >= min_jacc
-
-        filtered = [(i, s) for (i, s) in merged if overlap_ok(docs[i]["instruction"])]
-        if filtered:  # 若全被过滤则退回未过滤结果
-            merged = filtered
+    if USE_OVERLAP_FILTER and ids.size:
+        common, jacc = snap.ins_tokens.overlap(qtok, ids)
+        ok = (common >= MIN_COMMON_TOKENS) & (jacc >= MIN_JACCARD)
+        if ok.any():  # 若全被过滤则退回未过滤结果
+            ids, fused = ids[ok], fused[ok]
 
     # 截断
-    top = merged[:top_k]
-    return [{"score": s, "doc": docs[i]} for i, s in top]
+    results = [{"score": float(s), "doc": docs[int(i)]} for i, s in zip(ids[:top_k], fused[:top_k])]
+    if clock:
+        timings["fusion"] = clock() - t3
+    return results
+
+def retrieve(query: str, top_k: int = TOP_K, alpha: float = ALPHA, timings: Optional[dict] = None):
+    """
+    检索入口：混合检索 + 可选交叉编码器重排。
+    重排成功：保留相关概率 >= MIN_RERANK_SCORE 的前 RERANK_TOP_K 条（全部低于阈值时保留最高一条供门控判断）；
+    超时/忙/失败：回退为融合顺序前 top_k 条。
+    timings：同 hybrid_search，启用重排时另记 rerank 耗时。
+    """
+    if not USE_RERANK:
+        return hybrid_search(query, top_k=top_k, alpha=alpha, timings=timings)
+    candidates = hybrid_search(query, top_k=max(top_k, RERANK_CANDIDATES), alpha=alpha, timings=timings)
+    t0 = time.perf_counter()
+    reranked = get_reranker().rerank(query, candidates, RERANK_BUDGET_MS)
+    if timings is not None:
+        timings["rerank"] = time.perf_counter() - t0
+    if reranked is None:
+        return candidates[:top_k]
+    kept = [r for r in reranked[:RERANK_TOP_K] if r["rerank_score"] >= MIN_RERANK_SCORE]
+    return kept or reranked[:1]
 
 # =========================
 # 4) 构造提示（RAG 模式）
 # =========================
-def build_prompt(query: str, retrieved, max_ctx_chars: int = MAX_CTX_CHARS):
-    ctx_lines = []
-    for r in retrieved:
-        d = r["doc"]
-        ctx = (
-            f"[Doc#{d['id']} score={r['score']:.2f}]\n"
-            f"指令：{d['instruction']}\n"
-            f"补充：{d['input']}\n"
-            f"答案：{d['output']}"
-        ).strip()
-        ctx_lines.append(ctx)
+def format_context_block(r) -> str:
+    d = r["doc"]
+    return (
+        f"[Doc#{d['id']} score={r['score']:.2f}]\n"
+        f"指令：{d['instruction']}\n"
+        f"补充：{d['input']}\n"
+        f"答案：{d['output']}"
+    ).strip()
+
+def build_prompt(query: str, retrieved, max_ctx_tokens: Optional[int] = None):
+    # 去重后按 token 预算装入整条文档（不在答案中间截断）；预算默认在调用时读取 MAX_CTX_TOKENS
+    if max_ctx_tokens is None:
+        max_ctx_tokens = MAX_CTX_TOKENS
+    ctx_lines, pack_stats = pack_context(retrieved, format_context_block, max_ctx_tokens)
+    print('上下文打包：', pack_stats)
 
     context_blob = "\n\n---\n\n".join(ctx_lines)
-    context_blob = context_blob[:max_ctx_chars]  # 粗控长度
 
     system_prompt = (
         "你是一名中文检索增强农业问答助手。仅依据\"检索上下文\"简要回答；"
@@ -294,41 +422,59 @@ def ollama_chat(messages,
                 max_tokens: int = 1024,
                 hide_think: bool = True,
                 timeout: int = 300):
-    url = f"{OLLAMA_BASE_URL}/api/chat"
-    payload = {
-        "model": model,
-        "messages": messages,
-        "stream": False,
-        "options": {
-            "temperature": temperature,
-            "top_p": top_p,
-            "num_predict": max_tokens
-        }
+    options = {
+        "temperature": temperature,
+        "top_p": top_p,
+        "num_predict": max_tokens
     }
-    r = requests.post(url, json=payload, timeout=timeout)
-    r.raise_for_status()
-    data = r.json()
-    content = data.get("message", {}).get("content", "")
+    content = get_llm_client().chat(messages, model=model, options=options, timeout=timeout)
     return strip_think(content) if hide_think else content
 
+def ollama_chat_stream(messages,
+                       model: str = MODEL_NAME,
+                       temperature: float = 0.7,
+                       top_p: float = 0.9,
+                       max_tokens: int = 1024,
+                       hide_think: bool = True,
+                       timeout: int = 300):
+    """流式版 ollama_chat：逐段产出可见文本（<think> 块增量剔除）。"""
+    options = {
+        "temperature": temperature,
+        "top_p": top_p,
+        "num_predict": max_tokens
+    }
+    stripper = ThinkStripper() if hide_think else None
+    for delta in get_llm_client().chat_stream(messages, model=model, options=options, timeout=timeout):
+        visible = stripper.feed(delta) if stripper else delta
+        if visible:
+            yield visible
+    if stripper:
+        rest = stripper.flush()
+        if rest:
+            yield rest
+
 # =========================
 # 6) 命中质量门控（决定是否启用RAG）
 # =========================
 def is_evidence_sufficient(retrieved,
-                           min_docs: int = MIN_DOCS,
-                           min_best_score: float = MIN_BEST_SCORE,
-                           min_any_output_chars: int = MIN_ANY_OUTPUT_CHARS) -> bool:
+                           min_docs: Optional[int] = None,
+                           min_best_score: Optional[float] = None,
+                           min_any_output_chars: Optional[int] = None) -> bool:
     """
-    轻量门控逻辑：
+    轻量门控逻辑（阈值未指定时读取当前模块配置）：
     - 至少命中 min_docs 条
-    - 最高融合分 >= min_best_score
+    - 最高分 >= 阈值（经过重排时用重排相关概率与 MIN_RERANK_SCORE，否则用融合分与 min_best_score）
     - 命中条目中至少有一条 output 长度>= min_any_output_chars
     """
+    min_docs = MIN_DOCS if min_docs is None else min_docs
+    min_best_score = MIN_BEST_SCORE if min_best_score is None else min_best_score
+    min_any_output_chars = MIN_ANY_OUTPUT_CHARS if min_any_output_chars is None else min_any_output_chars
     if not retrieved or len(retrieved) < min_docs:
         return False
+    reranked = all("rerank_score" in r for r in retrieved)
     best_score = max(r.get("score", 0.0) for r in retrieved)
-    print('命中得分：', best_score)
-    if best_score < min_best_score:
+    print('命中得分：', best_score, '(重排)' if reranked else '')
+    if best_score < (MIN_RERANK_SCORE if reranked else min_best_score):
         return False
     any_output_ok = any(len((r["doc"].get("output") or "").strip()) >= min_any_output_chars
                         for r in retrieved)
@@ -353,32 +499,52 @@ def answer_with_rag_or_plain(query: str,
       used_rag: bool
       debug: dict
     """
-    retrieved = hybrid_search(query, top_k=k, alpha=alpha)
-    used_rag = is_evidence_sufficient(retrieved)
+    retrieved, used_rag, messages, prefix = prepare_answer(query, k, alpha, system_for_plain)
+
+    # 答案缓存：同一问题 + 同一批命中文档 + 同一模型 → 直接复用
+    cache_key = answer_cache_key(query, retrieved, used_rag) if hide_think else None
+    answer = answer_cache.get(cache_key) if cache_key else None
 
+    if answer is None:
+        answer = prefix + ollama_chat(messages, hide_think=hide_think)
+        if cache_key and answer:
+            answer_cache.put(cache_key, answer)
+
+    return answer, retrieved, used_rag, debug_info(retrieved)
+
+def prepare_answer(query: str,
+                   k: int = TOP_K,
+                   alpha: float = ALPHA,
+                   system_for_plain: str = SYSTEM_FOR_PLAIN):
+    """
+    检索 + 门控 + 组装消息（阻塞/流式两种回答共用）。
+    返回：(retrieved, used_rag, messages, 答案前缀)
+    """
+    retrieved = retrieve(query, k, alpha)
+    used_rag = is_evidence_sufficient(retrieved)
     if used_rag:
-        messages = build_prompt(query, retrieved)
-        answer = ollama_chat(messages, hide_think=hide_think)
-    else:
-        messages = [
-            {"role": "system", "content": system_for_plain},
-            {"role": "user",   "content": query}
-        ]
-        plain_answer = ollama_chat(messages, hide_think=hide_think)
-        answer = f"提示：未在知识库中匹配到相关问题，以下为模型直接回答。\n\n{plain_answer}"
-
-    # 调试信息
+        return retrieved, True, build_prompt(query, retrieved), ""
+    messages = [
+        {"role": "system", "content": system_for_plain},
+        {"role": "user",   "content": query}
+    ]
+    return retrieved, False, messages, PLAIN_FALLBACK_NOTICE
+
+def answer_cache_key(query: str, retrieved, used_rag: bool):
+    doc_ids = [r["doc"]["id"] for r in retrieved] if used_rag else ()
+    return AnswerCache.make_key(query, doc_ids, MODEL_NAME, used_rag)
+
+def debug_info(retrieved):
+    """调试信息：命中得分与文档 id"""
     if retrieved:
         scores = [float(r["score"]) for r in retrieved]
-        debug = {
+        return {
             "best_score": float(max(scores)),
             "avg_score": float(np.mean(scores)),
-            "doc_ids": [int(r["doc"]["id"]) for r in retrieved]
+            "doc_ids": [int(r["doc"]["id"]) for r in retrieved],
+            "reranked": all("rerank_score" in r for r in retrieved)
         }
-    else:
-        debug = {"best_score": 0.0, "avg_score": 0.0, "doc_ids": []}
-
-    return answer, retrieved, used_rag, debug
+    return {"best_score": 0.0, "avg_score": 0.0, "doc_ids": []}
 
 # =========================
 # 8) 为答案增加引用标注（仅在使用RAG时添加）
@@ -399,6 +565,38 @@ def append_citations(answer: str, retrieved, used_rag: bool = True):
 # =========================
 # 9) Django视图函数
 # =========================
+def _start_build_response(message: str, reinitialized: bool):
+    started = rag_builder.start()
+    return JsonResponse({
+        'success': True,
+        'building': True,
+        'message': message if started else '知识库构建进行中，已排队重建',
+        'ready': is_rag_ready(),
+        'doc_count': len(_active_index.docs) if _active_index else 0,
+        'reinitialized': reinitialized,
+        'status': rag_builder.status()
+    }, status=202)
+
+def _not_ready_response():
+    msg = 'RAG系统未初始化，请先点击知识库增强按钮'
+    if rag_builder.is_running():
+        msg = '知识库正在构建中，请稍后再试'
+    return JsonResponse({'error': msg, 'status': rag_builder.status()}, status=400)
+
+@require_GET
+def rag_status_view(request):
+    """GET /aiModels/rag_status：查询索引是否可用及后台构建进度（已编码条数、预计剩余时间）"""
+    snap = _active_index
+    return JsonResponse({
+        'success': True,
+        'ready': snap is not None,
+        'doc_count': len(snap.docs) if snap else 0,
+        'built_at': snap.built_at if snap else None,
+        'emb_backend': (backend_of(snap.embedder) if snap else None) or EMB_BACKEND,
+        'rerank': get_reranker().stats() if USE_RERANK else None,
+        'build': rag_builder.status()
+    })
+
 @csrf_exempt
 @require_POST
 def initialize_rag_view(request):
@@ -411,30 +609,17 @@ def initialize_rag_view(request):
             data = {}
         force = bool(data.get('force'))
 
-        if force:
-            reset_rag_state()
-
-        if not rag_initialized:
-            success = build_indexes()
-            if success:
-                return JsonResponse({
-                    'success': True,
-                    'message': '知识库初始化成功',
-                    'doc_count': len(docs) if docs else 0,
-                    'reinitialized': bool(force)
-                })
-            else:
-                return JsonResponse({
-                    'success': False,
-                    'error': '知识库初始化失败'
-                }, status=500)
-        else:
+        if is_rag_ready() and not force:
             return JsonResponse({
                 'success': True,
                 'message': '知识库已初始化',
-                'doc_count': len(docs) if docs else 0,
-                'reinitialized': False
+                'doc_count': len(_active_index.docs),
+                'reinitialized': False,
+                'building': False
             })
+
+        # 后台构建，请求立即返回；构建完成前旧索引（若有）继续服务
+        return _start_build_response('知识库正在后台构建', reinitialized=force)
     except Exception as e:
         return JsonResponse({
             'success': False,
@@ -445,31 +630,18 @@ def initialize_rag_view(request):
 @csrf_exempt
 @require_POST
 def reinitialize_rag_view(request):
-    """重新初始化RAG系统：清空内存并重建索引"""
-    global chat_history
-    
+    """重新初始化RAG系统：清空当前会话历史并在后台重建索引"""
     try:
-        # 清空聊天历史记录
-        chat_history.clear()
-        
+        # 清空当前会话的聊天历史记录
+        session_id = session_id_for(request)
+        conversation = chat_store.clear(session_id)
+
         # 重新注入系统提示
-        from .deepseek_r1_api import ensure_system_message
-        ensure_system_message(chat_history)
+        ensure_system_message(conversation)
+        chat_store.save(session_id)
         
-        # 重置RAG状态
-        reset_rag_state()
-        success = build_indexes()
-        if success:
-            return JsonResponse({
-                'success': True,
-                'message': '知识库重新初始化成功',
-                'doc_count': len(docs) if docs else 0
-            })
-        else:
-            return JsonResponse({
-                'success': False,
-                'error': '知识库重新初始化失败'
-            }, status=500)
+        # 后台重建索引，完成后原子替换；期间查询继续使用旧索引
+        return _start_build_response('知识库正在后台重新构建', reinitialized=True)
     except Exception as e:
         return JsonResponse({
             'success': False,
@@ -480,13 +652,9 @@ def reinitialize_rag_view(request):
 @require_POST
 def get_answer_rag_view(request):
     """使用RAG系统回答问题"""
-    global chat_history
-    
     try:
-        if not rag_initialized:
-            return JsonResponse({
-                'error': 'RAG系统未初始化，请先点击知识库增强按钮'
-            }, status=400)
+        if not is_rag_ready():
+            return _not_ready_response()
             
         data = json.loads(request.body)
         question = data.get('question', '')
@@ -495,7 +663,9 @@ def get_answer_rag_view(request):
             return JsonResponse({'error': 'Empty question'}, status=400)
         
         # 添加用户问题到聊天历史
-        chat_history.append({"role": "user", "content": question})
+        session_id = session_id_for(request, data)
+        conversation = chat_store.get(session_id)
+        conversation.append("user", question)
         
         # 使用RAG系统回答问题
         answer, retrieved, used_rag, debug = answer_with_rag_or_plain(question)
@@ -505,7 +675,8 @@ def get_answer_rag_view(request):
             answer = append_citations(answer, retrieved, used_rag)
         
         # 添加AI回答到聊天历史
-        chat_history.append({"role": "assistant", "content": answer})
+        conversation.append("assistant", answer)
+        chat_store.save(session_id)
         
         return JsonResponse({
             'answer': answer,
@@ -518,3 +689,77 @@ def get_answer_rag_view(request):
             'error': f'RAG回答异常: {str(e)}'
         }, status=500)
 
+def _answer_rag_stream(session_id: str, conversation, question: str):
+    """
+    生成器：SSE 流式返回 RAG 回答
+    - 首条 citations 事件：是否启用RAG、引用记录与调试信息
+    - 随后 token 事件：模型增量输出（已剔除 <think>）
+    - 最后 done 事件：完整答案（含引用标注）
+    """
+    try:
+        retrieved, used_rag, messages, prefix = prepare_answer(question)
+        debug = debug_info(retrieved)
+        yield sse_event({
+            "type": "citations",
+            "used_rag": used_rag,
+            "doc_ids": debug["doc_ids"] if used_rag else [],
+            "debug": debug
+        })
+
+        cache_key = answer_cache_key(question, retrieved, used_rag)
+        answer = answer_cache.get(cache_key)
+        if answer is not None:
+            yield sse_event({"type": "token", "content": answer})
+        else:
+            parts = [prefix]
+            if prefix:
+                yield sse_event({"type": "token", "content": prefix})
+            for piece in ollama_chat_stream(messages):
+                parts.append(piece)
+                yield sse_event({"type": "token", "content": piece})
+            answer = "".join(parts)
+            if answer:
+                answer_cache.put(cache_key, answer)
+
+        if used_rag:
+            answer = append_citations(answer, retrieved, used_rag)
+        conversation.append("assistant", answer)
+        chat_store.save(session_id)
+        yield sse_event({"type": "done", "answer": answer, "used_rag": used_rag})
+    except Exception as e:
+        yield sse_event({"type": "error", "error": f'RAG回答异常: {str(e)}'})
+
+@csrf_exempt
+@require_POST
+def get_answer_rag_stream_view(request):
+    """使用RAG系统回答问题（SSE 流式输出）"""
+    if not is_rag_ready():
+        return _not_ready_response()
+    try:
+        data = json.loads(request.body or '{}')
+    except Exception:
+        data = {}
+    question = (data.get('question') or '').strip()
+    if not question:
+        return JsonResponse({'error': 'Empty question'}, status=400)
+
+    session_id = session_id_for(request, data)
+    conversation = chat_store.get(session_id)
+    conversation.append("user", question)
+
+    response = StreamingHttpResponse(
+        _answer_rag_stream(session_id, conversation, question),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@require_GET
+def rag_cache_stats_view(request):
+    """查看查询向量缓存与答案缓存的命中率统计"""
+    return JsonResponse({
+        'success': True,
+        'embedding_cache': emb_cache.stats(),
+        'answer_cache': answer_cache.stats(),
+    })
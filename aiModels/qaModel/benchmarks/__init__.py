@@ -0,0 +1 @@
+# qaModel benchmarks
@@ -0,0 +1,138 @@
+"""
+向量编码后端基准测试
+
+对比各后端（torch / torch_int8 / onnx_int8）在农业知识库上的：
+- 模型加载耗时
+- 语料编码吞吐（docs/sec）
+- 单条查询编码延迟（p50 / p95，毫秒）
+- 相似度漂移：与基线后端同一文档向量的余弦相似度（均值 / 最小值），
+  以及用问题检索时 top-k 结果与基线的重合率
+
+用法（在项目根目录执行）：
+    python -m aiModels.qaModel.benchmarks.embedder_bench --backends torch,torch_int8,onnx_int8 --threads 4
+结果以 JSON 输出到标准输出，可用 --out 写入文件。
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+
+def _setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    import django
+    django.setup()
+
+
+def _percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 2) if samples else None
+
+
+def _topk(corpus_emb, query_emb, k):
+    scores = query_emb @ corpus_emb.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def bench_backend(backend, model_name, texts, queries, threads, batch_size):
+    from aiModels.qaModel.embedders import backend_of, create_embedder
+
+    t0 = time.perf_counter()
+    embedder = create_embedder(model_name, backend, threads)
+    load_s = time.perf_counter() - t0
+    actual = backend_of(embedder) or backend
+
+    # 预热，排除首批次的初始化开销
+    embedder.encode(texts[:8], convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+
+    t0 = time.perf_counter()
+    corpus_emb = embedder.encode(texts, batch_size=batch_size, convert_to_numpy=True,
+                                 normalize_embeddings=True, show_progress_bar=False)
+    encode_s = time.perf_counter() - t0
+
+    latencies = []
+    query_emb = []
+    for q in queries:
+        t0 = time.perf_counter()
+        query_emb.append(embedder.encode([q], convert_to_numpy=True, normalize_embeddings=True,
+                                         show_progress_bar=False)[0])
+        latencies.append(time.perf_counter() - t0)
+
+    result = {
+        "backend": actual,
+        "requested_backend": backend,
+        "load_seconds": round(load_s, 2),
+        "docs": len(texts),
+        "docs_per_sec": round(len(texts) / max(encode_s, 1e-9), 1),
+        "query_p50_ms": _percentile_ms(latencies, 50),
+        "query_p95_ms": _percentile_ms(latencies, 95),
+    }
+    return result, np.asarray(corpus_emb, dtype=np.float32), np.asarray(query_emb, dtype=np.float32)
+
+
+def drift(base_corpus, base_query, corpus, query, k):
+    """相对基线的漂移：逐文档余弦相似度 + 检索 top-k 重合率。"""
+    cos = np.sum(base_corpus * corpus, axis=1)
+    base_top = _topk(base_corpus, base_query, k)
+    cand_top = _topk(corpus, query, k)
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(base_top, cand_top)]
+    return {
+        "cosine_mean": round(float(cos.mean()), 5),
+        "cosine_min": round(float(cos.min()), 5),
+        f"top{k}_overlap": round(float(np.mean(overlap)), 4),
+        "top1_agreement": round(float(np.mean(base_top[:, 0] == cand_top[:, 0])), 4),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="向量编码后端基准测试")
+    parser.add_argument("--backends", default="torch,torch_int8,onnx_int8",
+                        help="逗号分隔的后端列表，第一个作为漂移比较的基线")
+    parser.add_argument("--threads", type=int, default=0, help="推理线程数（0=默认）")
+    parser.add_argument("--limit", type=int, default=2000, help="最多使用的文档数（0=全部）")
+    parser.add_argument("--queries", type=int, default=200, help="查询延迟采样数")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--k", type=int, default=5, help="检索重合率的 top-k")
+    parser.add_argument("--out", help="结果 JSON 输出文件")
+    args = parser.parse_args(argv)
+
+    _setup_django()
+    from aiModels.qaModel import RAG
+
+    docs = RAG.load_docs()
+    if args.limit:
+        docs = docs[:args.limit]
+    if not docs:
+        print("知识库为空", file=sys.stderr)
+        return 1
+    texts = [d["text"] for d in docs]
+    # 用知识库中的问题作为查询
+    queries = [d["instruction"] for d in docs if d["instruction"]][:args.queries]
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    report = {"model": RAG.EMB_MODEL_NAME, "threads": args.threads, "results": []}
+    base = None
+    for backend in backends:
+        print(f"[bench] {backend} ...", file=sys.stderr)
+        result, corpus_emb, query_emb = bench_backend(
+            backend, RAG.EMB_MODEL_NAME, texts, queries, args.threads, args.batch_size)
+        if base is None:
+            base = (corpus_emb, query_emb)
+            result["baseline"] = True
+        else:
+            result["drift"] = drift(base[0], base[1], corpus_emb, query_emb, args.k)
+        report["results"].append(result)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+混合检索融合/过滤开销基准测试
+
+对比 hybrid_search 当前实现（倒排 BM25 + NumPy 融合 + 预计算词集合）与旧版实现
+（rank_bm25 全量打分 + dict 融合 + 每次查询重新分词）在编码器之外的单次查询开销：
+- 查询向量预先写入 RAG.emb_cache，计时不包含编码器
+- 语料向量使用随机单位向量（不影响融合/过滤开销）
+- FAISS 暴力检索耗时与语料规模成正比、两种实现相同，单独给出；overhead_us = 总耗时 - FAISS 检索
+- 校验新旧实现返回的文档 id 是否一致（同分文档位于截断边界时可能出现少量差异）
+
+用法（在项目根目录执行）：
+    python -m aiModels.qaModel.benchmarks.fusion_bench --synthetic 50000 --queries 500
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from math import ceil
+
+import numpy as np
+
+
+def _setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    import django
+    django.setup()
+
+
+def legacy_hybrid_search(RAG, bm25, query, top_k, alpha):
+    """旧版实现（rank_bm25 全量打分 + dict 融合 + overlap_ok 中逐条重新分词），仅作基线对比。"""
+    snap = RAG.get_active_index()
+    docs, index = snap.docs, snap.index
+
+    def minmax_norm(d):
+        if not d:
+            return d
+        vals = np.array(list(d.values()), dtype=float)
+        lo, hi = float(vals.min()), float(vals.max())
+        if abs(hi - lo) < 1e-12:
+            return {k: (0.0 if abs(hi) < 1e-12 else 1.0) for k in d}
+        return {k: (v - lo) / (hi - lo) for k, v in d.items()}
+
+    q_emb = RAG.encode_query(query)
+    D, I = index.search(q_emb, max(top_k, 10))
+    vec_scores = {}
+    for i, s in zip(I[0], D[0]):
+        i, s = int(i), float(s)
+        if i >= 0 and s > 0.0 and ((i not in vec_scores) or s > vec_scores[i]):
+            vec_scores[i] = s
+
+    bm_list = bm25.get_scores(RAG.tokenize(query))
+    bm_scores = {}
+    for i in np.argsort(bm_list)[::-1]:
+        score = float(bm_list[i])
+        if score <= 0.0:
+            break
+        bm_scores[int(i)] = score
+        if len(bm_scores) >= max(top_k, 10):
+            break
+    if not vec_scores and not bm_scores:
+        return []
+
+    if RAG.USE_CHANNEL_QUOTA:
+        vec_quota = ceil(top_k * RAG.VEC_QUOTA_FRACTION)
+        vec_scores = dict(sorted(vec_scores.items(), key=lambda x: x[1], reverse=True)[:vec_quota])
+        bm_scores = dict(sorted(bm_scores.items(), key=lambda x: x[1], reverse=True)[:top_k - vec_quota])
+    vec_n, bm_n = minmax_norm(vec_scores), minmax_norm(bm_scores)
+    merged = [(i, alpha * vec_n.get(i, 0.0) + (1 - alpha) * bm_n.get(i, 0.0)) for i in set(vec_n) | set(bm_n)]
+    merged.sort(key=lambda x: x[1], reverse=True)
+
+    if RAG.USE_OVERLAP_FILTER:
+        qtok = RAG.tokenize(query)
+
+        def overlap_ok(doc_ins):
+            ins_tok = RAG.tokenize(doc_ins)
+            if len(set(qtok) & set(ins_tok)) < RAG.MIN_COMMON_TOKENS:
+                return False
+            return RAG.jaccard(qtok, ins_tok) >= RAG.MIN_JACCARD
+
+        filtered = [(i, s) for (i, s) in merged if overlap_ok(docs[i]["instruction"])]
+        if filtered:
+            merged = filtered
+    return [{"score": s, "doc": docs[i]} for i, s in merged[:top_k]]
+
+
+def synthetic_docs(n, seed=0):
+    """生成农业问答风格的合成语料（空格分隔短语，便于 BM25 / 重叠过滤命中）。"""
+    rng = random.Random(seed)
+    crops = ["柑橘", "水稻", "小麦", "玉米", "番茄", "苹果", "茶叶", "大豆"]
+    topics = ["病害", "虫害", "施肥", "灌溉", "修剪", "采收", "储藏", "育苗", "土壤", "气候"]
+    verbs = ["如何", "防治", "识别", "管理", "预防", "处理", "选择", "提高"]
+    words = [f"术语{i}" for i in range(2000)]
+    docs = []
+    for i in range(n):
+        ins = " ".join([rng.choice(crops), rng.choice(topics), rng.choice(verbs)] + rng.sample(words, 3))
+        out = " ".join(rng.sample(words, 20))
+        docs.append({"id": i, "instruction": ins, "input": "", "output": out,
+                     "text": f"问题：{ins}\n补充：\n答案：{out}"})
+    return docs
+
+
+def _pct(samples, q):
+    return round(float(np.percentile(samples, q)) * 1e6, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="混合检索融合/过滤开销基准测试")
+    parser.add_argument("--synthetic", type=int, default=0, help="使用 N 条合成文档（0=使用知识库）")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=384, help="随机向量维度")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--out", help="结果 JSON 输出文件")
+    args = parser.parse_args(argv)
+
+    _setup_django()
+    import faiss
+    from rank_bm25 import BM25Okapi
+    from aiModels.qaModel import RAG
+    from aiModels.qaModel.fusion import BM25Index, TokenSetIndex
+
+    docs = synthetic_docs(args.synthetic) if args.synthetic else RAG.load_docs()
+    if not docs:
+        print("知识库为空，请使用 --synthetic", file=sys.stderr)
+        return 1
+
+    rng = np.random.default_rng(0)
+    emb = rng.standard_normal((len(docs), args.dim)).astype(np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    index = faiss.IndexFlatIP(args.dim)
+    index.add(emb)
+    corpus_tokens = [RAG.tokenize(d["text"]) for d in docs]
+    legacy_bm25 = BM25Okapi(corpus_tokens)
+    RAG._swap_index(RAG.RagIndex(
+        docs=docs, embedder=None, index=index, bm25=BM25Index(corpus_tokens), built_at=time.time(),
+        ins_tokens=TokenSetIndex(RAG.tokenize(d["instruction"]) for d in docs),
+    ))
+
+    # 查询：取文档问题并预先写入查询向量缓存（计时不含编码器）
+    queries = [docs[i]["instruction"] for i in rng.choice(len(docs), size=min(args.queries, len(docs)), replace=False)]
+    for q in queries:
+        q_emb = rng.standard_normal((1, args.dim)).astype(np.float32)
+        RAG.emb_cache.put(q, q_emb / np.linalg.norm(q_emb))
+
+    faiss_t, legacy_t, new_t = [], [], []
+    mismatches = 0
+    for q in queries:
+        q_emb = RAG.encode_query(q)
+        t0 = time.perf_counter()
+        index.search(q_emb, max(args.top_k, 10))
+        faiss_t.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        old = legacy_hybrid_search(RAG, legacy_bm25, q, args.top_k, RAG.ALPHA)
+        legacy_t.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        new = RAG.hybrid_search(q, top_k=args.top_k, alpha=RAG.ALPHA)
+        new_t.append(time.perf_counter() - t0)
+
+        if {r["doc"]["id"] for r in old} != {r["doc"]["id"] for r in new}:
+            mismatches += 1
+
+    faiss_arr = np.array(faiss_t)
+    report = {
+        "docs": len(docs),
+        "queries": len(queries),
+        "faiss_search_us_p50": _pct(faiss_t, 50),
+        "legacy": {"total_us_p50": _pct(legacy_t, 50), "total_us_p95": _pct(legacy_t, 95),
+                   "overhead_us_p50": _pct(np.array(legacy_t) - faiss_arr, 50)},
+        "vectorized": {"total_us_p50": _pct(new_t, 50), "total_us_p95": _pct(new_t, 95),
+                       "overhead_us_p50": _pct(np.array(new_t) - faiss_arr, 50)},
+        "result_mismatches": mismatches,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
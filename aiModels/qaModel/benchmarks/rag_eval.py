@@ -0,0 +1,210 @@
+"""
+RAG 检索效果与延迟评测
+
+将一组问题依次送入 retrieve 与 answer_with_rag_or_plain（Ollama 替换为本地桩服务），输出 JSON：
+- recall@k：前 k 条命中中包含任一相关文档的比例
+- MRR：首个相关文档排名倒数的均值（未命中记 0）
+- 门控通过率：is_evidence_sufficient 为真（使用 RAG 而非纯 LLM 回退）的比例
+- 各阶段 p50/p95 延迟（毫秒）：encode / faiss / bm25 / fusion / rerank（启用重排时） / retrieve / prompt_build / answer
+- 当前配置（TOP_K、ALPHA、门控阈值、配额/重叠开关等）与 git 提交号，便于跨提交对比
+
+问题集（--questions）：JSON 数组或 JSONL，每项 {"question": "...", "relevant_ids": [id, ...]}。
+未指定时从知识库抽样，以原问题作为查询、自身 id 作为相关文档（只能反映检索上限，建议使用独立问题集）。
+
+用法（在项目根目录执行）：
+    python -m aiModels.qaModel.benchmarks.rag_eval --questions eval.jsonl --set TOP_K=3 --set ALPHA=0.5
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+CONFIG_KEYS = (
+    "TOP_K", "ALPHA", "MAX_CTX_TOKENS", "MIN_DOCS", "MIN_BEST_SCORE", "MIN_ANY_OUTPUT_CHARS",
+    "USE_CHANNEL_QUOTA", "USE_OVERLAP_FILTER", "VEC_QUOTA_FRACTION", "MIN_JACCARD", "MIN_COMMON_TOKENS",
+    "TOKENIZER", "EMB_BACKEND", "USE_RERANK", "RERANK_TOP_K", "MIN_RERANK_SCORE",
+)
+STAGES = ("encode", "faiss", "bm25", "fusion", "rerank", "retrieve", "prompt_build", "answer")
+
+
+def _setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    import django
+    django.setup()
+
+
+def start_ollama_stub(delay_ms: float = 0.0):
+    """本地 Ollama 桩服务：/api/chat 固定返回一段带 <think> 的回答，可模拟生成耗时。"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            self.rfile.read(length)
+            if delay_ms:
+                time.sleep(delay_ms / 1000.0)
+            body = json.dumps({
+                "model": "stub",
+                "message": {"role": "assistant", "content": "<think>stub</think>桩服务回答。"},
+                "done": True,
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def load_questions(path, docs, sample, seed):
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read().strip()
+        items = json.loads(text) if text.startswith("[") else [json.loads(line) for line in text.splitlines() if line.strip()]
+        return [{"question": it["question"], "relevant_ids": [str(i) for i in it.get("relevant_ids", [])]}
+                for it in items]
+    rng = random.Random(seed)
+    pool = [d for d in docs if d["instruction"]]
+    picked = rng.sample(pool, min(sample, len(pool)))
+    return [{"question": d["instruction"], "relevant_ids": [str(d["id"])]} for d in picked]
+
+
+def apply_overrides(RAG, overrides):
+    for item in overrides:
+        key, _, raw = item.partition("=")
+        key = key.strip()
+        if not hasattr(RAG, key):
+            raise SystemExit(f"未知配置项: {key}")
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        setattr(RAG, key, value)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def _latency(samples):
+    if not samples:
+        return None
+    arr = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(arr, 50)), 3),
+            "p95_ms": round(float(np.percentile(arr, 95)), 3),
+            "mean_ms": round(float(arr.mean()), 3)}
+
+
+def evaluate(RAG, questions, k, alpha):
+    stage_samples = {s: [] for s in STAGES}
+    hits, rr, gate_pass, used_rag = 0, 0.0, 0, 0
+
+    for item in questions:
+        q, relevant = item["question"], set(item["relevant_ids"])
+
+        timings = {}
+        t0 = time.perf_counter()
+        retrieved = RAG.retrieve(q, k, alpha, timings=timings)
+        stage_samples["retrieve"].append(time.perf_counter() - t0)
+        for stage in ("encode", "faiss", "bm25", "fusion", "rerank"):
+            if stage in timings:
+                stage_samples[stage].append(timings[stage])
+
+        ranked = [str(r["doc"]["id"]) for r in retrieved]
+        rank = next((i + 1 for i, doc_id in enumerate(ranked) if doc_id in relevant), None)
+        if rank is not None:
+            hits += 1
+            rr += 1.0 / rank
+
+        if RAG.is_evidence_sufficient(retrieved):
+            gate_pass += 1
+            t0 = time.perf_counter()
+            RAG.build_prompt(q, retrieved)
+            stage_samples["prompt_build"].append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        _, _, rag_used, _ = RAG.answer_with_rag_or_plain(q, k=k, alpha=alpha)
+        stage_samples["answer"].append(time.perf_counter() - t0)
+        used_rag += int(bool(rag_used))
+
+    n = max(len(questions), 1)
+    return {
+        "questions": len(questions),
+        f"recall@{k}": round(hits / n, 4),
+        "mrr": round(rr / n, 4),
+        "gate_pass_rate": round(gate_pass / n, 4),
+        "answer_used_rag_rate": round(used_rag / n, 4),
+        "latency": {s: _latency(v) for s, v in stage_samples.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RAG 检索效果与延迟评测")
+    parser.add_argument("--questions", help="问题集文件（JSON 数组或 JSONL）")
+    parser.add_argument("--sample", type=int, default=200, help="未指定问题集时从知识库抽样的数量")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--set", dest="overrides", action="append", default=[],
+                        help="覆盖 RAG 配置，如 --set TOP_K=3 --set USE_OVERLAP_FILTER=false")
+    parser.add_argument("--llm-delay-ms", type=float, default=0.0, help="桩服务模拟的生成耗时")
+    parser.add_argument("--out", help="结果 JSON 输出文件")
+    args = parser.parse_args(argv)
+
+    _setup_django()
+    from aiModels.qaModel import RAG
+    from aiModels.qaModel.llm_client import get_llm_client
+
+    apply_overrides(RAG, args.overrides)
+
+    # Ollama 替换为本地桩服务
+    server, stub_url = start_ollama_stub(args.llm_delay_ms)
+    RAG.get_llm_client = lambda: get_llm_client(stub_url)
+
+    t0 = time.perf_counter()
+    RAG._swap_index(RAG.build_index_snapshot())
+    build_s = time.perf_counter() - t0
+    RAG.invalidate_answer_cache()
+
+    snap = RAG.get_active_index()
+    questions = load_questions(args.questions, snap.docs, args.sample, args.seed)
+    try:
+        result = evaluate(RAG, questions, RAG.TOP_K, RAG.ALPHA)
+    finally:
+        server.shutdown()
+
+    report = {
+        "commit": _git_commit(),
+        "config": {key: getattr(RAG, key, None) for key in CONFIG_KEYS},
+        "docs": len(snap.docs),
+        "index_build_seconds": round(build_s, 2),
+        "question_source": args.questions or f"knowledge_sample:{len(questions)}",
+        **result,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
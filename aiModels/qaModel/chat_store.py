@@ -0,0 +1,215 @@
+"""
+aiModels.qaModel.chat_store
+
+按会话隔离的对话历史存储（替代模块级 chat_history 列表）：
+- **Conversation**：单个会话，deque 存消息并维护字符数累计值，超长时从最旧消息开始弹出（均摊 O(1)）
+- **ConversationStore**：session_id → Conversation 的 LRU，超过 max_sessions 淘汰最久未用的会话
+- **持久化（可选）**：settings.CHAT_HISTORY_DIR 配置后，每轮对话结束写入 JSON 文件，会话被淘汰或进程重启后可恢复
+
+说明：
+- 首条身份设定 system 消息固定保留，不参与淘汰
+- session_id 取自请求头 X-Chat-Session / 请求体 session_id，否则使用 Django session
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+MAX_SESSIONS = 1000          # 内存中最多保留的会话数
+MAX_CONTEXT_CHARS = 11000    # 单个会话上下文字符上限（约 8K tokens）
+
+
+def fit_messages(messages: List[Dict[str, str]], max_chars: int = MAX_CONTEXT_CHARS) -> List[Dict[str, str]]:
+    """一次遍历裁剪消息列表：总长度超限时从头部丢弃，保留首条 system。"""
+    total = sum(len(m.get("content") or "") for m in messages)
+    head = 1 if messages and messages[0].get("role") == "system" else 0
+    start = head
+    while total > max_chars and start < len(messages) - 1:
+        total -= len(messages[start].get("content") or "")
+        start += 1
+    return messages[:head] + messages[start:]
+
+
+class Conversation:
+    """单个会话的消息历史。"""
+
+    def __init__(self, max_chars: int = MAX_CONTEXT_CHARS) -> None:
+        self.max_chars = max_chars
+        self.system: Optional[Dict[str, str]] = None
+        self._messages: deque = deque()
+        self.chars = 0
+        self._lock = threading.Lock()
+
+    def ensure_system(self, content: str) -> bool:
+        """设置固定的身份 system 消息；已存在时不重复插入，返回是否新插入。"""
+        with self._lock:
+            if self.system is not None:
+                return False
+            self.system = {"role": "system", "content": content}
+            self.chars += len(content)
+            self._trim()
+            return True
+
+    def append(self, role: str, content: str) -> None:
+        content = content or ""
+        with self._lock:
+            self._messages.append({"role": role, "content": content})
+            self.chars += len(content)
+            self._trim()
+
+    def _trim(self) -> None:
+        # 保留最新一条消息，其余从最旧开始弹出
+        while self.chars > self.max_chars and len(self._messages) > 1:
+            old = self._messages.popleft()
+            self.chars -= len(old["content"])
+
+    def messages(self) -> List[Dict[str, str]]:
+        """返回副本（含固定 system），可直接发送给模型。"""
+        with self._lock:
+            head = [dict(self.system)] if self.system else []
+            return head + [dict(m) for m in self._messages]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.system = None
+            self._messages.clear()
+            self.chars = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"system": self.system, "messages": list(self._messages)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], max_chars: int = MAX_CONTEXT_CHARS) -> "Conversation":
+        conv = cls(max_chars=max_chars)
+        if data.get("system"):
+            conv.ensure_system(data["system"].get("content") or "")
+        for m in data.get("messages") or []:
+            conv.append(m.get("role", "user"), m.get("content", ""))
+        return conv
+
+
+class ConversationStore:
+    """session_id → Conversation，LRU 限制会话数，可选文件持久化。"""
+
+    def __init__(self,
+                 namespace: str,
+                 max_sessions: int = MAX_SESSIONS,
+                 max_chars: int = MAX_CONTEXT_CHARS,
+                 persist_dir: Optional[Path] = None) -> None:
+        self.namespace = namespace
+        self.max_sessions = max_sessions
+        self.max_chars = max_chars
+        self.persist_dir = Path(persist_dir) / namespace if persist_dir else None
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _path(self, session_id: str) -> Path:
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+        return self.persist_dir / f"{digest}.json"
+
+    def _load(self, session_id: str) -> Optional[Conversation]:
+        if not self.persist_dir:
+            return None
+        path = self._path(session_id)
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return Conversation.from_dict(json.load(f), max_chars=self.max_chars)
+        except Exception as e:
+            print(f"[ChatStore] 读取会话失败 {path}: {e}")
+            return None
+
+    def get(self, session_id: str) -> Conversation:
+        """获取会话（不存在则从持久化恢复或新建）"""
+        with self._lock:
+            conv = self._sessions.get(session_id)
+            if conv is not None:
+                self._sessions.move_to_end(session_id)
+                return conv
+            conv = self._load(session_id) or Conversation(max_chars=self.max_chars)
+            self._sessions[session_id] = conv
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+            return conv
+
+    def save(self, session_id: str) -> None:
+        """写入持久化文件（未配置持久化目录时不做任何事）"""
+        if not self.persist_dir:
+            return
+        with self._lock:
+            conv = self._sessions.get(session_id)
+        if conv is None:
+            return
+        path = self._path(session_id)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(conv.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"[ChatStore] 保存会话失败 {path}: {e}")
+
+    def clear(self, session_id: str) -> Conversation:
+        conv = self.get(session_id)
+        conv.clear()
+        self.save(session_id)
+        return conv
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "namespace": self.namespace,
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "evictions": self.evictions,
+                "persist": bool(self.persist_dir),
+            }
+
+
+# 全局实例（按用途区分命名空间：deepseek / spark）
+_stores: Dict[str, ConversationStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_chat_store(namespace: str) -> ConversationStore:
+    """获取对话历史存储单例"""
+    with _stores_lock:
+        store = _stores.get(namespace)
+        if store is None:
+            store = _stores[namespace] = ConversationStore(
+                namespace,
+                max_sessions=getattr(settings, "CHAT_MAX_SESSIONS", MAX_SESSIONS),
+                persist_dir=getattr(settings, "CHAT_HISTORY_DIR", None),
+            )
+        return store
+
+
+def session_id_for(request, payload: Optional[Dict[str, Any]] = None) -> str:
+    """
+    解析会话标识：
+    1) 请求头 X-Chat-Session 或请求体 session_id（前端显式指定）
+    2) Django session（同源页面自动携带 cookie）
+    3) 兜底：客户端 IP
+    """
+    sid = request.headers.get("X-Chat-Session") or (payload or {}).get("session_id")
+    if sid:
+        return str(sid)[:128]
+    try:
+        if not request.session.session_key:
+            request.session.save()
+        return request.session.session_key
+    except Exception:
+        return f"ip:{request.META.get('REMOTE_ADDR', 'unknown')}"
@@ -0,0 +1,141 @@
+"""
+aiModels.qaModel.context_packer
+
+RAG 上下文打包（按 token 预算）：
+- **count_tokens**：优先使用模型对应的分词器计数（transformers），不可用时按中英文字符估算
+- **pack_context**：去除近似重复的答案后，按 得分/长度 贪心装入整条文档，不在文档中间截断
+
+说明：
+- deepseek-r1:1.5b 基于 DeepSeek-R1-Distill-Qwen-1.5B，分词器与其一致
+- 得分最高的文档优先装入，其余按性价比（score / tokens）填满预算
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 与 Ollama 模型 deepseek-r1:1.5b 对应的 HuggingFace 分词器
+TOKENIZER_NAME = "deepseek-ai/DeepSeek-R1-Distill-Qwen-1.5B"
+DEDUP_JACCARD = 0.85   # 两条答案字符 3-gram 的 Jaccard 超过该值视为近似重复
+
+_CJK_RE = re.compile(r"[\u4e00-\u9fff\u3000-\u303f\uff00-\uffef]")
+_NORM_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+_SENT_END_RE = re.compile(r"[。！？!?；;\n]")
+
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+
+def _get_tokenizer():
+    """懒加载分词器；transformers 未安装或模型无法获取时返回 None。"""
+    global _tokenizer, _tokenizer_loaded
+    if _tokenizer_loaded:
+        return _tokenizer
+    with _tokenizer_lock:
+        if not _tokenizer_loaded:
+            try:
+                from transformers import AutoTokenizer
+                _tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_NAME)
+            except Exception as e:
+                print(f"[ContextPacker] 分词器加载失败，改用字符估算: {e}")
+                _tokenizer = None
+            _tokenizer_loaded = True
+    return _tokenizer
+
+
+def estimate_tokens(text: str) -> int:
+    """无分词器时的估算：中文（含全角标点）约 1 字 1 token，其余约 4 字符 1 token。"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    tok = _get_tokenizer()
+    if tok is None:
+        return estimate_tokens(text)
+    return len(tok.encode(text, add_special_tokens=False))
+
+
+def _shingles(text: str, n: int = 3) -> frozenset:
+    s = _NORM_RE.sub("", (text or "").lower())
+    if len(s) <= n:
+        return frozenset([s]) if s else frozenset()
+    return frozenset(s[i:i + n] for i in range(len(s) - n + 1))
+
+
+def _near_duplicate(a: frozenset, b: frozenset, threshold: float) -> bool:
+    if not a or not b:
+        return a == b
+    return len(a & b) / len(a | b) >= threshold
+
+
+def dedup_retrieved(retrieved: List[Dict[str, Any]], threshold: float = DEDUP_JACCARD) -> List[Dict[str, Any]]:
+    """按得分从高到低保留，答案与已保留条目近似重复的丢弃。"""
+    kept: List[Tuple[Dict[str, Any], frozenset]] = []
+    for r in sorted(retrieved, key=lambda x: x["score"], reverse=True):
+        sh = _shingles(r["doc"].get("output") or r["doc"].get("text") or "")
+        if any(_near_duplicate(sh, k_sh, threshold) for _, k_sh in kept):
+            continue
+        kept.append((r, sh))
+    return [r for r, _ in kept]
+
+
+def _truncate_at_sentence(block: str, budget: int, counter: Callable[[str], int]) -> str:
+    """单条文档已超出全部预算时的兜底：在预算内的最后一个句末处截断。"""
+    cut = ""
+    for m in _SENT_END_RE.finditer(block):
+        candidate = block[:m.end()]
+        if counter(candidate) > budget:
+            break
+        cut = candidate
+    return cut.strip()
+
+
+def pack_context(retrieved: List[Dict[str, Any]],
+                 format_block: Callable[[Dict[str, Any]], str],
+                 budget_tokens: int,
+                 counter: Optional[Callable[[str], int]] = None,
+                 dedup_threshold: float = DEDUP_JACCARD) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    在 token 预算内装入整条文档。
+    返回：(按得分排序的上下文块列表, 统计信息)
+    """
+    counter = counter or count_tokens
+    candidates = dedup_retrieved(retrieved, dedup_threshold)
+    sized = [(r, format_block(r)) for r in candidates]
+    sized = [(r, block, max(1, counter(block))) for r, block in sized]
+
+    chosen: List[Tuple[Dict[str, Any], str, int]] = []
+    used = 0
+    if sized:
+        # 得分最高者优先；其余按 得分/长度 贪心
+        rest = sorted(sized[1:], key=lambda x: x[0]["score"] / x[2], reverse=True)
+        for item in [sized[0]] + rest:
+            if used + item[2] <= budget_tokens:
+                chosen.append(item)
+                used += item[2]
+
+    if not chosen and sized:
+        r, block, _ = sized[0]
+        block = _truncate_at_sentence(block, budget_tokens, counter)
+        if block:
+            chosen.append((r, block, counter(block)))
+            used = chosen[0][2]
+
+    chosen.sort(key=lambda x: x[0]["score"], reverse=True)
+    stats = {
+        "candidates": len(retrieved),
+        "after_dedup": len(candidates),
+        "packed": len(chosen),
+        "tokens": used,
+        "budget": budget_tokens,
+        "doc_ids": [r["doc"]["id"] for r, _, _ in chosen],
+    }
+    return [block for _, block, _ in chosen], stats
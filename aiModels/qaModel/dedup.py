@@ -0,0 +1,169 @@
+"""
+aiModels.qaModel.dedup
+
+知识库语义去重（批处理）：
+- 直接复用 RAG 索引中已存储的向量（IndexFlatIP.reconstruct_n），不重新编码
+- 对全部向量分批做 FAISS range_search，找出余弦相似度 ≥ 阈值的文档对
+- 用并查集（路径压缩 + 按大小合并）把相似对聚成重复簇
+- 每簇保留一条代表（答案最长者，同长取最早的一条），其余为重复项
+- report 模式只输出簇；merge 模式在知识库中删除重复项（同一事务），随后后台重建索引
+
+说明：
+- 向量对应全文 text（问题+补充+答案），相似度高意味着问答整体近似，而非仅问题相同
+- 索引为最近一次构建的快照：构建后新增的条目不参与本次去重
+
+用法（在项目根目录执行）：
+    python -m aiModels.qaModel.dedup --threshold 0.95            # 仅报告
+    python -m aiModels.qaModel.dedup --threshold 0.95 --merge    # 删除重复项
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+DEDUP_THRESHOLD = 0.95    # 余弦相似度阈值（向量已单位化，内积即余弦）
+SEARCH_BATCH = 2048       # 每批 range_search 的查询向量数
+
+
+class UnionFind:
+    def __init__(self, n: int) -> None:
+        self.parent = np.arange(n)
+        self.size = np.ones(n, dtype=np.int64)
+
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return int(root)
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+
+
+def similar_pairs(index, vectors: np.ndarray, threshold: float = DEDUP_THRESHOLD, batch: int = SEARCH_BATCH):
+    """
+    以索引内的全部向量为查询做 range_search：返回 (i, j, sim) 三个数组，i < j。
+    """
+    rows, cols, sims = [], [], []
+    for start in range(0, len(vectors), batch):
+        lims, D, I = index.range_search(vectors[start:start + batch], threshold)
+        q = np.repeat(np.arange(start, start + len(lims) - 1), np.diff(lims.astype(np.int64)))
+        keep = I > q   # 去掉自身与重复方向
+        rows.append(q[keep])
+        cols.append(I[keep])
+        sims.append(D[keep])
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+    return np.concatenate(rows), np.concatenate(cols).astype(np.int64), np.concatenate(sims)
+
+
+def find_duplicate_clusters(snap, threshold: float = DEDUP_THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    对 RAG 索引快照做语义去重。
+    返回：重复簇列表（按簇大小降序），每簇：
+      { keep: 代表条目, duplicates: [{id, instruction, similarity}], size }
+    similarity 为重复项与代表的余弦相似度。
+    """
+    docs, index = snap.docs, snap.index
+    vectors = index.reconstruct_n(0, index.ntotal)
+    rows, cols, _ = similar_pairs(index, vectors, threshold)
+    uf = UnionFind(len(docs))
+    for i, j in zip(rows.tolist(), cols.tolist()):
+        uf.union(i, j)
+
+    members: Dict[int, List[int]] = {}
+    for i in np.unique(np.concatenate([rows, cols])).tolist():
+        members.setdefault(uf.find(i), []).append(i)
+
+    clusters = []
+    for group in members.values():
+        keep = max(group, key=lambda i: (len(docs[i]["output"]), -i))
+        others = [i for i in group if i != keep]
+        sims = vectors[others] @ vectors[keep]
+        clusters.append({
+            "size": len(group),
+            "keep": {"id": docs[keep]["id"], "instruction": docs[keep]["instruction"]},
+            "duplicates": [
+                {"id": docs[i]["id"], "instruction": docs[i]["instruction"], "similarity": round(float(s), 4)}
+                for i, s in sorted(zip(others, sims.tolist()), key=lambda x: -x[1])
+            ],
+        })
+    clusters.sort(key=lambda c: c["size"], reverse=True)
+    return clusters
+
+
+def run_dedup(threshold: float = DEDUP_THRESHOLD, merge: bool = False, snap=None,
+              rebuild: bool = True) -> Dict[str, Any]:
+    """
+    执行一次去重：snap 为空时使用当前服务中的索引（未就绪则同步构建一份）。
+    merge=True 时删除各簇的重复项；rebuild=True 时随后触发后台重建索引。
+    """
+    from . import RAG
+    from .knowledge_store import get_knowledge_store
+
+    if snap is None:
+        snap = RAG.get_active_index() or RAG.build_index_snapshot()
+    clusters = find_duplicate_clusters(snap, threshold)
+    duplicate_ids = [d["id"] for c in clusters for d in c["duplicates"]]
+
+    result = {
+        "threshold": threshold,
+        "docs": len(snap.docs),
+        "clusters": len(clusters),
+        "duplicates": len(duplicate_ids),
+        "merged": False,
+        "deleted": 0,
+        "items": clusters,
+    }
+    if merge and duplicate_ids:
+        result["deleted"] = get_knowledge_store().delete_many(duplicate_ids)
+        result["merged"] = True
+        RAG.invalidate_answer_cache()
+        if rebuild:
+            RAG.rag_builder.start()
+    return result
+
+
+def _setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    import django
+    django.setup()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="知识库语义去重")
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD, help="余弦相似度阈值")
+    parser.add_argument("--merge", action="store_true", help="删除重复项（默认仅报告）")
+    parser.add_argument("--out", help="结果 JSON 输出文件")
+    args = parser.parse_args(argv)
+
+    _setup_django()
+    from . import RAG
+    # 命令行进程不常驻，去重后不在此触发重建；服务端下次初始化时使用去重后的知识库
+    result = run_dedup(args.threshold, merge=args.merge, snap=RAG.build_index_snapshot(), rebuild=False)
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
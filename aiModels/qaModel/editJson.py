@@ -1,67 +1,102 @@
-from pathlib import Path
 import json
 
+import numpy as np
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_GET, require_http_methods
 
-# 数据文件路径：位于当前目录下的 agriculture_dat.json
-DATA_PATH = Path(__file__).parent / "agriculture_dat.json"
+from .knowledge_store import FIELDS, get_knowledge_store
 
+# 分页参数
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
-def _load_json_data():
-    """
-    读取本地 JSON 知识库，返回列表结构。
-    统一字段：id（若原始无则补 i），instruction, input, output。
-    """
-    if not DATA_PATH.exists():
-        raise FileNotFoundError(f"知识库文件不存在: {DATA_PATH}")
-
-    with open(DATA_PATH, 'r', encoding='utf-8') as f:
-        raw = json.load(f)
-
-    if not isinstance(raw, list):
-        raise ValueError("知识库 JSON 顶层必须是数组(list)")
-
-    data = []
-    for i, d in enumerate(raw):
-        if not isinstance(d, dict):
-            # 跳过非法项
-            continue
-        data.append({
-            "id": d.get("id", i),
-            "instruction": (d.get("instruction") or "").strip(),
-            "input": (d.get("input") or "").strip(),
-            "output": (d.get("output") or "").strip(),
-        })
-    return data
 
+def _on_knowledge_changed():
+    """知识库内容变更：作废 RAG 答案缓存（延迟导入，避免加载向量模型依赖）。"""
+    from . import RAG
+    RAG.invalidate_answer_cache()
 
-def _write_json_data(items):
-    """将标准化后的数据写回文件，保持为数组对象。"""
-    serializable = [{
-        "id": it.get("id"),
-        "instruction": it.get("instruction", ""),
-        "input": it.get("input", ""),
-        "output": it.get("output", ""),
-    } for it in items]
-    with open(DATA_PATH, 'w', encoding='utf-8') as f:
-        json.dump(serializable, f, ensure_ascii=False, indent=2)
+
+def _int_param(request, name, default, lo, hi):
+    try:
+        value = int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(lo, min(hi, value))
+
+
+def _bm25_search(query, offset, limit):
+    """
+    复用 RAG 已构建的 BM25 索引做关键字检索（按相关度排序）。
+    返回：(当前页条目, 命中总数)；索引未就绪或无命中时返回 None，由调用方回退到 LIKE 匹配。
+    注意：索引为最近一次构建的快照，构建后新增的条目不会出现在结果中。
+    """
+    try:
+        from . import RAG
+    except Exception:
+        return None
+    snap = RAG.get_active_index()
+    if snap is None:
+        return None
+    q_tokens = RAG.tokenize_query(query, snap.tokenizer)
+    if not q_tokens:
+        return None
+    ids, scores = snap.bm25.sparse_scores(q_tokens)
+    order = np.argsort(-scores, kind="stable")
+    hit_idx = ids[order][scores[order] > 0]
+    if hit_idx.size == 0:
+        return None
+    page_ids = [snap.docs[i]["id"] for i in hit_idx[offset:offset + limit]]
+    # 从存储读取当前内容（已删除的条目自动跳过）
+    return get_knowledge_store().get_many(page_ids), int(hit_idx.size)
 
 
 @csrf_exempt
 @require_GET
 def get_knowledge_data_view(request):
     """GET /knowledge/data
-    返回 agriculture_dat.json 的标准化数据结构：
-    { success: true, data: [...] }
+    查询参数：
+    - page：页码（从 1 开始，默认 1）
+    - page_size：每页条数（默认 50，最大 500）
+    - q：关键字（空格分隔）；RAG 索引就绪时按 BM25 相关度检索，否则按子串匹配
+    - fields：返回字段，逗号分隔（如 id,instruction），默认全部
+    返回：
+    { success: true, data: [...], total, page, page_size, pages, search }
     失败时：{ success: false, error: "..." }
     """
     try:
-        data = _load_json_data()
+        store = get_knowledge_store()
+        page = _int_param(request, "page", 1, 1, 10 ** 9)
+        page_size = _int_param(request, "page_size", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        offset = (page - 1) * page_size
+        query = (request.GET.get("q") or "").strip()
+
+        search = None
+        if query:
+            result = _bm25_search(query, offset, page_size)
+            search = "bm25"
+            if result is None:
+                result = store.search_like(query.split(), offset, page_size)
+                search = "like"
+            data, total = result
+        else:
+            data, total = store.page(offset, page_size), store.count()
+
+        fields = [f.strip() for f in (request.GET.get("fields") or "").split(",") if f.strip() in FIELDS]
+        if fields:
+            if "id" not in fields:
+                fields.insert(0, "id")
+            data = [{k: it[k] for k in fields} for it in data]
+
         return JsonResponse({
             "success": True,
             "data": data,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "pages": (total + page_size - 1) // page_size,
+            "search": search,
         })
     except Exception as e:
         return JsonResponse({
@@ -75,7 +110,7 @@ def get_knowledge_data_view(request):
 def delete_knowledge_item_view(request):
     """POST/DELETE /knowledge/delete
     Body: { id: number|string }
-    按 id 删除对应记录并写回文件。
+    按 id 删除对应记录（索引删除，不再整文件重写）。
     返回：{ success:true, deleted: id, total: n }
     """
     try:
@@ -87,20 +122,13 @@ def delete_knowledge_item_view(request):
         if del_id is None:
             return JsonResponse({"success": False, "error": "缺少 id"}, status=400)
 
-        data = _load_json_data()
-        # 将字符串数字与数字统一比较
-        def same_id(v):
-            try:
-                return str(v) == str(del_id)
-            except Exception:
-                return False
-        new_data = [it for it in data if not same_id(it.get('id'))]
-
-        if len(new_data) == len(data):
+        store = get_knowledge_store()
+        # 字符串数字与数字视为同一 id
+        if not store.delete(del_id):
             return JsonResponse({"success": False, "error": "未找到该 id"}, status=404)
 
-        _write_json_data(new_data)
-        return JsonResponse({"success": True, "deleted": del_id, "total": len(new_data)})
+        _on_knowledge_changed()
+        return JsonResponse({"success": True, "deleted": del_id, "total": store.count()})
     except Exception as e:
         return JsonResponse({"success": False, "error": str(e)}, status=500)
 
@@ -110,7 +138,7 @@ def delete_knowledge_item_view(request):
 def add_knowledge_item_view(request):
     """POST /knowledge/add
     Body: { instruction: string, input: string, output: string }
-    追加一条记录到 JSON 末尾，自动分配 id（取现有数值最大id+1）。
+    追加一条记录，自动分配 id（取现有数值最大id+1，与插入在同一事务中完成）。
     返回：{ success:true, item:{...}, total:n }
     """
     try:
@@ -121,26 +149,42 @@ def add_knowledge_item_view(request):
         if not instruction and not input_text and not output_text:
             return JsonResponse({"success": False, "error": "至少填写一个字段"}, status=400)
 
-        data = _load_json_data()
-        # 计算新ID：采用最大可解析为整数的 id + 1
-        max_id = -1
-        for it in data:
-            try:
-                v = int(str(it.get('id')))
-                if v > max_id:
-                    max_id = v
-            except Exception:
-                continue
-        new_id = max_id + 1 if max_id >= 0 else (len(data))
-
-        new_item = {
-            "id": new_id,
-            "instruction": instruction,
-            "input": input_text,
-            "output": output_text,
-        }
-        data.append(new_item)
-        _write_json_data(data)
-        return JsonResponse({"success": True, "item": new_item, "total": len(data)})
+        store = get_knowledge_store()
+        new_item = store.add(instruction, input_text, output_text)
+        _on_knowledge_changed()
+        return JsonResponse({"success": True, "item": new_item, "total": store.count()})
+    except Exception as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def dedup_knowledge_view(request):
+    """POST /knowledge/dedup
+    Body: { threshold?: number(0~1, 默认 0.95), merge?: bool }
+    基于 RAG 索引中的向量查找近似重复的问答簇；merge=true 时删除重复项（每簇保留一条）并后台重建索引。
+    返回：{ success:true, clusters:n, duplicates:n, deleted:n, items:[{keep, duplicates, size}], total:n }
+    """
+    try:
+        from . import RAG
+        from .dedup import DEDUP_THRESHOLD, run_dedup
+
+        try:
+            payload = json.loads(request.body.decode('utf-8') or '{}')
+        except Exception:
+            payload = {}
+        try:
+            threshold = float(payload.get('threshold', DEDUP_THRESHOLD))
+        except (TypeError, ValueError):
+            return JsonResponse({"success": False, "error": "threshold 必须为数字"}, status=400)
+        if not 0.5 <= threshold <= 1.0:
+            return JsonResponse({"success": False, "error": "threshold 取值范围为 0.5~1"}, status=400)
+
+        snap = RAG.get_active_index()
+        if snap is None:
+            return JsonResponse({"success": False, "error": "RAG索引未就绪，请先初始化知识库"}, status=400)
+
+        result = run_dedup(threshold, merge=bool(payload.get('merge')), snap=snap)
+        return JsonResponse({"success": True, **result, "total": get_knowledge_store().count()})
     except Exception as e:
         return JsonResponse({"success": False, "error": str(e)}, status=500)
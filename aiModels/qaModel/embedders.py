@@ -0,0 +1,137 @@
+"""
+aiModels.qaModel.embedders
+
+可插拔的句向量编码后端（CPU 推理优化）：
+- **torch**：原始 SentenceTransformer（FP32 PyTorch），作为基线
+- **torch_int8**：PyTorch 动态量化（Linear 层权重 int8），无需额外依赖
+- **onnx_int8**：导出 ONNX 并做 int8 动态量化，ONNX Runtime 推理（需要 optimum[onnxruntime]）
+
+说明：
+- 所有后端提供与 SentenceTransformer 一致的 encode(texts, convert_to_numpy, normalize_embeddings, ...) 接口，
+  RAG 中的调用无需修改
+- num_threads：推理使用的 intra-op 线程数（0 表示使用库默认值）
+- 所选后端的依赖不可用时，打印警告并回退到 torch
+- ONNX 量化模型缓存在 onnx_cache/ 目录下，仅首次使用时导出
+"""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+
+BACKENDS = ("torch", "torch_int8", "onnx_int8")
+ONNX_CACHE_DIR = Path(__file__).parent / "onnx_cache"
+MAX_SEQ_LENGTH = 128   # paraphrase-multilingual-MiniLM-L12-v2 的默认最大长度
+
+
+def _set_torch_threads(num_threads: int) -> None:
+    if num_threads > 0:
+        import torch
+        torch.set_num_threads(num_threads)
+
+
+def _load_torch(model_name: str, num_threads: int):
+    from sentence_transformers import SentenceTransformer
+    _set_torch_threads(num_threads)
+    model = SentenceTransformer(model_name, device="cpu")
+    model.backend_name = "torch"
+    return model
+
+
+def _load_torch_int8(model_name: str, num_threads: int):
+    import torch
+    model = _load_torch(model_name, num_threads)
+    # 动态量化：Linear 层权重转 int8，激活在推理时动态量化
+    torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    model.backend_name = "torch_int8"
+    return model
+
+
+class OnnxEmbedder:
+    """ONNX Runtime int8 编码器：mean pooling + L2 归一化，与原模型的池化方式一致。"""
+
+    backend_name = "onnx_int8"
+
+    def __init__(self, model_name: str, num_threads: int = 0, max_seq_length: int = MAX_SEQ_LENGTH) -> None:
+        import onnxruntime as ort
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.max_seq_length = max_seq_length
+        model_dir = self._ensure_quantized(model_name)
+
+        options = ort.SessionOptions()
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_dir, file_name="model_quantized.onnx", session_options=options
+        )
+
+    @staticmethod
+    def _ensure_quantized(model_name: str) -> Path:
+        """导出 ONNX 并做 int8 动态量化（结果缓存，已存在则直接复用）。"""
+        model_dir = ONNX_CACHE_DIR / re.sub(r"[^\w.-]+", "_", model_name)
+        if (model_dir / "model_quantized.onnx").exists():
+            return model_dir
+
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+
+        print(f"[Embedder] 导出并量化 ONNX 模型：{model_name} → {model_dir}")
+        model_dir.mkdir(parents=True, exist_ok=True)
+        ORTModelForFeatureExtraction.from_pretrained(model_name, export=True).save_pretrained(model_dir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(model_dir)
+        quantizer = ORTQuantizer.from_pretrained(model_dir)
+        qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=model_dir, quantization_config=qconfig)
+        return model_dir
+
+    def encode(self,
+               sentences: Union[str, List[str]],
+               batch_size: int = 32,
+               convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False,
+               show_progress_bar: bool = False,
+               **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        out = []
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            enc = self.tokenizer(batch, padding=True, truncation=True,
+                                 max_length=self.max_seq_length, return_tensors="np")
+            hidden = self.model(**enc).last_hidden_state
+            hidden = np.asarray(hidden, dtype=np.float32)
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            emb = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            out.append(emb)
+        emb = np.vstack(out) if out else np.zeros((0, 0), dtype=np.float32)
+        if normalize_embeddings and emb.size:
+            emb = emb / np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+        return emb.astype(np.float32)
+
+
+def create_embedder(model_name: str, backend: str = "torch", num_threads: int = 0):
+    """按名称创建编码后端；依赖不可用时回退到 torch。"""
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的向量编码后端: {backend}（可选：{', '.join(BACKENDS)}）")
+    try:
+        if backend == "onnx_int8":
+            return OnnxEmbedder(model_name, num_threads=num_threads)
+        if backend == "torch_int8":
+            return _load_torch_int8(model_name, num_threads)
+    except ImportError as e:
+        print(f"[Embedder] 后端 {backend} 依赖不可用，回退到 torch: {e}")
+    return _load_torch(model_name, num_threads)
+
+
+def backend_of(embedder) -> Optional[str]:
+    return getattr(embedder, "backend_name", None)
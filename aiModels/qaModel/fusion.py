@@ -0,0 +1,168 @@
+"""
+aiModels.qaModel.fusion
+
+混合检索的打分融合与过滤（NumPy 向量化）：
+- **BM25Index**：倒排表（CSR）形式的 BM25Okapi，构建时预计算每个 (词, 文档) 的权重，
+  查询只访问查询词的倒排链，不再对全部文档逐条查词频（打分与 rank_bm25.BM25Okapi 一致）
+- **TokenSetIndex**：索引构建时一次性把每条文档 instruction 的词集合编码为 CSR 数组（词表 id），
+  查询时对候选批量计算共有词数与 Jaccard，不再逐条重新分词
+- **top_positive**：BM25 分数用 argpartition 取前 n 个正分，避免全量排序
+- **minmax_norm**：数组版稳健归一化
+- **fuse**：两通道按 id 合并加权（np.unique + bincount），按融合分降序返回
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class BM25Index:
+    """BM25Okapi（k1/b/epsilon 与 rank_bm25 相同）的倒排表实现。"""
+
+    def __init__(self, corpus_tokens: Iterable[List[str]],
+                 k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25) -> None:
+        self.vocab: Dict[str, int] = {}
+        post_tok: List[int] = []
+        post_doc: List[int] = []
+        post_tf: List[int] = []
+        doc_len: List[int] = []
+        for d, tokens in enumerate(corpus_tokens):
+            doc_len.append(len(tokens))
+            for t, tf in Counter(tokens).items():
+                post_tok.append(self.vocab.setdefault(t, len(self.vocab)))
+                post_doc.append(d)
+                post_tf.append(tf)
+
+        self.corpus_size = len(doc_len)
+        dl = np.asarray(doc_len, dtype=np.float64)
+        self.avgdl = float(dl.sum() / max(self.corpus_size, 1))
+
+        # 按词排序得到倒排链：docs[indptr[t]:indptr[t+1]] 为含词 t 的文档
+        tok = np.asarray(post_tok, dtype=np.int64)
+        order = np.argsort(tok, kind="stable")
+        df = np.bincount(tok, minlength=len(self.vocab))
+        self.indptr = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        self.docs = np.asarray(post_doc, dtype=np.int64)[order]
+        tf = np.asarray(post_tf, dtype=np.float64)[order]
+
+        # idf 下限：负 idf 置为 epsilon * 平均 idf
+        idf = np.log(self.corpus_size - df + 0.5) - np.log(df + 0.5)
+        if idf.size:
+            idf[idf < 0] = epsilon * idf.mean()
+        self.idf = idf
+
+        norm = k1 * (1 - b + b * dl[self.docs] / self.avgdl) if self.docs.size else np.zeros(0)
+        self.weights = np.repeat(idf, df) * (tf * (k1 + 1) / (tf + norm))
+
+    def sparse_scores(self, query_tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """只对含查询词的文档打分：返回 (文档 id, 分数)，id 升序；重复的查询词重复计分。"""
+        tids = [self.vocab[t] for t in query_tokens if t in self.vocab]
+        if not tids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        slices = [slice(self.indptr[t], self.indptr[t + 1]) for t in tids]
+        docs = np.concatenate([self.docs[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        ids, inverse = np.unique(docs, return_inverse=True)
+        return ids, np.bincount(inverse, weights=weights, minlength=ids.size)
+
+    def get_scores(self, query_tokens: List[str]) -> np.ndarray:
+        """全部文档的分数（与 BM25Okapi.get_scores 接口一致）。"""
+        scores = np.zeros(self.corpus_size, dtype=np.float64)
+        ids, vals = self.sparse_scores(query_tokens)
+        scores[ids] = vals
+        return scores
+
+
+class TokenSetIndex:
+    """文档词集合的 CSR 表示：indices[indptr[i]:indptr[i+1]] 为第 i 条文档去重后的词 id。"""
+
+    def __init__(self, token_lists: Iterable[List[str]]) -> None:
+        self.vocab: Dict[str, int] = {}
+        indptr = [0]
+        indices: List[int] = []
+        for tokens in token_lists:
+            ids = {self.vocab.setdefault(t, len(self.vocab)) for t in tokens}
+            indices.extend(sorted(ids))
+            indptr.append(len(indices))
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.sizes = np.diff(self.indptr)
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def overlap(self, query_tokens: List[str], doc_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量计算查询与候选文档词集合的重叠。
+        返回：(共有词数, Jaccard)，与 doc_ids 一一对应。
+        """
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        q_set = set(query_tokens)
+        if doc_ids.size == 0 or not q_set:
+            zeros = np.zeros(doc_ids.size, dtype=np.float64)
+            return zeros.astype(np.int64), zeros
+        q_ids = np.fromiter((self.vocab[t] for t in q_set if t in self.vocab), dtype=np.int64)
+
+        starts = self.indptr[doc_ids]
+        sizes = self.sizes[doc_ids]
+        # 拼接所有候选的词 id 段：segment 内偏移 = 全局位置 - 段起点
+        seg = np.repeat(np.arange(doc_ids.size), sizes)
+        offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        tokens = self.indices[np.repeat(starts, sizes) + offsets]
+        hit = np.isin(tokens, q_ids)
+        common = np.bincount(seg, weights=hit, minlength=doc_ids.size).astype(np.int64)
+
+        union = len(q_set) + sizes - common
+        jacc = np.where((sizes > 0) & (union > 0), common / np.maximum(union, 1), 0.0)
+        return common, jacc
+
+
+def top_positive(scores: np.ndarray, n: int, ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    取分数最高且 > 0 的前 n 个：返回 (id, 分数)，按分数降序。
+    ids 为空时 scores 视为稠密数组（下标即 id），否则与 ids 一一对应（稀疏结果）。
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    ids = np.arange(scores.size, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+    if scores.size == 0 or n <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    if n < scores.size:
+        cand = np.argpartition(-scores, n - 1)[:n]
+    else:
+        cand = np.arange(scores.size)
+    cand = cand[scores[cand] > 0.0]
+    cand = cand[np.argsort(-scores[cand], kind="stable")]
+    return ids[cand], scores[cand]
+
+
+def minmax_norm(vals: np.ndarray) -> np.ndarray:
+    """
+    稳健归一化：
+    - hi==lo==0  → 全部 0（该通道无有效区分度）
+    - hi==lo!=0  → 全部 1（都同等强）
+    - 其他       → 标准 min-max
+    """
+    vals = np.asarray(vals, dtype=np.float64)
+    if vals.size == 0:
+        return vals
+    lo, hi = vals.min(), vals.max()
+    if abs(hi - lo) < 1e-12:
+        return np.zeros_like(vals) if abs(hi) < 1e-12 else np.ones_like(vals)
+    return (vals - lo) / (hi - lo)
+
+
+def fuse(vec_ids: np.ndarray, vec_scores: np.ndarray,
+         bm_ids: np.ndarray, bm_scores: np.ndarray,
+         alpha: float) -> Tuple[np.ndarray, np.ndarray]:
+    """final = alpha*vec_norm + (1-alpha)*bm_norm，按 id 合并；返回 (id, 融合分)，按融合分降序。"""
+    ids = np.concatenate([np.asarray(vec_ids, dtype=np.int64), np.asarray(bm_ids, dtype=np.int64)])
+    if ids.size == 0:
+        return ids, np.zeros(0, dtype=np.float64)
+    weighted = np.concatenate([alpha * minmax_norm(vec_scores), (1 - alpha) * minmax_norm(bm_scores)])
+    uniq, inverse = np.unique(ids, return_inverse=True)
+    fused = np.bincount(inverse, weights=weighted, minlength=uniq.size)
+    order = np.argsort(-fused, kind="stable")
+    return uniq[order], fused[order]
@@ -0,0 +1,120 @@
+"""
+aiModels.qaModel.index_builder
+
+RAG 索引后台构建：
+- 在后台线程中执行构建函数，HTTP 请求立即返回
+- 构建函数通过 report() 上报阶段与进度（已编码文档数、总数），据此估算剩余时间
+- 构建完成后回调 on_ready(新索引)，由调用方原子替换当前索引；构建期间查询继续使用旧索引
+- 构建中再次请求重建：标记 pending，当前轮结束后自动再构建一次（覆盖构建期间的知识库修改）
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class BackgroundIndexBuilder:
+    """单实例后台构建器：同一时间最多一个构建线程。"""
+
+    def __init__(self, build_fn: Callable[["BackgroundIndexBuilder"], Any],
+                 on_ready: Callable[[Any], None]) -> None:
+        self._build_fn = build_fn
+        self._on_ready = on_ready
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pending = False
+        self._state = "idle"          # idle / running / ready / failed
+        self._stage = ""
+        self._done = 0
+        self._total = 0
+        self._started_at: Optional[float] = None
+        self._stage_started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._error: Optional[str] = None
+        self.builds = 0
+
+    def start(self) -> bool:
+        """启动后台构建；已在构建中则排队一次重建，返回 False。"""
+        with self._lock:
+            # 以锁内维护的状态判断（不用 is_alive()）：构建线程在锁内决定退出时已把状态改为 ready / failed，
+            # 之后的请求会启动新线程，不会把 pending 留给一个即将退出、不再检查它的线程
+            if self._state == "running":
+                self._pending = True
+                return False
+            self._reset_progress()
+            self._thread = threading.Thread(target=self._run, name="rag-index-builder", daemon=True)
+            self._thread.start()
+            return True
+
+    def _reset_progress(self) -> None:
+        self._state = "running"
+        self._stage = "queued"
+        self._done = 0
+        self._total = 0
+        self._error = None
+        self._started_at = time.time()
+        self._stage_started_at = self._started_at
+        self._finished_at = None
+
+    def _run(self) -> None:
+        while True:
+            error = None
+            try:
+                result = self._build_fn(self)
+                self._on_ready(result)
+            except Exception as e:
+                print(f"[ERROR] RAG后台构建失败: {e}")
+                error = f"{type(e).__name__}: {str(e)}"
+            # 记录结果与检查 pending 在同一次加锁内完成，避免与 start() 交错时丢失重建请求
+            with self._lock:
+                self._finished_at = time.time()
+                if error is None:
+                    self._state = "ready"
+                    self._stage = "done"
+                    self.builds += 1
+                else:
+                    self._state = "failed"
+                    self._error = error
+                if not self._pending:
+                    self._thread = None
+                    return
+                self._pending = False
+                self._reset_progress()
+
+    def report(self, stage: str, done: Optional[int] = None, total: Optional[int] = None) -> None:
+        """构建函数上报进度（线程安全）。"""
+        with self._lock:
+            if stage != self._stage:
+                self._stage = stage
+                self._stage_started_at = time.time()
+            if done is not None:
+                self._done = int(done)
+            if total is not None:
+                self._total = int(total)
+
+    def is_running(self) -> bool:
+        with self._lock:
+            return self._state == "running"
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.time()
+            eta = None
+            if self._state == "running" and self._stage == "encoding" and self._done > 0 and self._total:
+                # 按当前编码速度估算剩余时间
+                rate = self._done / max(now - (self._stage_started_at or now), 1e-6)
+                eta = round((self._total - self._done) / rate, 1)
+            return {
+                "state": self._state,
+                "stage": self._stage,
+                "docs_encoded": self._done,
+                "docs_total": self._total,
+                "progress": round(self._done / self._total, 4) if self._total else 0.0,
+                "eta_seconds": eta,
+                "elapsed_seconds": round(((self._finished_at or now) - self._started_at), 1) if self._started_at else 0.0,
+                "rebuild_pending": self._pending,
+                "error": self._error,
+                "builds": self.builds,
+            }
@@ -0,0 +1,284 @@
+"""
+aiModels.qaModel.knowledge_store
+
+知识库存储引擎（SQLite），替代每次编辑都整文件重写 agriculture_dat.json：
+- **按 id 索引**：增删查均为索引操作，不再全量读写
+- **原子写入**：每次修改在一个 `BEGIN IMMEDIATE` 事务中完成（分配新 id + 插入不会并发冲突）
+- **文件锁**：由 SQLite 自身的数据库锁保证多进程/多线程安全（WAL 模式，读写互不阻塞）
+- **流式读取**：iter_items() 分批读取，RAG.load_docs 可直接消费；page()/search_like() 供管理页分页查询
+- **版本号**：每次修改递增，用于判断知识库是否变化
+
+说明：
+- 首次打开且表为空时，自动从 agriculture_dat.json 导入（保留原 id）
+- export_json() 可将当前数据导出为原 JSON 格式
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 数据文件路径：与原 JSON 知识库同目录
+JSON_PATH = Path(__file__).parent / "agriculture_dat.json"
+DB_PATH = Path(__file__).parent / "agriculture_dat.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS knowledge (
+    id          TEXT PRIMARY KEY,
+    num_id      INTEGER,
+    instruction TEXT NOT NULL DEFAULT '',
+    input       TEXT NOT NULL DEFAULT '',
+    output      TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_knowledge_num_id ON knowledge(num_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+FIELDS = ("id", "instruction", "input", "output")
+
+
+def _num_id(value: Any) -> Optional[int]:
+    try:
+        return int(str(value))
+    except Exception:
+        return None
+
+
+def _row_to_item(row: sqlite3.Row) -> Dict[str, Any]:
+    # 可解析为整数的 id 按整数返回，与原 JSON 保持一致
+    return {
+        "id": row["num_id"] if row["num_id"] is not None else row["id"],
+        "instruction": row["instruction"],
+        "input": row["input"],
+        "output": row["output"],
+    }
+
+
+class KnowledgeStore:
+    """知识库条目的 SQLite 存储。每个线程使用独立连接。"""
+
+    def __init__(self, db_path: Path = DB_PATH, json_path: Optional[Path] = JSON_PATH) -> None:
+        self.db_path = Path(db_path)
+        self.json_path = Path(json_path) if json_path else None
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    # ---------- 连接与初始化 ----------
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn: sqlite3.Connection) -> None:
+        with self._init_lock:
+            if self._initialized:
+                return
+            conn.executescript(_SCHEMA)
+            empty = conn.execute("SELECT 1 FROM knowledge LIMIT 1").fetchone() is None
+            imported = conn.execute("SELECT value FROM meta WHERE key='json_imported'").fetchone()
+            if empty and not imported and self.json_path and self.json_path.exists():
+                self._import_json(conn, self.json_path)
+            self._initialized = True
+
+    def _import_json(self, conn: sqlite3.Connection, path: Path) -> None:
+        """从原 JSON 知识库一次性导入（id 缺失时用序号补齐）。"""
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        if not isinstance(raw, list):
+            raise ValueError("知识库 JSON 顶层必须是数组(list)")
+        rows = []
+        for i, d in enumerate(raw):
+            if not isinstance(d, dict):
+                # 跳过非法项
+                continue
+            item_id = d.get("id", i)
+            rows.append((
+                str(item_id), _num_id(item_id),
+                (d.get("instruction") or "").strip(),
+                (d.get("input") or "").strip(),
+                (d.get("output") or "").strip(),
+            ))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO knowledge (id, num_id, instruction, input, output) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)", (str(path),))
+            self._bump_version(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        print(f"[KnowledgeStore] 已从 {path.name} 导入 {len(rows)} 条知识")
+
+    @staticmethod
+    def _bump_version(conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('version', '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+    # ---------- 读取 ----------
+
+    def count(self) -> int:
+        return int(self._conn().execute("SELECT COUNT(*) FROM knowledge").fetchone()[0])
+
+    def version(self) -> int:
+        row = self._conn().execute("SELECT value FROM meta WHERE key='version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def get(self, item_id: Any) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM knowledge WHERE id = ?", (str(item_id),)).fetchone()
+        return _row_to_item(row) if row else None
+
+    def iter_items(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """按插入顺序分批流式读取全部条目。"""
+        cur = self._conn().execute("SELECT * FROM knowledge ORDER BY rowid")
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield _row_to_item(row)
+
+    def all_items(self) -> List[Dict[str, Any]]:
+        return list(self.iter_items())
+
+    def page(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """按插入顺序分页读取。"""
+        rows = self._conn().execute(
+            "SELECT * FROM knowledge ORDER BY rowid LIMIT ? OFFSET ?", (int(limit), int(offset))
+        ).fetchall()
+        return [_row_to_item(r) for r in rows]
+
+    def get_many(self, item_ids: List[Any]) -> List[Dict[str, Any]]:
+        """按给定 id 顺序批量读取，已不存在的 id 跳过。"""
+        keys = [str(i) for i in item_ids]
+        if not keys:
+            return []
+        placeholders = ",".join("?" * len(keys))
+        rows = self._conn().execute(
+            f"SELECT * FROM knowledge WHERE id IN ({placeholders})", keys
+        ).fetchall()
+        by_id = {r["id"]: _row_to_item(r) for r in rows}
+        return [by_id[k] for k in keys if k in by_id]
+
+    def search_like(self, keywords: List[str], offset: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        关键字子串匹配（每个关键字须出现在 问题/补充/答案 任一字段中）。
+        返回：(当前页条目, 匹配总数)
+        """
+        clauses, params = [], []
+        for kw in keywords:
+            pattern = "%" + kw.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            clauses.append(
+                "(instruction LIKE ? ESCAPE '\\' OR input LIKE ? ESCAPE '\\' OR output LIKE ? ESCAPE '\\')"
+            )
+            params.extend([pattern] * 3)
+        where = " AND ".join(clauses) or "1"
+        conn = self._conn()
+        total = int(conn.execute(f"SELECT COUNT(*) FROM knowledge WHERE {where}", params).fetchone()[0])
+        rows = conn.execute(
+            f"SELECT * FROM knowledge WHERE {where} ORDER BY rowid LIMIT ? OFFSET ?",
+            params + [int(limit), int(offset)],
+        ).fetchall()
+        return [_row_to_item(r) for r in rows], total
+
+    # ---------- 写入 ----------
+
+    def add(self, instruction: str, input_text: str, output_text: str) -> Dict[str, Any]:
+        """追加一条记录，自动分配 id（现有最大整数 id + 1），分配与插入在同一事务中。"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            max_id = conn.execute("SELECT MAX(num_id) FROM knowledge").fetchone()[0]
+            new_id = max_id + 1 if max_id is not None and max_id >= 0 else self.count()
+            conn.execute(
+                "INSERT INTO knowledge (id, num_id, instruction, input, output) VALUES (?, ?, ?, ?, ?)",
+                (str(new_id), new_id, instruction, input_text, output_text),
+            )
+            self._bump_version(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {"id": new_id, "instruction": instruction, "input": input_text, "output": output_text}
+
+    def delete(self, item_id: Any) -> bool:
+        """按 id 删除（字符串数字与数字视为同一 id），返回是否删除成功。"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.execute("DELETE FROM knowledge WHERE id = ?", (str(item_id),))
+            deleted = cur.rowcount > 0
+            if deleted:
+                self._bump_version(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return deleted
+
+    def delete_many(self, item_ids: List[Any]) -> int:
+        """批量删除（同一事务，版本号只递增一次），返回实际删除条数。"""
+        keys = [(str(i),) for i in item_ids]
+        if not keys:
+            return 0
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            conn.executemany("DELETE FROM knowledge WHERE id = ?", keys)
+            deleted = conn.total_changes - before
+            if deleted:
+                self._bump_version(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return deleted
+
+    def export_json(self, path: Optional[Path] = None) -> Path:
+        """导出为原 JSON 数组格式（先写临时文件再替换，保证原子性）。"""
+        path = Path(path or self.json_path or JSON_PATH)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("[\n")
+            for n, item in enumerate(self.iter_items()):
+                if n:
+                    f.write(",\n")
+                f.write(json.dumps({k: item[k] for k in FIELDS}, ensure_ascii=False))
+            f.write("\n]\n")
+        os.replace(tmp, path)
+        return path
+
+
+# 创建全局实例
+_knowledge_store = None
+_knowledge_store_lock = threading.Lock()
+
+
+def get_knowledge_store() -> KnowledgeStore:
+    """获取知识库存储单例"""
+    global _knowledge_store
+    with _knowledge_store_lock:
+        if _knowledge_store is None:
+            _knowledge_store = KnowledgeStore()
+        return _knowledge_store
@@ -0,0 +1,473 @@
+"""
+aiModels.qaModel.llm_client
+
+统一的 Ollama 客户端（RAG / DeepSeek 问答 / 大脑智能体共用）：
+- **连接池**：共享 requests.Session（HTTP keep-alive，复用 TCP 连接）
+- **并发限制**：按模型限制同时生成的请求数，超出的请求排队等待；队列满或等待超时直接拒绝
+- **超时与重试**：连接失败 / 429 / 5xx 按指数退避重试（流式请求仅在收到首字节前重试）
+- **指标**：请求数、失败数、重试数、在途数、排队深度、排队等待与端到端延迟 p50/p95
+- **异步版本**：AsyncOllamaClient（httpx.AsyncClient + asyncio 闸门），供 ASGI 异步视图使用
+
+说明：
+- 通过 `get_llm_client()` 获取单例，不要各自 `requests.post`；协程中使用 `get_async_llm_client()`
+- `/aiModels/llm_metrics` 查看运行指标
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+# ========== Ollama 配置 ==========
+OLLAMA_BASE_URL = "http://localhost:11435"
+
+# ========== 连接池 / 并发 / 重试参数 ==========
+POOL_MAXSIZE = 16                # 连接池大小（keep-alive 连接数）
+MAX_CONCURRENCY_PER_MODEL = 2    # 每个模型同时生成的请求数（CPU 推理服务器建议 1~2）
+MAX_QUEUE_PER_MODEL = 32         # 每个模型最多排队的请求数，超过直接拒绝
+ASYNC_MAX_QUEUE_PER_MODEL = 512  # 异步客户端排队的是协程（不占线程），可容纳更多等待中的会话
+QUEUE_TIMEOUT = 120              # 排队最长等待（秒）
+CONNECT_TIMEOUT = 5              # 建连超时（秒）
+MAX_RETRIES = 2                  # 额外重试次数
+BACKOFF_BASE = 0.5               # 退避基数（秒）：0.5, 1, 2 ...
+RETRY_STATUS = (429, 502, 503, 504)
+METRICS_WINDOW = 500             # 延迟统计窗口（最近 N 次）
+
+
+class LLMBusyError(RuntimeError):
+    """模型排队已满或等待超时。"""
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    vals = sorted(values)
+    idx = min(len(vals) - 1, max(0, int(round(q * (len(vals) - 1)))))
+    return round(vals[idx], 4)
+
+
+class _ModelGate:
+    """单个模型的并发闸门：最多 limit 个在途请求，其余排队。"""
+
+    def __init__(self, limit: int, max_queue: int) -> None:
+        self.limit = max(1, int(limit))
+        self.max_queue = max(0, int(max_queue))
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.rejected = 0
+
+    def acquire(self, timeout: float) -> float:
+        """获取执行名额，返回排队等待秒数。"""
+        start = time.monotonic()
+        with self._cond:
+            if self.active >= self.limit and self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise LLMBusyError(f"模型繁忙：排队请求已达上限 {self.max_queue}")
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            try:
+                ok = self._cond.wait_for(lambda: self.active < self.limit, timeout=timeout)
+            finally:
+                self.waiting -= 1
+            if not ok:
+                self.rejected += 1
+                raise LLMBusyError(f"模型繁忙：排队等待超过 {timeout} 秒")
+            self.active += 1
+        return time.monotonic() - start
+
+    def release(self) -> None:
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+class _ModelMetrics:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency = deque(maxlen=METRICS_WINDOW)
+        self.queue_wait = deque(maxlen=METRICS_WINDOW)
+        self.first_byte = deque(maxlen=METRICS_WINDOW)
+
+
+class OllamaClient:
+    """带连接池、并发闸门、重试与指标的 Ollama `/api/chat` 客户端。"""
+
+    def __init__(self,
+                 base_url: str = OLLAMA_BASE_URL,
+                 max_concurrency: int = MAX_CONCURRENCY_PER_MODEL,
+                 max_queue: int = MAX_QUEUE_PER_MODEL,
+                 queue_timeout: float = QUEUE_TIMEOUT,
+                 max_retries: int = MAX_RETRIES) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._gates: Dict[str, _ModelGate] = {}
+        self._metrics: Dict[str, _ModelMetrics] = {}
+
+    # ---------- 闸门与指标 ----------
+
+    def _gate(self, model: str) -> _ModelGate:
+        with self._lock:
+            gate = self._gates.get(model)
+            if gate is None:
+                gate = self._gates[model] = _ModelGate(self.max_concurrency, self.max_queue)
+                self._metrics[model] = _ModelMetrics()
+            return gate
+
+    @contextmanager
+    def _slot(self, model: str):
+        gate = self._gate(model)
+        m = self._metrics[model]
+        waited = gate.acquire(self.queue_timeout)
+        with self._lock:
+            m.requests += 1
+            m.queue_wait.append(waited)
+        try:
+            yield m
+        except Exception:
+            with self._lock:
+                m.errors += 1
+            raise
+        finally:
+            gate.release()
+
+    def _post(self, m: _ModelMetrics, payload: Dict[str, Any], timeout: float,
+              stream: bool = False, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """发送请求；连接失败或可重试状态码时指数退避重试。"""
+        url = f"{self.base_url}/api/chat"
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                resp = self.session.post(url, json=payload, headers=headers, stream=stream,
+                                         timeout=(CONNECT_TIMEOUT, timeout))
+            except requests.exceptions.ConnectionError:
+                if last:
+                    raise
+            else:
+                if resp.status_code not in RETRY_STATUS or last:
+                    resp.raise_for_status()
+                    return resp
+                resp.close()
+            with self._lock:
+                m.retries += 1
+            time.sleep(BACKOFF_BASE * (2 ** attempt) * (1 + random.random() * 0.25))
+        raise RuntimeError("unreachable")
+
+    # ---------- 对外接口 ----------
+
+    def chat(self,
+             messages: List[Dict[str, str]],
+             model: str,
+             options: Optional[Dict[str, Any]] = None,
+             timeout: float = 300,
+             headers: Optional[Dict[str, str]] = None,
+             **extra: Any) -> str:
+        """阻塞调用，返回 message.content 原文（含 <think>，由调用方决定是否剔除）。"""
+        payload: Dict[str, Any] = {"model": model, "messages": messages, "stream": False}
+        if options:
+            payload["options"] = options
+        payload.update(extra)
+        with self._slot(model) as m:
+            start = time.monotonic()
+            resp = self._post(m, payload, timeout, headers=headers)
+            data = resp.json()
+            with self._lock:
+                m.latency.append(time.monotonic() - start)
+        # Ollama 返回结构：{"message": {"role": "...", "content": "..."}, ...}
+        return (data.get("message") or {}).get("content") or ""
+
+    def chat_stream(self,
+                    messages: List[Dict[str, str]],
+                    model: str,
+                    options: Optional[Dict[str, Any]] = None,
+                    timeout: float = 300,
+                    headers: Optional[Dict[str, str]] = None,
+                    **extra: Any) -> Iterator[str]:
+        """
+        流式调用，逐个产出 message.content 增量。
+        Ollama 流式返回为 NDJSON：每行 {"message": {"content": "..."}, "done": false}，最后一行 done=true。
+        生成期间一直占用该模型的并发名额，生成器关闭（含客户端断开）时释放。
+        """
+        payload: Dict[str, Any] = {"model": model, "messages": messages, "stream": True}
+        if options:
+            payload["options"] = options
+        payload.update(extra)
+        with self._slot(model) as m:
+            start = time.monotonic()
+            first = True
+            with self._post(m, payload, timeout, stream=True, headers=headers) as resp:
+                for line in resp.iter_lines(decode_unicode=False):
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise RuntimeError(f"Ollama错误: {data['error']}")
+                    delta = (data.get("message") or {}).get("content") or ""
+                    if delta:
+                        if first:
+                            first = False
+                            with self._lock:
+                                m.first_byte.append(time.monotonic() - start)
+                        yield delta
+                    if data.get("done"):
+                        break
+            with self._lock:
+                m.latency.append(time.monotonic() - start)
+
+    def metrics(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"base_url": self.base_url, "models": {}}
+        with self._lock:
+            for model, gate in self._gates.items():
+                out["models"][model] = _model_metrics(gate, self._metrics[model])
+        return out
+
+
+def _model_metrics(gate, m: _ModelMetrics) -> Dict[str, Any]:
+    return {
+        "requests": m.requests,
+        "errors": m.errors,
+        "retries": m.retries,
+        "rejected": gate.rejected,
+        "in_flight": gate.active,
+        "queue_depth": gate.waiting,
+        "max_queue_depth": gate.max_waiting,
+        "concurrency_limit": gate.limit,
+        "latency_p50": _percentile(m.latency, 0.5),
+        "latency_p95": _percentile(m.latency, 0.95),
+        "first_token_p50": _percentile(m.first_byte, 0.5),
+        "queue_wait_p50": _percentile(m.queue_wait, 0.5),
+        "queue_wait_p95": _percentile(m.queue_wait, 0.95),
+    }
+
+
+# ---------------------- 异步客户端（httpx） ----------------------
+
+class _AsyncModelGate:
+    """单个模型的异步并发闸门（asyncio.Semaphore），排队的是协程而不是线程。"""
+
+    def __init__(self, limit: int, max_queue: int) -> None:
+        self.limit = max(1, int(limit))
+        self.max_queue = max(0, int(max_queue))
+        self._sem = asyncio.Semaphore(self.limit)
+        self.active = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.rejected = 0
+
+    async def acquire(self, timeout: float) -> float:
+        """获取执行名额，返回排队等待秒数。"""
+        start = time.monotonic()
+        if self.active >= self.limit and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise LLMBusyError(f"模型繁忙：排队请求已达上限 {self.max_queue}")
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise LLMBusyError(f"模型繁忙：排队等待超过 {timeout} 秒")
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return time.monotonic() - start
+
+    def release(self) -> None:
+        self.active -= 1
+        self._sem.release()
+
+
+class AsyncOllamaClient:
+    """
+    OllamaClient 的 asyncio 版本（异步视图 / 异步智能体使用）：
+    httpx.AsyncClient 连接池、按模型并发闸门、指数退避重试，指标口径与同步客户端一致。
+    闸门与连接池绑定所在事件循环，请通过 get_async_llm_client() 获取。
+    """
+
+    def __init__(self,
+                 base_url: str = OLLAMA_BASE_URL,
+                 max_concurrency: int = MAX_CONCURRENCY_PER_MODEL,
+                 max_queue: int = ASYNC_MAX_QUEUE_PER_MODEL,
+                 queue_timeout: float = QUEUE_TIMEOUT,
+                 max_retries: int = MAX_RETRIES) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=POOL_MAXSIZE, max_keepalive_connections=POOL_MAXSIZE),
+        )
+        self._gates: Dict[str, _AsyncModelGate] = {}
+        self._metrics: Dict[str, _ModelMetrics] = {}
+
+    @asynccontextmanager
+    async def _slot(self, model: str):
+        gate = self._gates.get(model)
+        if gate is None:
+            gate = self._gates[model] = _AsyncModelGate(self.max_concurrency, self.max_queue)
+            self._metrics[model] = _ModelMetrics()
+        m = self._metrics[model]
+        waited = await gate.acquire(self.queue_timeout)
+        m.requests += 1
+        m.queue_wait.append(waited)
+        try:
+            yield m
+        except Exception:
+            m.errors += 1
+            raise
+        finally:
+            gate.release()
+
+    async def _send(self, m: _ModelMetrics, payload: Dict[str, Any], timeout: float,
+                    stream: bool = False, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """发送请求；连接失败或可重试状态码时指数退避重试。流式请求返回未读取正文的响应，由调用方关闭。"""
+        url = f"{self.base_url}/api/chat"
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            request = self.client.build_request(
+                "POST", url, json=payload, headers=headers,
+                timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT),
+            )
+            try:
+                resp = await self.client.send(request, stream=stream)
+            except httpx.TransportError:
+                if last:
+                    raise
+            else:
+                if resp.status_code not in RETRY_STATUS or last:
+                    if resp.is_error:
+                        await resp.aclose()
+                    resp.raise_for_status()
+                    return resp
+                await resp.aclose()
+            m.retries += 1
+            await asyncio.sleep(BACKOFF_BASE * (2 ** attempt) * (1 + random.random() * 0.25))
+        raise RuntimeError("unreachable")
+
+    async def chat(self,
+                   messages: List[Dict[str, str]],
+                   model: str,
+                   options: Optional[Dict[str, Any]] = None,
+                   timeout: float = 300,
+                   headers: Optional[Dict[str, str]] = None,
+                   **extra: Any) -> str:
+        """异步阻塞调用，返回 message.content 原文（含 <think>）。"""
+        payload: Dict[str, Any] = {"model": model, "messages": messages, "stream": False}
+        if options:
+            payload["options"] = options
+        payload.update(extra)
+        async with self._slot(model) as m:
+            start = time.monotonic()
+            resp = await self._send(m, payload, timeout, headers=headers)
+            data = resp.json()
+            m.latency.append(time.monotonic() - start)
+        return (data.get("message") or {}).get("content") or ""
+
+    async def chat_stream(self,
+                          messages: List[Dict[str, str]],
+                          model: str,
+                          options: Optional[Dict[str, Any]] = None,
+                          timeout: float = 300,
+                          headers: Optional[Dict[str, str]] = None,
+                          **extra: Any) -> AsyncIterator[str]:
+        """异步流式调用，逐个产出 message.content 增量（NDJSON 格式同 chat_stream）。"""
+        payload: Dict[str, Any] = {"model": model, "messages": messages, "stream": True}
+        if options:
+            payload["options"] = options
+        payload.update(extra)
+        async with self._slot(model) as m:
+            start = time.monotonic()
+            first = True
+            resp = await self._send(m, payload, timeout, stream=True, headers=headers)
+            try:
+                async for line in resp.aiter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise RuntimeError(f"Ollama错误: {data['error']}")
+                    delta = (data.get("message") or {}).get("content") or ""
+                    if delta:
+                        if first:
+                            first = False
+                            m.first_byte.append(time.monotonic() - start)
+                        yield delta
+                    if data.get("done"):
+                        break
+            finally:
+                await resp.aclose()
+            m.latency.append(time.monotonic() - start)
+
+    def metrics(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"base_url": self.base_url, "async": True, "models": {}}
+        for model, gate in list(self._gates.items()):
+            out["models"][model] = _model_metrics(gate, self._metrics[model])
+        return out
+
+
+# 全局实例（按 base_url 复用）
+_clients: Dict[str, OllamaClient] = {}
+_clients_lock = threading.Lock()
+# 异步客户端按事件循环隔离（httpx 连接池与 asyncio 闸门不能跨事件循环使用）
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncOllamaClient]]" = weakref.WeakKeyDictionary()
+
+
+def get_llm_client(base_url: str = OLLAMA_BASE_URL) -> OllamaClient:
+    """获取共享的 Ollama 客户端单例"""
+    key = base_url.rstrip("/")
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = OllamaClient(base_url=key)
+        return client
+
+
+def get_async_llm_client(base_url: str = OLLAMA_BASE_URL) -> AsyncOllamaClient:
+    """获取当前事件循环共享的异步 Ollama 客户端（须在协程中调用）"""
+    loop = asyncio.get_running_loop()
+    key = base_url.rstrip("/")
+    with _clients_lock:
+        clients = _async_clients.get(loop)
+        if clients is None:
+            clients = _async_clients[loop] = {}
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = AsyncOllamaClient(base_url=key)
+        return client
+
+
+@require_GET
+def llm_metrics_view(request):
+    """GET /aiModels/llm_metrics：查看各模型的并发、排队与延迟指标"""
+    return JsonResponse({
+        "success": True,
+        "clients": [c.metrics() for c in list(_clients.values())],
+        "async_clients": [c.metrics() for clients in list(_async_clients.values()) for c in list(clients.values())],
+    })
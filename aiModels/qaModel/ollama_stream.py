@@ -0,0 +1,80 @@
+"""
+aiModels.qaModel.ollama_stream
+
+Ollama 流式输出工具（HTTP 调用见 llm_client.OllamaClient.chat_stream）：
+- **ThinkStripper**：增量剔除 DeepSeek-R1 的 `<think>…</think>` 思维链（标签可能跨分片）
+- **sse_event**：按前端约定格式化 SSE 帧（`data: {...}\\n\\n`）
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+def sse_event(payload: Dict[str, Any]) -> str:
+    """格式化一条 SSE 消息（与 brain_agent 的流式接口保持同一格式）。"""
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def _partial_tag_len(text: str, tag: str) -> int:
+    """text 末尾与 tag 前缀重合的最大长度（用于保留可能被截断的标签）。"""
+    for n in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:n]):
+            return n
+    return 0
+
+
+class ThinkStripper:
+    """
+    增量去除 `<think>…</think>`：
+    - feed(chunk) 返回本分片中可见的文本
+    - 末尾疑似标签前缀的内容暂存，等下一分片再判断
+    - 与 RAG.strip_think 一致：去掉可见内容开头的空白
+    """
+
+    def __init__(self) -> None:
+        self._pending = ""
+        self._in_think = False
+        self._started = False
+
+    def feed(self, chunk: str) -> str:
+        text = self._pending + (chunk or "")
+        self._pending = ""
+        out: List[str] = []
+        while text:
+            if self._in_think:
+                pos = text.find(THINK_CLOSE)
+                if pos < 0:
+                    keep = _partial_tag_len(text, THINK_CLOSE)
+                    self._pending = text[len(text) - keep:] if keep else ""
+                    break
+                text = text[pos + len(THINK_CLOSE):]
+                self._in_think = False
+            else:
+                pos = text.find(THINK_OPEN)
+                if pos < 0:
+                    keep = _partial_tag_len(text, THINK_OPEN)
+                    out.append(text[:len(text) - keep])
+                    self._pending = text[len(text) - keep:] if keep else ""
+                    break
+                out.append(text[:pos])
+                text = text[pos + len(THINK_OPEN):]
+                self._in_think = True
+        return self._emit("".join(out))
+
+    def flush(self) -> str:
+        """流结束：未闭合的思维链丢弃，残留的普通文本输出。"""
+        rest = "" if self._in_think else self._pending
+        self._pending = ""
+        return self._emit(rest)
+
+    def _emit(self, visible: str) -> str:
+        if not self._started:
+            visible = visible.lstrip()
+            if visible:
+                self._started = True
+        return visible
@@ -0,0 +1,116 @@
+"""
+aiModels.qaModel.parallel_encode
+
+大规模知识库的多进程并行向量编码：
+- 语料按 SHARD_SIZE 切分为分片，提交到进程池（spawn 方式启动，每个进程加载一份编码模型）
+- 每个分片的向量写入独立的内存映射 .npy 文件（np.lib.format.open_memmap），不经进程间管道回传大数组
+- 主进程按分片顺序以 mmap 方式读取并加入 FAISS 索引，保证向量顺序与文档顺序一致
+- 每个进程的推理线程数 = CPU 核数 / 进程数，避免线程超订
+
+说明：
+- 适用于 embedders 中的全部后端（torch / torch_int8 / onnx_int8）
+- 分片文件写在临时目录，合并完成后删除
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SHARD_SIZE = 4096        # 每个分片的文档数
+ENCODE_BATCH_SIZE = 64   # 进程内编码批大小
+
+# 进程内的编码模型（由 _init_worker 加载）
+_worker_embedder = None
+
+
+def _init_worker(model_name: str, backend: str, num_threads: int) -> None:
+    global _worker_embedder
+    from .embedders import create_embedder
+    _worker_embedder = create_embedder(model_name, backend, num_threads)
+
+
+def _encode_shard(shard_path: str, texts: List[str], batch_size: int) -> Tuple[str, int, int]:
+    """编码一个分片并写入内存映射文件，返回 (文件路径, 行数, 维度)。"""
+    out = None
+    for start in range(0, len(texts), batch_size):
+        emb = _worker_embedder.encode(
+            texts[start:start + batch_size],
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        ).astype(np.float32)
+        if out is None:
+            out = np.lib.format.open_memmap(shard_path, mode="w+", dtype=np.float32,
+                                            shape=(len(texts), emb.shape[1]))
+        out[start:start + len(emb)] = emb
+    out.flush()
+    rows, dim = out.shape
+    del out
+    return shard_path, rows, dim
+
+
+def default_workers() -> int:
+    return max(1, os.cpu_count() or 1)
+
+
+def encode_to_faiss(texts: List[str],
+                    model_name: str,
+                    backend: str = "torch",
+                    workers: int = 0,
+                    shard_size: int = SHARD_SIZE,
+                    batch_size: int = ENCODE_BATCH_SIZE,
+                    progress: Optional[Callable[[int, int], None]] = None,
+                    work_dir: Optional[Path] = None):
+    """
+    多进程编码全部文本并构建 faiss.IndexFlatIP（向量已单位化，内积 ≈ 余弦）。
+    progress(done, total)：每完成一个分片回调一次。
+    """
+    import faiss
+
+    workers = workers or default_workers()
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    total = len(texts)
+    shards = [(i, s, min(s + shard_size, total)) for i, s in enumerate(range(0, total, shard_size))]
+    tmp_dir = Path(tempfile.mkdtemp(prefix="rag_emb_", dir=str(work_dir) if work_dir else None))
+
+    index = None
+    done_paths: Dict[int, Tuple[str, int, int]] = {}
+    next_shard = 0
+    encoded = 0
+    try:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(model_name, backend, threads_per_worker)) as pool:
+            pending = {
+                pool.submit(_encode_shard, str(tmp_dir / f"shard_{i:06d}.npy"), texts[s:e], batch_size): i
+                for i, s, e in shards
+            }
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    shard_id = pending.pop(fut)
+                    done_paths[shard_id] = fut.result()
+                    encoded += done_paths[shard_id][1]
+                    if progress is not None:
+                        progress(encoded, total)
+                # 按顺序合并已连续完成的分片
+                while next_shard in done_paths:
+                    path, rows, dim = done_paths.pop(next_shard)
+                    if index is None:
+                        index = faiss.IndexFlatIP(dim)
+                    emb = np.load(path, mmap_mode="r")
+                    index.add(np.ascontiguousarray(emb))
+                    del emb
+                    os.remove(path)
+                    next_shard += 1
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return index
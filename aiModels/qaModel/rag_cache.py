@@ -0,0 +1,143 @@
+"""
+aiModels.qaModel.rag_cache
+
+RAG 两级缓存：
+- **EmbeddingCache**：归一化问题 → 查询向量（LRU，按内存字节数限额）
+- **AnswerCache**：(问题, 命中文档id, 模型) → 最终答案（TTL + LRU，按内存字节数限额）
+
+说明：
+- 知识库变更（增删条目、重建索引）时清空答案缓存
+- 向量模型变更（重置RAG状态）时清空向量缓存
+- 两级缓存均带命中率统计，供 /aiModels/rag_cache_stats 查看
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+# 问题归一化时去掉的首尾标点（中英文）
+_STRIP_PUNCT = " \t\r\n？?。.！!，,；;：:~～"
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """问题归一化：去首尾空白/标点、合并空白、英文小写，使"同一个问题"命中同一缓存键。"""
+    q = _WS_RE.sub(" ", (question or "").strip().lower())
+    return q.strip(_STRIP_PUNCT)
+
+
+class _LRUBytesCache:
+    """线程安全的 LRU 缓存，按条目估算字节数总量限额。"""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = int(max_bytes)
+        self._data: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def _put(self, key: Hashable, value: Any, size: int) -> None:
+        if size > self.max_bytes:
+            # 单条超过总上限，不缓存
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._data:
+                _, (_, sz) = self._data.popitem(last=False)
+                self._bytes -= sz
+                self.evictions += 1
+
+    def _discard(self, key: Hashable) -> None:
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class EmbeddingCache(_LRUBytesCache):
+    """归一化问题 → 查询向量（np.ndarray）。"""
+
+    def get(self, question: str) -> Optional[np.ndarray]:
+        return self._get(normalize_question(question))
+
+    def put(self, question: str, emb: np.ndarray) -> None:
+        key = normalize_question(question)
+        self._put(key, emb, int(emb.nbytes) + len(key.encode("utf-8")))
+
+
+class AnswerCache(_LRUBytesCache):
+    """(归一化问题, 命中文档id, 模型, 是否RAG) → 最终答案，带过期时间。"""
+
+    def __init__(self, max_bytes: int, ttl_seconds: float) -> None:
+        super().__init__(max_bytes)
+        self.ttl_seconds = float(ttl_seconds)
+        self.expired = 0
+
+    @staticmethod
+    def make_key(question: str, doc_ids, model: str, used_rag: bool) -> Tuple:
+        return (normalize_question(question), tuple(doc_ids or ()), model, bool(used_rag))
+
+    def get(self, key: Tuple) -> Optional[str]:
+        item = self._get(key)
+        if item is None:
+            return None
+        answer, expires_at = item
+        if time.monotonic() >= expires_at:
+            self._discard(key)
+            with self._lock:
+                # 过期视为未命中
+                self.hits -= 1
+                self.misses += 1
+                self.expired += 1
+            return None
+        return answer
+
+    def put(self, key: Tuple, answer: str) -> None:
+        size = len((answer or "").encode("utf-8")) + len(key[0].encode("utf-8")) + 8 * len(key[1])
+        self._put(key, (answer, time.monotonic() + self.ttl_seconds), size)
+
+    def stats(self) -> Dict[str, Any]:
+        out = super().stats()
+        out["ttl_seconds"] = self.ttl_seconds
+        out["expired"] = self.expired
+        return out
@@ -0,0 +1,137 @@
+"""
+aiModels.qaModel.reranker
+
+交叉编码器重排（可选阶段）：
+- 对融合后的前 N 个候选，用小型 CPU 交叉编码器对 (问题, 文档) 一次批量打分
+- **硬性时间预算**：打分在独立工作线程中执行，超过预算立即回退为融合顺序（本次结果丢弃）
+- 工作线程忙（上一次打分仍在进行）时直接回退，不排队，避免请求堆积
+- 按历史单条耗时自适应减少候选数，使一次打分尽量落在预算内
+- 模型在工作线程中懒加载，加载期间的查询按超时回退
+
+说明：
+- 交叉编码器输出经 sigmoid 的相关概率（0~1），写入 rerank_score，并替换 score 供上下文打包排序
+- 原融合分保留在 fused_score
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional
+
+RERANK_MODEL_NAME = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"   # 多语种小型交叉编码器
+RERANK_MAX_LENGTH = 256
+EMA_DECAY = 0.8   # 单条耗时的指数滑动平均系数
+
+
+class CrossEncoderReranker:
+    def __init__(self, model_name: str = RERANK_MODEL_NAME, max_length: int = RERANK_MAX_LENGTH) -> None:
+        self.model_name = model_name
+        self.max_length = max_length
+        self._model = None
+        self._last_error: Optional[str] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-rerank")
+        self._busy = threading.Semaphore(1)
+        self._lock = threading.Lock()
+        self._per_doc_seconds: Optional[float] = None
+        self.calls = 0
+        self.reranked = 0
+        self.timeouts = 0
+        self.skipped_busy = 0
+        self.errors = 0
+
+    def _get_model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+        return self._model
+
+    def _score(self, pairs: List[List[str]]):
+        try:
+            model = self._get_model()   # 首次加载不计入单条耗时
+            start = time.perf_counter()
+            scores = model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+            per_doc = (time.perf_counter() - start) / max(len(pairs), 1)
+            with self._lock:
+                prev = self._per_doc_seconds
+                self._per_doc_seconds = per_doc if prev is None else EMA_DECAY * prev + (1 - EMA_DECAY) * per_doc
+            return [float(s) for s in scores]
+        finally:
+            self._busy.release()
+
+    def _affordable(self, n: int, budget_s: float) -> int:
+        """按历史单条耗时估算预算内能打分的候选数（至少 1 条）。"""
+        with self._lock:
+            per_doc = self._per_doc_seconds
+        if not per_doc:
+            return n
+        return max(1, min(n, int(budget_s / per_doc)))
+
+    def rerank(self, query: str, candidates: List[Dict[str, Any]], budget_ms: float) -> Optional[List[Dict[str, Any]]]:
+        """
+        重排候选（按 rerank_score 降序）；超时 / 忙 / 出错时返回 None，由调用方使用融合顺序。
+        """
+        if not candidates:
+            return None
+        with self._lock:
+            self.calls += 1
+        if not self._busy.acquire(blocking=False):
+            with self._lock:
+                self.skipped_busy += 1
+            return None
+
+        budget_s = budget_ms / 1000.0
+        pool = candidates[:self._affordable(len(candidates), budget_s)]
+        pairs = [[query, r["doc"].get("text") or r["doc"].get("instruction") or ""] for r in pool]
+        try:
+            future = self._executor.submit(self._score, pairs)
+        except Exception:
+            self._busy.release()
+            raise
+        try:
+            scores = future.result(timeout=budget_s)
+        except FutureTimeout:
+            with self._lock:
+                self.timeouts += 1
+            return None
+        except Exception as e:
+            print(f"[Reranker] 重排失败，使用融合顺序: {e}")
+            with self._lock:
+                self.errors += 1
+                self._last_error = f"{type(e).__name__}: {e}"
+            return None
+
+        out = [dict(r, fused_score=r["score"], score=s, rerank_score=s) for r, s in zip(pool, scores)]
+        out.sort(key=lambda x: x["rerank_score"], reverse=True)
+        with self._lock:
+            self.reranked += 1
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "loaded": self._model is not None,
+                "calls": self.calls,
+                "reranked": self.reranked,
+                "timeouts": self.timeouts,
+                "skipped_busy": self.skipped_busy,
+                "errors": self.errors,
+                "last_error": self._last_error,
+                "per_doc_ms": round(self._per_doc_seconds * 1000, 2) if self._per_doc_seconds else None,
+            }
+
+
+# 创建全局实例
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """获取重排器单例"""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = CrossEncoderReranker()
+        return _reranker
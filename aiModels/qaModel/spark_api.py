@@ -6,7 +6,10 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
-chat_history = []
+from .chat_store import get_chat_store, session_id_for
+
+# 按会话隔离的对话历史
+chat_store = get_chat_store("spark")
 
 api_key = "Bearer oKTbwLWlRaDSvqmaqDix:OWDoeINPFIKYdNYILHep"
 # 接口地址：请根据实际部署/环境变量调整
@@ -64,34 +67,8 @@ def get_answer(message):
     return full_response
 
 
-# 管理对话历史，按序编为列表
-def getText(text,role, content):
-    jsoncon = {}
-    jsoncon["role"] = role
-    jsoncon["content"] = content
-    text.append(jsoncon)
-    return text
-
-# 获取对话中的所有角色的content长度
-def getlength(text):
-    length = 0
-    for content in text:
-        temp = content["content"]
-        leng = len(temp)
-        length += leng
-    return length
-
-# 判断长度是否超长，当前限制8K tokens
-def checklen(text):
-    while (getlength(text) > 11000):
-        del text[0]
-    return text
-
-
 @csrf_exempt
 def get_answer_view(request):
-    global chat_history
-
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
@@ -101,14 +78,17 @@ def get_answer_view(request):
             if not user_input:
                 return JsonResponse({'error': 'Empty question'}, status=400)
 
-            # 更新对话历史
-            question = checklen(getText(chat_history, "user", user_input))
+            # 更新对话历史（超长时会话自动淘汰最旧消息）
+            session_id = session_id_for(request, data)
+            conversation = chat_store.get(session_id)
+            conversation.append("user", user_input)
 
             # 获取回答
-            response = get_answer(question)
+            response = get_answer(conversation.messages())
 
             # 将回答添加到对话历史
-            getText(chat_history, "assistant", response)
+            conversation.append("assistant", response)
+            chat_store.save(session_id)
 
             return JsonResponse({'answer': response})
 
@@ -0,0 +1,174 @@
+"""
+aiModels.qaModel.tokenizers
+
+RAG 检索（BM25 / 词重叠过滤）使用的可插拔中文分词：
+- **regex**：原实现，按 [\\w\\u4e00-\\u9fa5]+ 切分（整句中文会成为一个词，仅作对照）
+- **ngram**：中文连续片段切为字符 2-gram，英文/数字按词；另外补充命中的领域词（作物/病虫害）
+- **dict**：领域词表 + jieba（已安装时）搜索引擎模式分词；未安装 jieba 时用领域词表正向最大匹配，
+  未登录片段回退为字符 2-gram
+
+说明：
+- 领域词表取自 aiModels.graph.vocab（与知识图谱抽取共用，不加载 LTP）
+- TokenStreamCache：按 (分词器, 文本哈希) 缓存文档词流，重建索引时只对新增/修改的文档重新分词
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aiModels.graph.vocab import CROP_ALIASES, CROPS, DISEASES
+
+_REGEX_TOKEN = re.compile(r"[\w\u4e00-\u9fa5]+")
+_CJK_RUN = re.compile(r"[\u4e00-\u9fff]+")
+_SEGMENT = re.compile(r"[\u4e00-\u9fff]+|[a-z0-9_]+(?:\.[0-9]+)?")
+
+DOMAIN_TERMS = sorted(set(CROPS) | set(CROP_ALIASES) | set(DISEASES), key=len, reverse=True)
+
+
+def _bigrams(run: str) -> List[str]:
+    if len(run) <= 2:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+class RegexTokenizer:
+    name = "regex"
+
+    def tokenize(self, text: str) -> List[str]:
+        return [t for t in _REGEX_TOKEN.findall((text or "").lower()) if t.strip()]
+
+
+class NgramTokenizer:
+    """中文字符 2-gram + 领域词，英文/数字按词。"""
+
+    name = "ngram"
+
+    def __init__(self, terms: Iterable[str] = DOMAIN_TERMS) -> None:
+        terms = [t for t in terms if t]
+        self._terms_re = re.compile("|".join(map(re.escape, sorted(terms, key=len, reverse=True)))) if terms else None
+
+    def tokenize(self, text: str) -> List[str]:
+        text = (text or "").lower()
+        tokens: List[str] = []
+        for seg in _SEGMENT.findall(text):
+            if _CJK_RUN.fullmatch(seg):
+                tokens.extend(_bigrams(seg))
+                if self._terms_re is not None:
+                    tokens.extend(self._terms_re.findall(seg))
+            else:
+                tokens.append(seg)
+        return tokens
+
+
+class DictTokenizer:
+    """领域词典分词：优先 jieba（加载领域词），否则正向最大匹配。"""
+
+    name = "dict"
+
+    def __init__(self, terms: Iterable[str] = DOMAIN_TERMS) -> None:
+        self.terms = set(t for t in terms if t)
+        self.max_len = max((len(t) for t in self.terms), default=1)
+        self._jieba = None
+        try:
+            import jieba
+            for t in self.terms:
+                jieba.add_word(t)
+            self._jieba = jieba
+        except ImportError:
+            pass
+
+    def _fmm(self, run: str) -> List[str]:
+        tokens, buf, i = [], "", 0
+        while i < len(run):
+            for size in range(min(self.max_len, len(run) - i), 1, -1):
+                word = run[i:i + size]
+                if word in self.terms:
+                    if buf:
+                        tokens.extend(_bigrams(buf))
+                        buf = ""
+                    tokens.append(word)
+                    i += size
+                    break
+            else:
+                buf += run[i]
+                i += 1
+        if buf:
+            tokens.extend(_bigrams(buf))
+        return tokens
+
+    def tokenize(self, text: str) -> List[str]:
+        text = (text or "").lower()
+        tokens: List[str] = []
+        for seg in _SEGMENT.findall(text):
+            if not _CJK_RUN.fullmatch(seg):
+                tokens.append(seg)
+            elif self._jieba is not None:
+                tokens.extend(w for w in self._jieba.lcut_for_search(seg) if w.strip())
+            else:
+                tokens.extend(self._fmm(seg))
+        return tokens
+
+
+TOKENIZERS = {
+    "regex": RegexTokenizer,
+    "ngram": NgramTokenizer,
+    "dict": DictTokenizer,
+}
+
+_instances: Dict[str, object] = {}
+_instances_lock = threading.Lock()
+
+
+def get_tokenizer(name: str = "ngram"):
+    """获取分词器单例"""
+    with _instances_lock:
+        tok = _instances.get(name)
+        if tok is None:
+            if name not in TOKENIZERS:
+                raise ValueError(f"未知的分词器: {name}（可选：{', '.join(TOKENIZERS)}）")
+            tok = _instances[name] = TOKENIZERS[name]()
+        return tok
+
+
+class TokenStreamCache:
+    """按 (分词器, 文本 sha1) 缓存文档词流；每次索引构建后只保留当前语料的条目。"""
+
+    def __init__(self) -> None:
+        self._data: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(tokenizer, text: str) -> Tuple[str, str]:
+        return tokenizer.name, hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def tokenize_corpus(self, texts: List[str], tokenizer) -> List[Tuple[str, ...]]:
+        fresh: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+        out: List[Tuple[str, ...]] = []
+        hits = 0
+        with self._lock:
+            old = self._data
+        for text in texts:
+            key = self._key(tokenizer, text)
+            tokens: Optional[Tuple[str, ...]] = fresh.get(key)
+            if tokens is None:
+                tokens = old.get(key)
+            if tokens is None:
+                tokens = tuple(tokenizer.tokenize(text))
+            else:
+                hits += 1
+            fresh[key] = tokens
+            out.append(tokens)
+        with self._lock:
+            self._data = fresh
+            self.hits += hits
+            self.misses += len(texts) - hits
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,581 @@
+"""
+aiModels 测试
+
+爬虫智能体（spider_agent）的多引擎搜索 / 并行抓取使用本地桩服务（ThreadingHTTPServer）测试，不访问外网：
+- /baidu、/ddg：伪造的百度 / DuckDuckGo 结果页（含 DuckDuckGo 跳转链接、末尾斜杠与 utm_* 参数不同的重复 URL）
+- /slow-ddg：超过搜索时限才返回的引擎
+- /page/<n>：正常页面（每次请求固定耗时，记录同时处理的请求数）；/slow-page：超过抓取时限才返回的页面
+- /doc/<name>：带 ETag / Last-Modified 的页面，支持 If-None-Match → 304；版本、Cache-Control 与故障可由用例控制
+  （网页响应缓存 http_cache 的新鲜期、条件复验、解析结果缓存、过期兜底与 LRU 淘汰）
+
+查询规划（query_planner）的时间范围解析与槽位填充不访问数据库，用固定的“当前时间”测试（含闰日）。
+
+RAG 索引后台构建器（index_builder）用可控的构建函数测试重建请求的排队与不丢失。
+
+大脑智能体（brain_agent）的路由优先级用桩 LLM / 子智能体 / 语义路由测试，不调用模型。
+
+运行：python manage.py test aiModels
+"""
+
+import asyncio
+import datetime
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import quote
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from aiModels.agent import spider_agent
+from aiModels.agent.brain_agent import BrainAgent
+from aiModels.agent.http_cache import HttpCache
+from aiModels.agent.query_planner import parse_time_range, plan_query
+from aiModels.agent.semantic_router import DIRECT_ANSWER
+from aiModels.agent.spider_agent import SpiderAgent
+from aiModels.qaModel.index_builder import BackgroundIndexBuilder
+
+PAGE_DELAY = 0.2        # /page/<n> 的处理耗时（秒）
+SLOW_DELAY = 2.0        # /slow-ddg、/slow-page 的处理耗时（秒）
+TEST_SEARCH_DEADLINE = 0.6
+TEST_FETCH_DEADLINE = 0.8
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _html(self, html, headers=None):
+        self._send(200, html.encode("utf-8"), {"Content-Type": "text/html; charset=utf-8", **(headers or {})})
+
+    def _doc(self, path):
+        server = self.server
+        server.doc_requests.append((path, self.headers.get("If-None-Match")))
+        if server.down:
+            self._send(503)
+            return
+        version = server.versions.get(path, 1)
+        etag = f'"{path}-v{version}"'
+        headers = {"ETag": etag, "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT",
+                   "Cache-Control": server.cache_control.get(path, "max-age=60")}
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, b"", headers)
+            return
+        self._html(f"<html><head><title>{path} v{version}</title></head>"
+                   f"<body><h1>版本{version}</h1><p>{'柑' * 300}</p></body></html>", headers)
+
+    def do_GET(self):
+        server = self.server
+        base = f"http://127.0.0.1:{server.server_port}"
+        path = self.path.split("?", 1)[0]
+        try:
+            if path == "/baidu":
+                self._html(
+                    f'<div class="result"><h3><a href="{base}/page/1/">页面一</a></h3><div class="c-abstract">百度摘要</div></div>'
+                    f'<div class="result"><h3><a href="{base}/page/2?utm_source=baidu">页面二</a></h3></div>'
+                    f'<div class="result"><h3><a href="{base}/slow-page">慢页面</a></h3></div>'
+                )
+            elif path in ("/ddg", "/slow-ddg"):
+                if path == "/slow-ddg":
+                    time.sleep(SLOW_DELAY)
+                self._html(
+                    f'<div class="result"><a class="result__a" href="//duckduckgo.com/l/?uddg={quote(base + "/page/1", safe="")}">页面一</a>'
+                    f'<a class="result__snippet">DDG 摘要</a></div>'
+                    f'<div class="result"><a class="result__a" href="{base}/page/2">页面二</a></div>'
+                    f'<div class="result"><a class="result__a" href="{base}/page/3">页面三</a></div>'
+                )
+            elif path.startswith("/page/"):
+                with server.lock:
+                    server.active += 1
+                    server.peak = max(server.peak, server.active)
+                try:
+                    time.sleep(PAGE_DELAY)
+                    self._html(f"<html><head><title>标题{path}</title></head><body><p>正文{path}</p></body></html>")
+                finally:
+                    with server.lock:
+                        server.active -= 1
+            elif path.startswith("/doc/"):
+                self._doc(path)
+            elif path == "/slow-page":
+                time.sleep(SLOW_DELAY)
+                self._html("<html><title>慢</title></html>")
+            else:
+                self._send(404)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端超时放弃后写回失败，属预期情况
+            pass
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 连接池复用的连接被客户端关闭（超时放弃）时不打印堆栈
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class StubServerMixin:
+    """启动一个本地桩服务（整个测试类共用），每个用例使用独立的临时缓存"""
+
+    handler = _StubHandler
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = _StubServer(("127.0.0.1", 0), cls.handler)
+        cls.server.lock = threading.Lock()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.server.active = 0
+        self.server.peak = 0
+        self.server.versions = {}
+        self.server.cache_control = {}
+        self.server.down = False
+        self.server.doc_requests = []
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, True)
+        self.cache = HttpCache(f"{self.tmpdir}/http_cache.sqlite3")
+        self.agent = SpiderAgent(timeout=5, http_cache=self.cache)
+        self.agent.engines = {"baidu": self.base + "/baidu?wd={query}", "duckduckgo": self.base + "/ddg?q={query}"}
+        for name, value in (("SEARCH_DEADLINE", TEST_SEARCH_DEADLINE), ("FETCH_DEADLINE", TEST_FETCH_DEADLINE)):
+            patcher = mock.patch.object(spider_agent, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class SpiderAgentSearchTests(StubServerMixin, SimpleTestCase):
+    """多引擎并发搜索、按 URL 合并去重、时限与同主机并发上限"""
+
+    def _run_both(self, task, **kwargs):
+        """同一调用分别走同步与异步路径，返回 [(路径, 结果, 耗时秒)]"""
+        out = []
+        for path, call in (("sync", lambda: self.agent.execute(task, **kwargs)),
+                           ("async", lambda: asyncio.run(self.agent.aexecute(task, **kwargs)))):
+            started = time.monotonic()
+            result = call()
+            out.append((path, result, time.monotonic() - started))
+        return out
+
+    def test_merge_dedups_by_normalized_url(self):
+        for path, result, elapsed in self._run_both("search", query="柑橘", max_results=5):
+            with self.subTest(path=path):
+                self.assertTrue(result["success"], result)
+                data = result["data"]
+                self.assertEqual(data["engines"], {"baidu": {"count": 3}, "duckduckgo": {"count": 3}})
+                urls = [r["url"] for r in data["results"]]
+                # 页面一（末尾斜杠 / DuckDuckGo 跳转）与页面二（utm_* 参数）各只保留一条
+                self.assertEqual(len(urls), 4)
+                self.assertEqual(urls[0], self.base + "/page/1/")
+                self.assertEqual(data["results"][0]["engines"], ["baidu", "duckduckgo"])
+                self.assertEqual(data["results"][1]["engines"], ["baidu", "duckduckgo"])
+                # 只被一个引擎返回的结果排在两个引擎都返回的结果之后（RRF）
+                self.assertEqual({tuple(r["engines"]) for r in data["results"][2:]}, {("baidu",), ("duckduckgo",)})
+
+    def test_single_engine_and_unknown_engine(self):
+        result = self.agent.execute("search", query="柑橘", engine="duckduckgo")
+        self.assertTrue(result["success"], result)
+        self.assertEqual(result["data"]["results"][0]["url"], self.base + "/page/1")
+        result = self.agent.execute("search", query="柑橘", engine="google")
+        self.assertFalse(result["success"])
+
+    def test_engine_missing_deadline_is_dropped(self):
+        self.agent.engines["duckduckgo"] = self.base + "/slow-ddg?q={query}"
+        for path, result, elapsed in self._run_both("search", query="柑橘"):
+            with self.subTest(path=path):
+                self.assertTrue(result["success"], result)
+                data = result["data"]
+                self.assertIn("超过搜索时限", data["engines"]["duckduckgo"]["error"])
+                self.assertEqual(data["engines"]["baidu"], {"count": 3})
+                self.assertTrue(all(r["engines"] == ["baidu"] for r in data["results"]))
+                self.assertLess(data["elapsed_ms"], (TEST_SEARCH_DEADLINE + 0.5) * 1000)
+
+    def test_all_engines_failing_reports_error(self):
+        self.agent.engines = {"baidu": self.base + "/missing?wd={query}", "duckduckgo": self.base + "/slow-ddg?q={query}"}
+        result = self.agent.execute("search", query="柑橘")
+        self.assertFalse(result["success"])
+        self.assertIn("全部搜索引擎失败", result["error"])
+
+    def test_fetch_top_respects_fetch_deadline(self):
+        for path, result, elapsed in self._run_both("search", query="柑橘", fetch_top=4):
+            with self.subTest(path=path):
+                self.assertTrue(result["success"], result)
+                pages = {r["url"].split("/", 3)[-1]: r["page"] for r in result["data"]["results"]}
+                self.assertEqual(pages["page/1/"]["title"], "标题/page/1/")
+                self.assertIn("正文/page/1/", pages["page/1/"]["text"])
+                self.assertIn("标题/page/", pages["page/2?utm_source=baidu"]["title"])
+                self.assertIn("error", pages["slow-page"])
+                self.assertNotIn("error", pages["page/3"])
+                # 搜索 + 抓取，慢页面不拖慢整体
+                self.assertLess(elapsed, TEST_SEARCH_DEADLINE + TEST_FETCH_DEADLINE + 0.5)
+
+    def test_per_host_concurrency_limit(self):
+        urls = [f"{self.base}/page/{i}" for i in range(6)]
+        started = time.monotonic()
+        results = self.agent._fetch_many(urls, deadline=time.monotonic() + 5)
+        elapsed = time.monotonic() - started
+        self.assertTrue(all(r["success"] for r in results), results)
+        self.assertEqual(self.server.peak, spider_agent.PER_HOST_LIMIT)
+        # 6 个请求、每主机 2 个并发：至少 3 轮
+        self.assertGreaterEqual(elapsed, 3 * PAGE_DELAY)
+
+    def test_per_host_concurrency_limit_async(self):
+        async def fetch_all():
+            return await self.agent._afetch_many([f"{self.base}/page/{i}" for i in range(6)])
+
+        results = asyncio.run(fetch_all())
+        self.assertTrue(all(r["success"] for r in results), results)
+        self.assertEqual(self.server.peak, spider_agent.PER_HOST_LIMIT)
+
+
+class HttpCacheTests(StubServerMixin, SimpleTestCase):
+    """网页响应缓存：新鲜期命中、304 复验、正文变化、过期兜底、不可缓存响应与 LRU 淘汰"""
+
+    def fetch(self, name, agent=None):
+        return (agent or self.agent).execute("fetch", url=f"{self.base}/doc/{name}")
+
+    def requests_for(self, name):
+        return [inm for path, inm in self.server.doc_requests if path == f"/doc/{name}"]
+
+    def test_fresh_hit_makes_no_request(self):
+        first, second = self.fetch("a"), self.fetch("a")
+        self.assertEqual(first, second)
+        self.assertEqual(first["data"]["title"], "/doc/a v1")
+        self.assertEqual(len(self.requests_for("a")), 1)
+        self.assertEqual((self.cache.hits, self.cache.extraction_hits), (1, 1))
+
+    def test_expired_entry_revalidates_with_304(self):
+        self.server.cache_control["/doc/a"] = "max-age=0"
+        first, second = self.fetch("a"), self.fetch("a")
+        self.assertEqual(first, second)
+        self.assertEqual(self.requests_for("a"), [None, '"/doc/a-v1"'])
+        self.assertEqual((self.cache.revalidated, self.cache.extraction_hits), (1, 1))
+
+    def test_changed_body_is_reparsed(self):
+        self.server.cache_control["/doc/a"] = "max-age=0"
+        url = f"{self.base}/doc/a"
+        self.assertEqual(self.fetch("a")["data"]["title"], "/doc/a v1")
+        self.assertEqual(self.agent.execute("extract", url=url, selectors={"h": "h1"})["data"]["extracted"], {"h": ["版本1"]})
+        self.server.versions["/doc/a"] = 2
+        self.assertEqual(self.fetch("a")["data"]["title"], "/doc/a v2")
+        self.assertEqual(self.agent.execute("extract", url=url, selectors={"h": "h1"})["data"]["extracted"], {"h": ["版本2"]})
+
+    def test_stale_entry_served_when_origin_fails(self):
+        self.server.cache_control["/doc/a"] = "max-age=0"
+        self.fetch("a")
+        self.server.down = True
+        result = self.fetch("a")
+        self.assertTrue(result["success"], result)
+        self.assertEqual(result["data"]["title"], "/doc/a v1")
+        self.assertEqual(self.cache.stale, 1)
+
+    def test_uncacheable_response_replaces_cached_page(self):
+        self.server.cache_control["/doc/a"] = "max-age=0"
+        self.fetch("a")
+        self.server.versions["/doc/a"] = 2
+        self.server.cache_control["/doc/a"] = "no-store"
+        self.assertEqual(self.fetch("a")["data"]["title"], "/doc/a v2")
+        url = f"{self.base}/doc/a"
+        self.assertIsNone(self.cache.lookup(url))
+        self.assertIsNone(self.cache.get_extraction(url, "page:1"))
+        # 不再缓存：下一次仍然请求服务器
+        self.assertEqual(self.fetch("a")["data"]["title"], "/doc/a v2")
+        self.assertEqual(len(self.requests_for("a")), 3)
+
+    def test_lru_eviction_by_size(self):
+        cache = HttpCache(f"{self.tmpdir}/small.sqlite3", max_bytes=2500)
+        agent = SpiderAgent(timeout=5, http_cache=cache)
+        for name in ("a", "b", "a", "c"):   # 第二次取 a 命中缓存，b 成为最久未使用
+            self.assertTrue(self.fetch(name, agent)["success"])
+            time.sleep(0.01)
+        self.assertIsNotNone(cache.lookup(f"{self.base}/doc/a"))
+        self.assertIsNone(cache.lookup(f"{self.base}/doc/b"))
+        self.assertIsNotNone(cache.lookup(f"{self.base}/doc/c"))
+        self.assertLessEqual(cache.stats()["bytes"], 2500)
+        self.assertGreaterEqual(cache.evicted, 1)
+
+    def test_async_revalidation(self):
+        self.server.cache_control["/doc/a"] = "max-age=0"
+        url = f"{self.base}/doc/a"
+
+        async def fetch_twice():
+            return [await self.agent.aexecute("fetch", url=url) for _ in range(2)]
+
+        first, second = asyncio.run(fetch_twice())
+        self.assertEqual(first, second)
+        self.assertEqual(self.requests_for("a"), [None, '"/doc/a-v1"'])
+        self.assertEqual(self.cache.revalidated, 1)
+
+    def test_async_cache_io_runs_off_event_loop(self):
+        threads = {}
+
+        def record(name):
+            method = getattr(self.cache, name)
+
+            def wrapper(*args, **kwargs):
+                threads.setdefault(name, set()).add(threading.get_ident())
+                return method(*args, **kwargs)
+            return wrapper
+
+        names = ("lookup", "store", "mark_revalidated", "get_extraction", "put_extraction")
+        self.server.cache_control["/doc/a"] = "max-age=0"
+        url = f"{self.base}/doc/a"
+
+        async def run():
+            loop_thread = threading.get_ident()
+            with mock.patch.multiple(self.cache, **{name: record(name) for name in names}):
+                await self.agent.aexecute("fetch", url=url)
+                await self.agent.aexecute("fetch", url=url)
+                await self.agent.aexecute("extract", url=url, selectors={"h": "h1"})
+            return loop_thread
+
+        loop_thread = asyncio.run(run())
+        self.assertEqual(set(threads), set(names))
+        self.assertNotIn(loop_thread, set().union(*threads.values()))
+
+
+def _local(*args):
+    return timezone.make_aware(datetime.datetime(*args))
+
+
+class ParseTimeRangeTests(SimpleTestCase):
+    NOW = _local(2024, 2, 29, 10, 30)   # 闰日
+
+    def assertRange(self, question, start, end=None, now=NOW):
+        tr = parse_time_range(question, now)
+        self.assertIsNotNone(tr, question)
+        self.assertEqual(tr[0], start, question)
+        self.assertEqual(tr[1], end or now, question)
+
+    def test_recent_years_on_leap_day(self):
+        self.assertRange("最近1年", _local(2023, 2, 28))
+        self.assertRange("近两年", _local(2022, 2, 28))
+        self.assertRange("过去4年", _local(2020, 2, 29))
+
+    def test_recent_months_clamp_to_month_end(self):
+        self.assertRange("近1个月", _local(2024, 1, 29))
+        self.assertRange("最近3个月", _local(2024, 2, 29), now=_local(2024, 5, 31, 8))
+        self.assertRange("最近1个月", _local(2024, 4, 30), now=_local(2024, 5, 31, 8))
+
+    def test_recent_days_and_hours(self):
+        self.assertRange("最近7天", _local(2024, 2, 23))
+        self.assertRange("近3小时", _local(2024, 2, 29, 7, 30))
+
+    def test_relative_words(self):
+        self.assertRange("今天", _local(2024, 2, 29), _local(2024, 3, 1))
+        self.assertRange("上个月", _local(2024, 1, 1), _local(2024, 2, 1))
+        self.assertRange("上个月", _local(2023, 12, 1), _local(2024, 1, 1), now=_local(2024, 1, 15))
+        self.assertRange("去年", _local(2023, 1, 1), _local(2024, 1, 1))
+
+    def test_absolute_ranges(self):
+        self.assertRange("2024年5月", _local(2024, 5, 1), _local(2024, 6, 1))
+        self.assertRange("2023年", _local(2023, 1, 1), _local(2024, 1, 1))
+        self.assertRange("2020年到2022年", _local(2020, 1, 1), _local(2023, 1, 1))
+        self.assertRange("2024-01-01 到 2024-03-31", _local(2024, 1, 1), _local(2024, 4, 1))
+
+    def test_no_time_range(self):
+        self.assertIsNone(parse_time_range("冷库温度是多少", self.NOW))
+
+
+class PlanQueryTests(SimpleTestCase):
+    NOW = _local(2024, 2, 29, 10, 30)
+
+    def plan(self, question, model):
+        return plan_query(question, model, now=self.NOW)
+
+    def test_recent_years_on_leap_day(self):
+        plan = self.plan("最近一年各地区的柑橘总产量", "screen.Citrus_production_history_area")
+        self.assertEqual((plan.agg, plan.group_by), ("sum", "area"))
+        self.assertEqual(plan.time_range[0], _local(2023, 2, 28))
+        self.assertFalse(self.plan("最近2年的读数", "storageSystem.DeviceReading").is_aggregate)
+
+    def test_rank_groups_by_dimension(self):
+        plan = self.plan("哪个品种产量最高", "screen.Citrus_variety_production_history_area")
+        self.assertEqual((plan.group_by, plan.agg, plan.order, plan.top), ("variety", "sum", "desc", 1))
+        plan = self.plan("哪些地区产量最低", "screen.Citrus_production_history_area")
+        self.assertEqual((plan.group_by, plan.order, plan.top), ("area", "asc", 5))
+
+    def test_rank_with_classifier_words(self):
+        plan = self.plan("哪类设备报警最多", "storageSystem.Alarm")
+        self.assertEqual((plan.group_by, plan.agg, plan.order, plan.top), ("device__name", "count", "desc", 1))
+        plan = self.plan("哪种品种产量最大", "screen.Citrus_variety_production_history_area")
+        self.assertEqual((plan.group_by, plan.order), ("variety", "desc"))
+
+    def test_rank_without_dimension_is_not_aggregated(self):
+        plan = self.plan("哪个时段温度最高", "storageSystem.DeviceReading")
+        self.assertFalse(plan.is_aggregate)
+        self.assertIn("rank", plan.slots)
+
+    def test_ascii_metric_needs_word_boundary(self):
+        self.assertEqual(self.plan("平均co浓度", "storageSystem.DeviceReading").metric, "co_ppm")
+        self.assertEqual(self.plan("平均 CO2 浓度", "storageSystem.DeviceReading").metric, "co2_ppm")
+        self.assertEqual(self.plan("设备 code 的平均值", "storageSystem.DeviceReading").metric, "temperature")
+        self.assertNotIn("metric", self.plan("按设备 count 平均值", "storageSystem.DeviceReading").slots)
+
+    def test_sum_words(self):
+        self.assertEqual(self.plan("2023年柑橘总产量", "screen.Citrus_production_history").agg, "sum")
+        self.assertIsNone(self.plan("总体介绍一下柑橘产量", "screen.Citrus_production_history").agg)
+
+    def test_unapplied_filter_skips_aggregate(self):
+        plan = self.plan("湖北冷库的平均温度", "storageSystem.DeviceReading")
+        self.assertEqual(plan.unapplied, {"province": "湖北"})
+        self.assertFalse(plan.is_aggregate)
+        self.assertEqual(plan.describe()["unapplied_filters"], {"province": "湖北"})
+        plan = self.plan("湖北基地数量", "storageSystem.Base")
+        self.assertTrue(plan.is_aggregate)
+        self.assertEqual(plan.filters, {"province_name__contains": "湖北"})
+
+
+class _LingeringExitLock:
+    """构建线程在构建结束后释放锁时停留片刻，模拟线程退出前仍“存活”的时间窗"""
+
+    def __init__(self, builder):
+        self._lock = threading.Lock()
+        self.builder = builder
+        self.finished = threading.Event()
+
+    def __enter__(self):
+        self._lock.acquire()
+
+    def __exit__(self, *exc):
+        lingering = threading.current_thread().name == "rag-index-builder" and self.builder._state != "running"
+        self._lock.release()
+        if lingering:
+            self.finished.set()
+            time.sleep(0.3)
+
+
+class BackgroundIndexBuilderTests(SimpleTestCase):
+    def make_builder(self):
+        self.release = threading.Event()
+        self.ready = []
+
+        def build(builder):
+            self.release.wait(5)
+            return len(self.ready)
+
+        return BackgroundIndexBuilder(build, self.ready.append)
+
+    def wait_for(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "等待构建超时")
+            time.sleep(0.01)
+
+    def test_rebuild_requested_while_running_runs_once_more(self):
+        builder = self.make_builder()
+        self.assertTrue(builder.start())
+        self.assertFalse(builder.start())
+        self.assertFalse(builder.start())
+        self.assertTrue(builder.status()["rebuild_pending"])
+        self.release.set()
+        self.wait_for(lambda: builder.status()["state"] == "ready" and builder.builds == 2)
+        self.assertFalse(builder.status()["rebuild_pending"])
+        self.assertEqual(self.ready, [0, 1])
+
+    def test_start_while_finished_thread_is_exiting_is_not_lost(self):
+        builder = self.make_builder()
+        builder._lock = lock = _LingeringExitLock(builder)
+        self.release.set()
+        self.assertTrue(builder.start())
+        self.assertTrue(lock.finished.wait(5))
+        # 上一轮已结束但线程尚未退出：新的请求应立即开始构建，而不是挂起为永远不会执行的 pending
+        self.assertTrue(builder.start())
+        self.wait_for(lambda: builder.builds == 2)
+        self.assertFalse(builder.status()["rebuild_pending"])
+
+    def test_failed_build_can_be_restarted(self):
+        builder = BackgroundIndexBuilder(lambda b: 1 / 0, lambda index: None)
+        self.assertTrue(builder.start())
+        self.wait_for(lambda: builder.status()["state"] == "failed")
+        self.assertIn("ZeroDivisionError", builder.status()["error"])
+        self.assertTrue(builder.start())
+
+
+class _StubLLM:
+    def __init__(self):
+        self.calls = []
+
+    def chat(self, messages):
+        self.calls.append(messages)
+        return '{"final": "好的"}'
+
+    async def achat(self, messages):
+        return self.chat(messages)
+
+
+class _StubRegistry:
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, agent_name, task, **kwargs):
+        self.calls.append((agent_name, task))
+        return {"success": True, "data": {"rows": []}}
+
+    async def aexecute(self, agent_name, task, **kwargs):
+        return self.execute(agent_name, task, **kwargs)
+
+
+class _StubSemanticRouter:
+    def __init__(self, label, confidence):
+        self.result = {"label": label, "confidence": confidence}
+        self.calls = 0
+
+    def classify(self, question):
+        self.calls += 1
+        return self.result
+
+
+class BrainAgentRoutingTests(SimpleTestCase):
+    """关键词路由高置信时语义路由不能覆盖；关键词路由不确定时由语义路由决定"""
+
+    def make_agent(self, label, confidence=0.55):
+        self.llm, self.registry = _StubLLM(), _StubRegistry()
+        self.semantic = _StubSemanticRouter(label, confidence)
+        return BrainAgent(llm=self.llm, agent_registry=self.registry, semantic_router=self.semantic)
+
+    def test_confident_keyword_route_beats_direct_answer(self):
+        question = "查询数据库中冷库的温度数据"
+        for run in (lambda a: a.answer(question), lambda a: asyncio.run(a.aanswer(question))):
+            agent = self.make_agent(DIRECT_ANSWER)
+            _, called = run(agent)
+            self.assertEqual(called, "searchDB_agent")
+            self.assertEqual(self.registry.calls, [("searchDB_agent", "auto_query")])
+            self.assertEqual(self.semantic.calls, 0)
+
+    def test_semantic_direct_answer_when_keywords_are_unsure(self):
+        agent = self.make_agent(DIRECT_ANSWER)
+        answer, called = agent.answer("柑橘怎么样")
+        self.assertIsNone(called)
+        self.assertEqual(self.registry.calls, [])
+        self.assertEqual(self.semantic.calls, 1)
+        self.assertEqual(len(self.llm.calls), 1)
+
+    def test_semantic_route_when_keywords_are_unsure(self):
+        agent = self.make_agent("spider_agent", 0.8)
+        _, called = asyncio.run(agent.aanswer("柑橘怎么样"))
+        self.assertEqual(called, "spider_agent")
+        self.assertEqual(self.registry.calls, [("spider_agent", "search")])
@@ -7,6 +7,10 @@ from aiModels.qaModel import spark_api
 from aiModels.qaModel import deepseek_r1_api
 # 智能体系统（大脑）
 from aiModels.agent import brain_agent as db_agent
+from aiModels.agent.agent_runtime import agent_runtime_stats_view
+from aiModels.agent.tool_cache import tool_cache_stats_view
+from aiModels.agent.semantic_router import semantic_router_stats_view
+from aiModels.agent.http_cache import http_cache_stats_view
 
 # 工具功能
 from aiModels.diseaseModel import diseaseRecognition
@@ -17,30 +21,44 @@ from aiModels.graph import graph
 # RAG知识库增强功能
 from aiModels.qaModel import RAG
 
+# Ollama 客户端运行指标
+from aiModels.qaModel.llm_client import llm_metrics_view
+
 # ChatKG 知识库数据接口
-from aiModels.qaModel.editJson import get_knowledge_data_view, delete_knowledge_item_view, add_knowledge_item_view
+from aiModels.qaModel.editJson import get_knowledge_data_view, delete_knowledge_item_view, add_knowledge_item_view, dedup_knowledge_view
 
 urlpatterns = [
     # 问答系统
     path('chat', views.chat_view, name='chat'),
     path('get_answer', spark_api.get_answer_view, name='get_answer'),
     path('get_answer_deepseek', deepseek_r1_api.get_answer_view, name='get_answer_deepseek'),
+    path('get_answer_deepseek_stream', deepseek_r1_api.get_answer_stream_view, name='get_answer_deepseek_stream'),
     path('get_chat_history', deepseek_r1_api.get_chat_history_view, name='get_chat_history'),
     path('clear_chat_history', deepseek_r1_api.clear_chat_history_view, name='clear_chat_history'),
     # 智能体系统（大脑）- 统一入口，调用 agent 文件夹下的功能
     path('agent', views.agent_view, name='agent'),
     path('brain', db_agent.agent_answer_view, name='brain'),
+    path('brain_async', db_agent.agent_answer_async_view, name='brain_async'),
+    path('brain_stats', agent_runtime_stats_view, name='brain_stats'),
+    path('tool_cache_stats', tool_cache_stats_view, name='tool_cache_stats'),
+    path('semantic_router_stats', semantic_router_stats_view, name='semantic_router_stats'),
+    path('http_cache_stats', http_cache_stats_view, name='http_cache_stats'),
     
     # RAG知识库增强系统
     path('initialize_rag', RAG.initialize_rag_view, name='initialize_rag'),
     path('get_answer_rag', RAG.get_answer_rag_view, name='get_answer_rag'),
+    path('get_answer_rag_stream', RAG.get_answer_rag_stream_view, name='get_answer_rag_stream'),
     path('reinitialize_rag', RAG.reinitialize_rag_view, name='reinitialize_rag'),
+    path('rag_status', RAG.rag_status_view, name='rag_status'),
+    path('rag_cache_stats', RAG.rag_cache_stats_view, name='rag_cache_stats'),
+    path('llm_metrics', llm_metrics_view, name='llm_metrics'),
     
     # ChatKG 页面（嵌入问答系统，为RAG数据来源）
     path('tool/chatkg', views.chatkg_view, name='chatkg'),
     path('knowledge/data', get_knowledge_data_view, name='knowledge_data'),
     path('knowledge/delete', delete_knowledge_item_view, name='knowledge_delete'),
     path('knowledge/add', add_knowledge_item_view, name='knowledge_add'),
+    path('knowledge/dedup', dedup_knowledge_view, name='knowledge_dedup'),
 
     # 图片上传功能与识别测试
     path('tool/upload/', views.image_recognition_view, name='upload'),  # 上传页面
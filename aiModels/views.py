@@ -3,12 +3,13 @@ from django.shortcuts import render
 
 # 问答系统
 def chat_view(request):
-    # 导入聊天历史记录
-    from aiModels.qaModel.deepseek_r1_api import chat_history
-    
+    # 导入当前会话的聊天历史记录
+    from aiModels.qaModel.chat_store import session_id_for
+    from aiModels.qaModel.deepseek_r1_api import chat_store
+
     # 将聊天历史记录传递给模板
     context = {
-        'chat_history': chat_history
+        'chat_history': chat_store.get(session_id_for(request)).messages()
     }
     return render(request, 'qaModel/chat.html', context)
 